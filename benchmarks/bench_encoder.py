@@ -0,0 +1,82 @@
+"""เทียบ latency และความต่างของผลระหว่าง encoder backend ต่างๆ กับ PyTorch (ดู encoder.ENCODER_BACKENDS)
+
+    python benchmarks/bench_encoder.py --backends torch-int8 onnx onnx-int8 --csv cp_products_detailed.csv
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encoder import ENCODER_BACKENDS, check_parity, load_encoder  # noqa: E402
+from product_index import encode_texts  # noqa: E402
+
+# คำค้นตัวอย่างแบบที่ผู้ใช้พิมพ์จริง
+QUERIES = [
+    "ข้าว", "ข้าวผัด", "ข้าวกะเพราไก่", "น้ำจิ้ม", "น้ำจิ้มสุกี้", "ซุป", "ซุปข้าวโพด",
+    "เกี๊ยว", "เกี๊ยวกุ้ง", "ไส้กรอก", "ไก่ทอด", "นักเก็ต", "ขนมจีบ", "ซาลาเปา",
+    "เมนู", "อาหารแช่แข็ง", "ของทานเล่น", "เกี๊ยวซ่า", "หมูแดดเดียว", "ไข่",
+]
+
+
+def load_names(csv_path):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return [row["ชื่อสินค้า"].lower() for row in csv.DictReader(f) if row.get("ชื่อสินค้า")]
+
+
+def time_ms(fn, repeat):
+    fn()  # warm-up
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def bench(name, model, names, repeat, batch_size):
+    batch = (names * (batch_size // max(len(names), 1) + 1))[:batch_size]
+    single_p50, single_p99 = time_ms(lambda: encode_texts(model, [QUERIES[2]]), repeat)
+    batch_p50, batch_p99 = time_ms(lambda: encode_texts(model, batch), max(repeat // 10, 3))
+    print(f"{name:>10}  single p50 {single_p50:7.2f} ms  p99 {single_p99:7.2f} ms"
+          f"  | batch[{batch_size}] p50 {batch_p50:8.1f} ms  p99 {batch_p99:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--backends", nargs="+", default=[b for b in ENCODER_BACKENDS if b != "torch"],
+                        choices=ENCODER_BACKENDS)
+    parser.add_argument("--csv", default="cp_products_detailed.csv")
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    names = load_names(args.csv)
+    print(f"{len(names)} product names, {len(QUERIES)} queries\n")
+
+    reference = load_encoder(args.model, "torch")
+    bench("torch", reference, names, args.repeat, args.batch_size)
+
+    parity = {}
+    for backend in args.backends:
+        try:
+            model = load_encoder(args.model, backend)
+        except Exception as e:
+            print(f"{backend:>10}  ⚠️ unavailable: {e}")
+            continue
+        bench(backend, model, names, args.repeat, args.batch_size)
+        parity[backend] = check_parity(reference, model, names, QUERIES, args.top_k)
+
+    print("\nParity against torch:")
+    for backend, result in parity.items():
+        print(f"{backend:>10}  " + "  ".join(f"{key} {value:.4f}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""วัดเวลาของ datafromwebsite.py กับเว็บจำลองในเครื่อง (ไม่ต้องต่ออินเทอร์เน็ต)
+
+เว็บจำลองมีหน้า listing แบบ ?page=N และหน้ารายละเอียด /th/product/<id>/product-<id>
+ทุกหน้ามี __NEXT_DATA__ และมี data route /_next/data/<buildId>/... เหมือนเว็บจริงที่สร้างด้วย Next.js
+เนื้อหาที่มองเห็นในหน้ารายละเอียดถูกเติมด้วย JavaScript หลังโหลด (--render-delay) เหมือนเว็บจริงที่ต้องรอ hydrate
+
+    python benchmarks/bench_scraper.py --products 60 --per-page 20 --mode http browser --workers 1 4 8
+
+ผลลัพธ์ของทุกโหมดและทุกจำนวน worker ต้องตรงกับข้อมูลของเว็บจำลองทุกรายการ (โหมด browser ต้องมี Chrome + selenium)
+
+--saved ทดสอบโหมด http กับหน้า HTML/JSON ที่บันทึกไว้ใน benchmarks/fixtures/cpbrandsite
+(path ของไฟล์ตรงกับ path ของ URL) แล้วเทียบกับ expected.json ในไดเรกทอรีเดียวกัน
+
+--incremental ดึงเว็บจำลองสองรอบด้วยไฟล์สถานะเดียวกัน (เว็บจำลองส่ง ETag และตอบ 304 ได้)
+รอบที่สองต้องได้ผลเหมือนเดิมโดยไม่ต้องโหลดหน้าที่ไม่เปลี่ยนซ้ำ แล้วลองหยุดกลางทางเพื่อทดสอบการทำต่อ
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from next_data import NextDataScraper  # noqa: E402
+from scrape_state import ScrapeState  # noqa: E402
+
+CATEGORY_PATH = "/th/category/1/all-product"
+BUILD_ID = "bench-build"
+SAVED_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "cpbrandsite")
+SAVED_CATEGORY_PATH = "/th/category/133840/all-product"
+
+LISTING_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>สินค้าทั้งหมด</title></head>
+<body><div id="__next"><div class="grid">
+{items}
+</div></div>
+<script id="__NEXT_DATA__" type="application/json">{next_data}</script></body></html>"""
+
+LISTING_ITEM_TEMPLATE = """<div class="product-item">
+  <a href="/th/product/{id}/product-{id}?page={page}&amp;category_id=1"><img src="https://img.example.com/{id}.jpg"></a>
+  <h3>{name}</h3>
+</div>"""
+
+DETAIL_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{name}</title></head>
+<body><div id="root"></div>
+<script>
+setTimeout(function () {{
+  document.getElementById("root").innerHTML =
+    '<h1>{name}</h1><div class="price">{price}</div><div class="product-description">{description}</div>';
+}}, {render_delay_ms});
+</script>
+<script id="__NEXT_DATA__" type="application/json">{next_data}</script></body></html>"""
+
+
+def fixture_products(count):
+    return [
+        {
+            "id": str(1000000 + i),
+            "name": f"สินค้าทดสอบ {i:04d} เกี๊ยวกุ้ง",
+            "price": f"฿ {50 + i % 200}.00",
+            "description": f"คำอธิบายของสินค้าทดสอบหมายเลข {i}",
+        }
+        for i in range(count)
+    ]
+
+
+def _listing_json(item):
+    return {"id": int(item["id"]), "name": item["name"], "slug": f"product-{item['id']}",
+            "thumbnail": f"https://img.example.com/{item['id']}.jpg", "price": float(item["price"][2:])}
+
+
+def _detail_props(product):
+    return {"pageProps": {"product": dict(_listing_json(product), description=f"<p>{html.escape(product['description'])}</p>")}}
+
+
+def _script_json(data):
+    # ป้องกัน </script> ในข้อมูลปิดแท็กก่อนเวลา เหมือนที่ Next.js ทำ
+    return json.dumps(data, ensure_ascii=False).replace("</", "<\\/")
+
+
+def generated_site(products, per_page, render_delay):
+    """หน้าเว็บจำลองที่สร้างจาก products: คืน (content type, body) หรือ None ถ้าไม่มีหน้านั้น"""
+    by_id = {product["id"]: product for product in products}
+
+    def render(url):
+        if url.path == CATEGORY_PATH:
+            page = int(parse_qs(url.query).get("page", ["1"])[0])
+            items = products[(page - 1) * per_page:page * per_page]
+            next_data = {"props": {"pageProps": {"products": [_listing_json(item) for item in items]}},
+                         "page": "/[lang]/category/[id]/[slug]", "buildId": BUILD_ID}
+            return "text/html; charset=utf-8", LISTING_TEMPLATE.format(
+                items="\n".join(LISTING_ITEM_TEMPLATE.format(id=item["id"], page=page, name=html.escape(item["name"]))
+                                for item in items),
+                next_data=_script_json(next_data))
+
+        path = url.path
+        is_data_route = path.startswith(f"/_next/data/{BUILD_ID}/") and path.endswith(".json")
+        if is_data_route:
+            path = path[len(f"/_next/data/{BUILD_ID}"):-len(".json")]
+        parts = path.strip("/").split("/")
+        if len(parts) != 4 or parts[:2] != ["th", "product"] or parts[2] not in by_id:
+            return None
+
+        product = by_id[parts[2]]
+        if is_data_route:
+            return "application/json", json.dumps(_detail_props(product), ensure_ascii=False)
+        return "text/html; charset=utf-8", DETAIL_TEMPLATE.format(
+            name=html.escape(product["name"]),
+            price=html.escape(product["price"]),
+            description=html.escape(product["description"]),
+            render_delay_ms=int(render_delay * 1000),
+            next_data=_script_json({"props": _detail_props(product), "buildId": BUILD_ID}),
+        )
+
+    return render
+
+
+def saved_site(root):
+    """เสิร์ฟไฟล์ที่บันทึกไว้ โดย /a/b -> root/a/b.html และ /a/b.json -> root/a/b.json (ไม่สน query string)"""
+
+    def render(url):
+        path = os.path.normpath(os.path.join(root, url.path.lstrip("/")))
+        if not path.startswith(root):
+            return None
+        for candidate, content_type in ((path + ".html", "text/html; charset=utf-8"), (path, "application/json")):
+            if os.path.isfile(candidate) and (candidate.endswith(".html") or candidate.endswith(".json")):
+                with open(candidate, encoding="utf-8") as f:
+                    return content_type, f.read()
+        return None
+
+    return render
+
+
+def start_fixture_site(port, render, latency=0.0):
+    """เสิร์ฟ render ที่ port (ส่ง ETag และตอบ 304 เมื่อ If-None-Match ตรง) server.counts นับ response ตาม status"""
+    counts = {}
+    counts_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self):
+            self._respond(head=True)
+
+        def do_GET(self):
+            self._respond(head=False)
+
+        def _respond(self, head):
+            time.sleep(latency)
+            page = render(urlsplit(self.path))
+            if page is None:
+                self._count(404)
+                self.send_error(404)
+                return
+            content_type, body = page
+            data = body.encode("utf-8")
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self._count(304)
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self._count(200)
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            if not head:
+                self.wfile.write(data)
+
+        def _count(self, status):
+            with counts_lock:
+                counts[status] = counts.get(status, 0) + 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.counts = counts
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_results(scraped, products, keys=("name", "price", "description")):
+    """คืนรายการข้อผิดพลาดเมื่อผลลัพธ์ไม่ตรงกับข้อมูลของเว็บจำลอง"""
+    errors = []
+    if len(scraped) != len(products):
+        errors.append(f"expected {len(products)} products, got {len(scraped)}")
+    for expected, got in zip(products, scraped):
+        for key in keys:
+            if got.get(key) != expected[key]:
+                errors.append(f"{expected['id']}: {key} {got.get(key)!r} != {expected[key]!r}")
+        if f"/product/{expected['id']}/" not in got.get("url", ""):
+            errors.append(f"{expected['id']}: url {got.get('url')!r}")
+    return errors
+
+
+def create_scraper(mode, base_url, workers, rate, headless):
+    if mode == "http":
+        return NextDataScraper(base_url=base_url, workers=workers, requests_per_second=rate)
+    from browser_scraper import BrowserScraper
+    return BrowserScraper(base_url=base_url, workers=workers, requests_per_second=rate, headless=headless)
+
+
+def check_saved(port):
+    """โหมด http กับไฟล์ที่บันทึกไว้: ต้องได้ตาม expected.json และสินค้าที่ไม่มีรายละเอียดต้องอยู่ใน incomplete"""
+    with open(os.path.join(SAVED_FIXTURES, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+
+    server = start_fixture_site(port, saved_site(SAVED_FIXTURES))
+    scraper = NextDataScraper(base_url=f"http://127.0.0.1:{port}{SAVED_CATEGORY_PATH}", workers=4,
+                              requests_per_second=0, retries=0)
+    try:
+        scraped = scraper.run(2)
+        incomplete = sorted(product['id'] for product in scraper.incomplete)
+    finally:
+        scraper.close()
+        server.shutdown()
+
+    errors = check_results(scraped, expected, keys=("name", "price", "image", "description"))
+    expected_incomplete = sorted(product['id'] for product in expected if product['description'] == 'ไม่พบคำอธิบาย')
+    if incomplete != expected_incomplete:
+        errors.append(f"incomplete {incomplete} != {expected_incomplete}")
+
+    print(f"\n📊 saved fixtures: {len(scraped)} products, {'OK' if not errors else f'{len(errors)} mismatches'}")
+    for error in errors:
+        print(f"   ❌ {error}")
+    return not errors
+
+
+def check_incremental(port, count, per_page):
+    """ดึงสองรอบด้วยไฟล์สถานะเดียวกัน แล้วเปลี่ยนราคาสินค้าหนึ่งชิ้นและหยุดกลางทางเพื่อทดสอบการทำต่อ"""
+    products = fixture_products(count)
+    pages = -(-count // per_page)
+    server = start_fixture_site(port, generated_site(products, per_page, 0))
+    base_url = f"http://127.0.0.1:{port}{CATEGORY_PATH}"
+    errors = []
+
+    def scrape(state_path, max_pages, restart=False):
+        server.counts.clear()
+        scraper = NextDataScraper(base_url=base_url, workers=4, requests_per_second=0, retries=0,
+                                  state=ScrapeState(state_path))
+        try:
+            return scraper.run(max_pages, restart=restart), dict(server.counts)
+        finally:
+            scraper.close()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = os.path.join(tmp, "scrape_state.json")
+            for label in ("first run", "unchanged"):
+                scraped, counts = scrape(state_path, pages)
+                errors += [f"{label}: {error}" for error in check_results(scraped, products)]
+                print(f"📊 {label}: {counts.get(200, 0)} full responses, {counts.get(304, 0)} not modified")
+            if counts.get(200, 0) > 1:  # มีแค่การทดสอบ URL pattern (HEAD) ที่ไม่มี validator
+                errors.append(f"unchanged run downloaded {counts[200]} responses")
+
+            # ราคาเปลี่ยน: ต้องดึงเฉพาะหน้า listing นั้นและหน้ารายละเอียดของสินค้าชิ้นนั้น
+            products[0]["price"] = "฿ 999.00"
+            scraped, counts = scrape(state_path, pages)
+            errors += [f"changed price: {error}" for error in check_results(scraped, products)]
+            print(f"📊 changed price: {counts.get(200, 0)} full responses, {counts.get(304, 0)} not modified")
+
+            # หยุดหลังหน้าแรก (เหมือน process ถูก kill) แล้วรันใหม่ต้องทำต่อจากหน้า 2
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            state["run"].update(complete=False, pages=state["run"]["pages"][:1])
+            with open(state_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            scraped, counts = scrape(state_path, pages)
+            errors += [f"resumed: {error}" for error in check_results(scraped, products)]
+            print(f"📊 resumed: {counts.get(200, 0)} full responses, {counts.get(304, 0)} not modified")
+    finally:
+        server.shutdown()
+
+    print(f"\n📊 incremental: {'OK' if not errors else f'{len(errors)} mismatches'}")
+    for error in errors[:10]:
+        print(f"   ❌ {error}")
+    return not errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saved", action="store_true", help="only check http mode against the saved fixtures")
+    parser.add_argument("--incremental", action="store_true", help="only check incremental http scraping")
+    parser.add_argument("--mode", nargs="+", choices=("http", "browser"), default=["http", "browser"])
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.1, help="server delay per request (seconds)")
+    parser.add_argument("--render-delay", type=float, default=0.3, help="seconds before detail content appears")
+    parser.add_argument("--rate", type=float, default=0, help="requests per second per host (0 = no limit)")
+    parser.add_argument("--port", type=int, default=5111)
+    parser.add_argument("--show-browser", action="store_true")
+    args = parser.parse_args()
+
+    if args.saved:
+        sys.exit(0 if check_saved(args.port) else 1)
+    if args.incremental:
+        sys.exit(0 if check_incremental(args.port, args.products, args.per_page) else 1)
+
+    products = fixture_products(args.products)
+    server = start_fixture_site(args.port, generated_site(products, args.per_page, args.render_delay), args.latency)
+    base_url = f"http://127.0.0.1:{args.port}{CATEGORY_PATH}"
+    pages = -(-args.products // args.per_page)
+
+    # เวลาของสคริปต์เดิม: sleep 3 วินาทีต่อหน้า listing และ 2 วินาทีต่อหน้าสินค้า
+    legacy = pages * 3 + len(products) * 2
+    print(f"🧪 Fixture site {base_url}: {len(products)} products on {pages} pages "
+          f"(fixed-sleep sequential scraper would need >= {legacy} s)")
+
+    failed = False
+    try:
+        for mode in args.mode:
+            for workers in args.workers:
+                scraper = create_scraper(mode, base_url, workers, args.rate, not args.show_browser)
+                started = time.perf_counter()
+                try:
+                    scraped = scraper.run(pages)
+                finally:
+                    scraper.close()
+                elapsed = time.perf_counter() - started
+
+                errors = check_results(scraped, products)
+                failed = failed or bool(errors)
+                status = "OK" if not errors else f"{len(errors)} mismatches"
+                print(f"\n📊 {mode} workers={workers}: {elapsed:.1f} s, {len(scraped) / elapsed:.1f} products/s, {status}")
+                for error in errors[:10]:
+                    print(f"   ❌ {error}")
+    finally:
+        server.shutdown()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
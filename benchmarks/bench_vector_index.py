@@ -0,0 +1,88 @@
+"""เปรียบเทียบ recall@k และ latency ของ vector index แบบ HNSW กับแบบ exact บนแคตตาล็อกสังเคราะห์
+
+    python benchmarks/bench_vector_index.py --items 1000000 --dim 384 --ef 16 32 64 128 256
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import ExactVectorIndex, HNSWVectorIndex  # noqa: E402
+
+
+def synthetic_catalog(items, dim, clusters, seed):
+    """เวกเตอร์ normalize แล้วที่จับกลุ่มกันเหมือน embedding ของสินค้าจริง (สินค้าหมวดเดียวกันอยู่ใกล้กัน)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.empty((items, dim), dtype=np.float32)
+    for start in range(0, items, 100_000):
+        stop = min(start + 100_000, items)
+        assigned = rng.integers(0, clusters, stop - start)
+        vectors[start:stop] = centers[assigned] + 0.6 * rng.standard_normal((stop - start, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q)) * 1000
+
+
+def run_queries(index, queries, k):
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        labels, _ = index.search(query, k)
+        latencies.append(time.perf_counter() - started)
+        results.append(labels)
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Generating {args.items:,} x {args.dim} catalog ...")
+    vectors = synthetic_catalog(args.items, args.dim, args.clusters, args.seed)
+    labels = np.arange(args.items, dtype=np.int64)
+
+    # คำค้นคือสินค้าในแคตตาล็อกที่ถูกรบกวนเล็กน้อย (ผู้ใช้พิมพ์ไม่ตรงชื่อเป๊ะ)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, args.items, args.queries)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = ExactVectorIndex(args.dim, labels=labels, vectors=vectors)
+    truth, exact_latencies = run_queries(exact, queries, args.k)
+    print(f"exact: p50 {percentile_ms(exact_latencies, 50):.2f} ms, p99 {percentile_ms(exact_latencies, 99):.2f} ms")
+
+    started = time.perf_counter()
+    hnsw = HNSWVectorIndex(args.dim, max_elements=args.items, m=args.m, ef_construction=args.ef_construction)
+    hnsw.add(labels, vectors)
+    print(f"hnsw build: {time.perf_counter() - started:.1f} s (M={args.m}, ef_construction={args.ef_construction})")
+
+    print(f"{'ef_search':>10} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8}")
+    exact_p50 = percentile_ms(exact_latencies, 50)
+    for ef in args.ef:
+        hnsw.set_ef_search(max(ef, args.k))
+        found, latencies = run_queries(hnsw, queries, args.k)
+        recall = np.mean([len(set(f.tolist()) & set(t.tolist())) / args.k for f, t in zip(found, truth)])
+        p50 = percentile_ms(latencies, 50)
+        print(f"{ef:>10} {recall:>10.3f} {p50:>8.2f} {percentile_ms(latencies, 99):>8.2f} {exact_p50 / p50:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
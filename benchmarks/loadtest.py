@@ -0,0 +1,308 @@
+"""ทดสอบโหลด webhook แบบ end-to-end: ส่ง event ที่เซ็นถูกต้องเข้า callback() แล้ววัดเวลาจนบอทตอบกลับ
+
+ใช้ stub ในเครื่องแทน LINE reply API และ Ollama /api/generate (ตั้ง latency ได้)
+เวลา end-to-end = ตั้งแต่ส่ง webhook จนถึง stub LINE ได้รับ reply ของ reply token นั้น
+
+รันบอทให้ชี้มาที่ stub เอง (ค่า env ตามที่สคริปต์พิมพ์ออกมา) แล้วยิงด้วย --url:
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000/ --requests 500 --concurrency 16
+
+หรือให้สคริปต์เปิดบอทผ่าน serve.py ให้เลย:
+    python benchmarks/loadtest.py --spawn botcpwith_ollama --workers 2 --requests 500 --concurrency 16
+
+บอทที่เปิดด้วย --spawn ใช้โหมด ASYNC_WEBHOOK=1 (ตั้ง ASYNC_WEBHOOK=0 เพื่อวัดแบบประมวลผลใน request เดิม)
+"""
+import argparse
+import base64
+import csv
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHANNEL_SECRET = "loadtest-secret"
+
+# คำค้นตัวอย่างแยกตามประเภท ("detail" สร้างจาก product id ในไฟล์ CSV)
+QUERIES = {
+    "menu": ["เมนู", "menu", "ขอดูเมนูหน่อย", "มีเมนูอะไรบ้าง"],
+    "price": [
+        "ข้าวราคาไม่เกิน 100 บาท", "เกี๊ยวต่ำกว่า 80 บาท", "ของราคาประมาณ 150 บาท",
+        "ซุปราคาไม่เกิน 60", "สินค้าราคาเกิน 200 บาท", "น้ำจิ้มราคา 45 บาท",
+    ],
+    "search": [
+        "ข้าวกะเพราไก่", "เกี๊ยวกุ้ง", "น้ำจิ้มสุกี้", "ซุปข้าวโพด", "ไส้กรอกไก่",
+        "ขนมจีบกุ้ง", "ข้าวผัดกระเทียม", "เกี๊ยวซ่า", "ไก่ทอด", "อาหารแช่แข็ง",
+    ],
+    "chit_chat": [
+        "สวัสดีครับ", "ขอบคุณมากค่ะ", "ร้านเปิดกี่โมง", "ส่งของกี่วันถึง",
+        "แนะนำอะไรดีสำหรับมื้อเย็น", "วันนี้ทานอะไรดี",
+    ],
+}
+
+
+def load_detail_queries(csv_path, limit=50):
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            links = [row.get("ลิงก์") or "" for row in csv.DictReader(f)]
+    except FileNotFoundError:
+        return []
+    ids = []
+    for link in links:
+        marker = link.find("/product/")
+        if marker >= 0:
+            product_id = link[marker + len("/product/"):].split("/")[0]
+            if product_id.isdigit() and product_id not in ids:
+                ids.append(product_id)
+    return [f"รายละเอียด {product_id}" for product_id in ids[:limit]]
+
+
+def webhook_body(text, reply_token, user_id):
+    return json.dumps({
+        "destination": "Uloadtest",
+        "events": [{
+            "type": "message",
+            "mode": "active",
+            "timestamp": int(time.time() * 1000),
+            "source": {"type": "user", "userId": user_id},
+            "webhookEventId": uuid.uuid4().hex,
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": reply_token,
+            "message": {"id": str(random.randint(10**14, 10**15)), "type": "text", "text": text},
+        }],
+    }, ensure_ascii=False)
+
+
+def sign(body, secret):
+    """X-Line-Signature = base64(HMAC-SHA256(channel secret, body))"""
+    digest = hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+class ReplyRecorder:
+    """เวลาที่ stub LINE ได้รับ reply ของแต่ละ reply token"""
+
+    def __init__(self):
+        self.replies = {}
+        self._lock = threading.Lock()
+        self._replied = threading.Condition(self._lock)
+
+    def record(self, reply_token):
+        with self._lock:
+            self.replies.setdefault(reply_token, time.perf_counter())
+            self._replied.notify_all()
+
+    def wait_for(self, tokens, timeout):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while not all(token in self.replies for token in tokens):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._replied.wait(remaining)
+        return True
+
+
+def start_line_stub(port, recorder):
+    class LineHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == "/v2/bot/message/reply":
+                recorder.record(json.loads(body).get("replyToken"))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    return serve_stub(port, LineHandler)
+
+
+def start_ollama_stub(port, first_token_delay, tokens, token_interval):
+    """stream NDJSON แบบ Ollama: รอ first_token_delay แล้วส่ง token ทีละ token_interval วินาที"""
+
+    class OllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            time.sleep(first_token_delay)
+            for i in range(tokens):
+                self._chunk({"response": "ทดสอบ " if i % 8 else "ครับ. ", "done": False})
+                time.sleep(token_interval)
+            self._chunk({"response": "", "done": True, "eval_count": tokens})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, data):
+            line = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return serve_stub(port, OllamaHandler)
+
+
+def serve_stub(port, handler):
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def spawn_bot(module, port, workers, env):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py"), module, "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env={**os.environ, **env},
+    )
+    url = f"http://127.0.0.1:{port}/"
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"Bot exited with status {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return process, url
+        except requests.RequestException:
+            time.sleep(1)
+    process.terminate()
+    sys.exit("Bot did not start within 300s")
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def report(results, recorder, wall_time):
+    by_intent = defaultdict(list)
+    for result in results:
+        by_intent[result["intent"]].append(result)
+
+    print(f"\n{'intent':<10} {'sent':>6} {'ok':>6} {'err':>5} {'rps':>7} "
+          f"{'ack p50':>8} {'ack p99':>8} {'e2e p50':>8} {'e2e p90':>8} {'e2e p99':>8} {'e2e max':>8}")
+    for intent, items in sorted(by_intent.items()) + [("ALL", results)]:
+        acks = [item["ack"] * 1000 for item in items if item["status"] == 200]
+        e2e = [
+            (recorder.replies[item["token"]] - item["sent_at"]) * 1000
+            for item in items if item["token"] in recorder.replies
+        ]
+        errors = len(items) - len(e2e)
+        print(f"{intent:<10} {len(items):>6} {len(e2e):>6} {errors:>5} {len(e2e) / wall_time:>7.1f} "
+              f"{percentile(acks, 50):>8.1f} {percentile(acks, 99):>8.1f} "
+              f"{percentile(e2e, 50):>8.1f} {percentile(e2e, 90):>8.1f} {percentile(e2e, 99):>8.1f} "
+              f"{max(e2e, default=float('nan')):>8.1f}")
+    print("(latency in ms; ack = webhook HTTP response, e2e = webhook sent -> reply received by LINE stub)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="webhook URL of a running bot")
+    parser.add_argument("--spawn", metavar="BOT", help="start this bot module with serve.py")
+    parser.add_argument("--port", type=int, default=5055, help="bot port when using --spawn")
+    parser.add_argument("--workers", type=int, default=2, help="serve.py workers when using --spawn")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", default="menu=2,detail=2,price=2,search=3,chit_chat=1",
+                        help="relative weight of each intent")
+    parser.add_argument("--csv", default=os.path.join(ROOT, "cp_products_detailed_new.csv"))
+    parser.add_argument("--line-port", type=int, default=5101)
+    parser.add_argument("--ollama-port", type=int, default=5102)
+    parser.add_argument("--ollama-first-token", type=float, default=0.3, help="seconds before first token")
+    parser.add_argument("--ollama-tokens", type=int, default=40)
+    parser.add_argument("--ollama-token-interval", type=float, default=0.02)
+    parser.add_argument("--reply-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.url and not args.spawn:
+        parser.error("give --url or --spawn")
+
+    recorder = ReplyRecorder()
+    start_line_stub(args.line_port, recorder)
+    start_ollama_stub(args.ollama_port, args.ollama_first_token, args.ollama_tokens, args.ollama_token_interval)
+
+    env = {
+        "LINE_CHANNEL_SECRET": CHANNEL_SECRET,
+        "LINE_CHANNEL_ACCESS_TOKEN": "loadtest-token",
+        "LINE_API_ENDPOINT": f"http://127.0.0.1:{args.line_port}",
+        "OLLAMA_URL": f"http://127.0.0.1:{args.ollama_port}/api/generate",
+        "ASYNC_WEBHOOK": os.environ.get("ASYNC_WEBHOOK", "1"),
+    }
+    process = None
+    if args.spawn:
+        process, url = spawn_bot(args.spawn, args.port, args.workers, env)
+    else:
+        url = args.url
+        print("Run the bot with:\n" + "\n".join(f"  {key}={value}" for key, value in env.items()))
+
+    queries = dict(QUERIES, detail=load_detail_queries(args.csv))
+    weights = {}
+    for part in args.mix.split(","):
+        intent, _, weight = part.partition("=")
+        if queries.get(intent):
+            weights[intent] = float(weight or 1)
+
+    rng = random.Random(args.seed)
+    intents = rng.choices(list(weights), weights=list(weights.values()), k=args.requests)
+    plan = [(intent, rng.choice(queries[intent])) for intent in intents]
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    counter = itertools.count()
+
+    def send(item):
+        intent, text = item
+        token = uuid.uuid4().hex
+        body = webhook_body(text, token, f"U{next(counter) % 1000:032d}")
+        headers = {"Content-Type": "application/json", "X-Line-Signature": sign(body, CHANNEL_SECRET)}
+        sent_at = time.perf_counter()
+        try:
+            status = session.post(url, data=body.encode("utf-8"), headers=headers, timeout=30).status_code
+        except requests.RequestException:
+            status = None
+        return {"intent": intent, "token": token, "sent_at": sent_at,
+                "ack": time.perf_counter() - sent_at, "status": status}
+
+    print(f"Sending {len(plan)} webhooks to {url} with concurrency {args.concurrency} ...")
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(send, plan))
+        if not recorder.wait_for([r["token"] for r in results if r["status"] == 200], args.reply_timeout):
+            print(f"⚠️ Some replies did not arrive within {args.reply_timeout:.0f}s")
+        tokens = {r["token"] for r in results}
+        finished = max((t for token, t in recorder.replies.items() if token in tokens), default=time.perf_counter())
+        report(results, recorder, max(finished - started, 1e-9))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,202 +1,374 @@
-from flask import Flask, request, abort
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
-from linebot.models import (
-    MessageEvent, TextMessage, TextSendMessage,URIAction,
-    TemplateSendMessage, CarouselTemplate, CarouselColumn, MessageAction
-)
-from sentence_transformers import SentenceTransformer, util
-import csv
-
-app = Flask(__name__)
-
-# LINE Credentials
-CHANNEL_SECRET = 'xxx'
-CHANNEL_ACCESS_TOKEN = 'xxx'
-
-line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(CHANNEL_SECRET)
-
-model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-
-
-@app.route("/", methods=['POST'])
-def callback():
-    signature = request.headers['X-Line-Signature']
-    body = request.get_data(as_text=True)
-
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        abort(400)
-
-    return 'OK'
-
-def extract_current_price(price_string):
-    prices = price_string.split("฿")  
-    if len(prices) >= 2:
-        current_price = "฿" + prices[1].strip()  
-        return current_price
-    return price_string  
-
-
-def fetch_cp_products_from_csv(csv_path="cp_products_detailed.csv"):
-    products = []
-    try:
-        with open(csv_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                name = row.get("ชื่อสินค้า")
-                image = row.get("รูปภาพ")
-                price = row.get("ราคา")
-                link = row.get("ลิงก์")
-                desc = row.get("คำอธิบาย")
-
-                if name and image:
-                    products.append({
-                        "name": name,
-                        "image_url": image,
-                        "price": price,
-                        "description": desc,
-                        "link": link
-                    })
-    except FileNotFoundError:
-        print(f"⚠️ CSV file '{csv_path}' not found.")
-
-    return products
-
-
-def word_similarity(word1, word2):
-    embeddings = model.encode([word1, word2], convert_to_tensor=True)
-    score = util.cos_sim(embeddings[0], embeddings[1]).item()
-    return score
-
-
-def find_similar_products(user_query, menu_items, top_k=5, threshold=0.3):
-    if not menu_items:
-        return []
-
-    similarities = []
-    for item in menu_items:
-        score = word_similarity(user_query.lower(), item["name"].lower())
-        if score >= threshold:
-            similarities.append({
-                "item": item,
-                "score": score
-            })
-
-    similarities.sort(key=lambda x: x["score"], reverse=True)
-
-    unique_items = []
-    seen_names = set()
-    for sim in similarities:
-        item = sim["item"]
-        if item["name"] not in seen_names:
-            unique_items.append(item)
-            seen_names.add(item["name"])
-
-    return unique_items[:top_k]
-
-
-def create_product_carousel(products, search_query):
-    if not products:
-        return None
-
-    carousel_columns = []
-    for product in products:
-        title = product["name"][:40]
-        current_price = extract_current_price(product["price"])
-        text = f"ราคา: {current_price}"[:60]
-
-        carousel_columns.append(
-            CarouselColumn(
-                thumbnail_image_url=product["image_url"],
-                title=title,
-                text=text,
-                actions=[
-                    MessageAction(label="รายละเอียด", text=f"รายละเอียด {product['name']}"),
-                    URIAction(label="สั่งซื้อ", uri=product["link"] or "https://example.com")
-                ]
-            )
-        )
-
-    return TemplateSendMessage(
-        alt_text=f"ผลการค้นหา: {search_query}",
-        template=CarouselTemplate(columns=carousel_columns)
-    )
-
-
-@handler.add(MessageEvent, message=TextMessage)
-def handle_message(event):
-    user_message = event.message.text.strip()
-    menu_data = fetch_cp_products_from_csv()
-
-    if not menu_data:
-        line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text="⚠️ ไม่พบข้อมูลเมนู")
-        )
-        return
-
-    # คำว่า "เมนู"
-    if word_similarity("menu", user_message) > 0.65 or word_similarity("เมนู", user_message) > 0.65:
-        top_items = menu_data[:10]
-        template_message = create_product_carousel(top_items, "เมนูแนะนำ")
-
-        if template_message:
-            line_bot_api.reply_message(event.reply_token, template_message)
-        else:
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="⚠️ ไม่สามารถแสดงเมนูได้ในขณะนี้")
-            )
-    elif user_message.startswith("รายละเอียด "):
-        product_name = user_message.replace("รายละเอียด ", "").strip()
-        matched = next((item for item in menu_data if item["name"].strip().lower() == product_name.lower()), None)
-
-
-        if matched:
-            detail = matched["description"] or "ไม่มีรายละเอียดเพิ่มเติม"
-            reply_text = f"📦 {matched['name']}:\n{detail.strip()[:1000]}"
-
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text=reply_text)
-            )
-        else:
-            line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text=f"❌ ไม่พบรายละเอียดของ '{product_name}'")
-        )
-
-    else:
-        similar_products = find_similar_products(user_message, menu_data, top_k=5, threshold=0.4)
-
-        if similar_products:
-            template_message = create_product_carousel(similar_products, user_message)
-
-            if template_message:
-                line_bot_api.reply_message(event.reply_token, template_message)
-            else:
-                line_bot_api.reply_message(
-                    event.reply_token,
-                    TextSendMessage(text=f"❌ ไม่สามารถแสดงผลการค้นหา '{user_message}' ได้")
-                )
-        else:
-            suggestion_text = f"❌ ไม่พบสินค้าที่เกี่ยวข้องกับ '{user_message}'\n\n" \
-                              f"💡 ลองใช้คำค้นหาเช่น:\n" \
-                              f"• ข้าว\n" \
-                              f"• น้ำจิ้ม\n" \
-                              f"• ซุป\n" \
-                              f"• ของหวาน\n" \
-                              f"• หรือพิมพ์ 'เมนู' เพื่อดูเมนูทั้งหมด"
-
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text=suggestion_text)   
-            )
-    
-
-if __name__ == "__main__":
-    app.run(port=5000)
-
+from flask import Flask, Response, request, abort
+from linebot import LineBotApi, WebhookHandler
+from linebot.exceptions import InvalidSignatureError
+from linebot.models import (
+    MessageEvent, TextMessage, TextSendMessage,URIAction,
+    CarouselColumn, MessageAction
+)
+from encoder import encoder_id, load_encoder
+from product_index import ProductIndex
+from lexical_index import LexicalIndex
+from embedding_store import EmbeddingStore
+from carousel_cache import CarouselCache, reply_cached
+from catalog_store import Catalog, CatalogStore, extract_product_id
+from query_cache import QueryCache, normalize_query
+from intent_router import IntentRouter
+from event_worker import EventWorkerPool
+from metrics import MetricsRegistry, StageTimer
+from profiling import RequestProfiler, register_admin_routes
+import csv
+import os
+import signal
+
+app = Flask(__name__)
+
+# LINE Credentials (ตั้งผ่าน environment ได้ เช่นตอนทดสอบด้วย benchmarks/loadtest.py)
+CHANNEL_SECRET = os.environ.get("LINE_CHANNEL_SECRET", 'xxx')
+CHANNEL_ACCESS_TOKEN = os.environ.get("LINE_CHANNEL_ACCESS_TOKEN", 'xxx')
+LINE_API_ENDPOINT = os.environ.get("LINE_API_ENDPOINT", "https://api.line.me")
+
+line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN, endpoint=LINE_API_ENDPOINT)
+handler = WebhookHandler(CHANNEL_SECRET)
+
+# Webhook processing
+# 1 = ตอบ LINE ทันทีแล้วประมวลผลใน worker threads (ค่าเริ่มต้น: ประมวลผลใน request เดิมแบบเดิม)
+ASYNC_WEBHOOK = os.environ.get("ASYNC_WEBHOOK", "0") == "1"
+WEBHOOK_WORKERS = 4
+WEBHOOK_QUEUE_SIZE = 100
+
+# metrics แบบ Prometheus ที่ /metrics: เวลาของแต่ละขั้นตอนแยกตามประเภทคำตอบ + ตัวนับของแคช/คิว
+metrics_registry = MetricsRegistry()
+STAGE_SECONDS = metrics_registry.histogram(
+    "linebot_stage_seconds", "Time spent in each stage of answering a message", ("intent", "stage"))
+MESSAGE_SECONDS = metrics_registry.histogram(
+    "linebot_message_seconds", "Total time to answer a message", ("intent",))
+
+# เก็บ profile ของข้อความที่ช้า (เปิดด้วย environment ไม่ต้องแก้โค้ด) ดูรายการได้ที่ /admin/profiles
+# โดยส่ง header Authorization: Bearer <LINEBOT_ADMIN_TOKEN> (ถ้าไม่ตั้ง token ไว้ endpoint จะปิด)
+PROFILE_SLOW_SECONDS = float(os.environ["PROFILE_SLOW_SECONDS"]) if os.environ.get("PROFILE_SLOW_SECONDS") else None
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))  # สัดส่วนข้อความที่เก็บ cProfile แบบเต็ม
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_TRACES = 50
+ADMIN_TOKEN = os.environ.get("LINEBOT_ADMIN_TOKEN")
+profiler = RequestProfiler(PROFILE_DIR, PROFILE_SLOW_SECONDS, PROFILE_SAMPLE_RATE, PROFILE_MAX_TRACES)
+
+# Product catalog
+PRODUCTS_CSV = "cp_products_detailed.csv"
+
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+# "torch", "torch-int8", "onnx" หรือ "onnx-int8" (เร็วกว่าบน CPU ตรวจความต่างของผลด้วย benchmarks/bench_encoder.py)
+ENCODER_BACKEND = "torch"
+model = load_encoder(MODEL_NAME, ENCODER_BACKEND)
+
+# embedding ของชื่อสินค้าถูกแคชไว้ข้างไฟล์ CSV ทุก process เปิดไฟล์เดียวกันแบบ read-only
+embedding_store = EmbeddingStore(PRODUCTS_CSV, encoder_id(MODEL_NAME, ENCODER_BACKEND))
+
+# วิธีหา top-k ของ embedding: "exact" (คูณเมทริกซ์ทุกชิ้น) หรือ "hnsw" (ANN ต้องติดตั้ง hnswlib
+# เหมาะกับแคตตาล็อกหลักแสนรายการขึ้นไป index ถูกบันทึกไว้ข้างไฟล์ CSV และอัปเดตเฉพาะสินค้าที่เปลี่ยน)
+# ชื่อไฟล์ใช้ prefix เดียวกับแคช embedding (แยกตามโมเดลและ backend) เวกเตอร์ต่าง encoder จึงไม่ปนกัน
+VECTOR_INDEX_BACKEND = "exact"
+VECTOR_INDEX_PATH = f"{embedding_store.prefix}.hnsw"
+
+
+@app.route("/", methods=['POST'])
+def callback():
+    signature = request.headers['X-Line-Signature']
+    body = request.get_data(as_text=True)
+
+    try:
+        events = handler.parser.parse(body, signature)
+    except InvalidSignatureError:
+        abort(400)
+
+    if ASYNC_WEBHOOK:
+        # ตอบ 200 ให้ LINE ทันที แล้วให้ worker ประมวลผลเบื้องหลัง
+        # ถ้าคิวเต็มตอบ 503 (LINE จะส่งซ้ำภายหลังถ้าเปิด webhook redelivery ไว้)
+        if not event_pool.submit(events):
+            abort(503)
+    else:
+        process_events(events)
+
+    return 'OK'
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+register_admin_routes(app, profiler, ADMIN_TOKEN)
+
+
+def extract_current_price(price_string):
+    prices = price_string.split("฿")  
+    if len(prices) >= 2:
+        current_price = "฿" + prices[1].strip()  
+        return current_price
+    return price_string  
+
+
+def fetch_cp_products_from_csv(csv_path=PRODUCTS_CSV):
+    products = []
+    try:
+        with open(csv_path, newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                name = row.get("ชื่อสินค้า")
+                image = row.get("รูปภาพ")
+                price = row.get("ราคา")
+                link = row.get("ลิงก์")
+                desc = row.get("คำอธิบาย")
+
+                if name and image:
+                    products.append({
+                        "id": len(products),
+                        "product_id": extract_product_id(link),
+                        "name": name,
+                        "image_url": image,
+                        "price": price,
+                        "description": desc,
+                        "link": link
+                    })
+    except FileNotFoundError:
+        print(f"⚠️ CSV file '{csv_path}' not found.")
+
+    return products
+
+
+def build_catalog(products, version, previous=None):
+    """สร้างแคตตาล็อกพร้อม index จากรายการสินค้าที่อ่านจาก CSV"""
+    return Catalog(
+        products, version,
+        index=ProductIndex(
+            model, products, embedding_store,
+            vector_backend=VECTOR_INDEX_BACKEND,
+            vector_index_path=VECTOR_INDEX_PATH,
+            previous=previous.index if previous is not None else None,
+        ),
+        lexical_index=LexicalIndex(products),
+        carousels=CarouselCache(products, create_product_column),
+    )
+
+
+# จำนวนสินค้าสูงสุดที่ lexical index คัดมาให้ embedding จัดอันดับ (แคตตาล็อกเล็กกว่านี้ค้นด้วย embedding ตรงๆ)
+LEXICAL_CANDIDATES = 100
+
+# แคชผลค้นหาและ embedding ของคำค้นที่ผู้ใช้พิมพ์ซ้ำบ่อยๆ (ล้างอัตโนมัติเมื่อแคตตาล็อกเปลี่ยนเวอร์ชัน)
+QUERY_CACHE_SIZE = 2048
+QUERY_CACHE_TTL = 600  # วินาที
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+
+def encode_query(text, catalog):
+    """เข้ารหัสคำค้นหา ถ้าเคยเข้ารหัสข้อความนี้แล้วจะใช้ค่าจากแคชโดยไม่เรียกโมเดล"""
+    query_text = normalize_query(text)
+    key = ("embedding", query_text)
+    embedding = query_cache.get(key, catalog.version)
+    if embedding is None:
+        embedding = catalog.index.encode_query(query_text)
+        query_cache.put(key, embedding, catalog.version)
+    return embedding
+
+
+def prefetch_query_embeddings(texts, catalog):
+    """เข้ารหัสคำค้นหลายข้อความด้วยการเรียกโมเดลครั้งเดียว แล้วเก็บลงแคชให้ encode_query ใช้ต่อ"""
+    pending = []
+    for text in texts:
+        query_text = normalize_query(text)
+        if query_text and query_text not in pending and not query_cache.contains(("embedding", query_text), catalog.version):
+            pending.append(query_text)
+
+    if pending:
+        embeddings = catalog.index.encode_texts(pending)
+        for query_text, embedding in zip(pending, embeddings):
+            query_cache.put(("embedding", query_text), embedding, catalog.version)
+
+
+# กฎแยกประเภทข้อความ เรียงตามลำดับความสำคัญ (anchor ถูกเข้ารหัสครั้งเดียวตอนเริ่ม)
+INTENT_RULES = [
+    {"intent": "detail", "prefix": "รายละเอียด "},
+    {"intent": "menu", "anchors": ["menu", "เมนู"], "threshold": 0.65},
+]
+intent_router = IntentRouter(model, INTENT_RULES, default_intent="product_search")
+
+
+def find_similar_products(user_query, catalog, top_k=5, threshold=0.3, timer=None):
+    if not catalog.products:
+        return []
+    timer = timer or StageTimer()
+
+    key = ("search", normalize_query(user_query), top_k, threshold)
+    ranked_ids = query_cache.get(key, catalog.version)
+
+    if ranked_ids is None:
+        # เข้ารหัสคำค้นหาครั้งเดียว แล้วให้คะแนนกับสินค้าทั้งหมดด้วยการคูณเมทริกซ์
+        # ถ้าแคตตาล็อกใหญ่ จะคัดสินค้าด้วย n-gram ก่อนแล้วให้คะแนนเฉพาะสินค้าที่คัดมา
+        with timer.stage("encode"):
+            query_embedding = encode_query(user_query, catalog)
+        with timer.stage("rank"):
+            results = catalog.search(
+                normalize_query(user_query), query_embedding, top_k=top_k, threshold=threshold,
+                lexical_limit=LEXICAL_CANDIDATES,
+            )
+        ranked_ids = tuple(row for row, score in results)
+        query_cache.put(key, ranked_ids, catalog.version)
+
+    return [catalog.products[row] for row in ranked_ids]
+
+
+def create_product_column(product):
+    """คอลัมน์ carousel ของสินค้าหนึ่งชิ้น (สร้างครั้งเดียวตอนโหลดแคตตาล็อก ดู CarouselCache)"""
+    title = product["name"][:40]
+    current_price = extract_current_price(product["price"])
+    text = f"ราคา: {current_price}"[:60]
+
+    return CarouselColumn(
+        thumbnail_image_url=product["image_url"],
+        title=title,
+        text=text,
+        actions=[
+            # ส่ง product id แทนชื่อเต็ม ข้อความสั้นและหาได้ทันทีจาก catalog.find_product
+            MessageAction(label="รายละเอียด", text=f"รายละเอียด {product['product_id'] or product['name']}"),
+            URIAction(label="สั่งซื้อ", uri=product["link"] or "https://example.com")
+        ]
+    )
+
+
+def create_product_carousel(products, search_query, catalog):
+    """ประกอบ carousel จากคอลัมน์ที่สร้างไว้แล้วของแคตตาล็อก"""
+    return catalog.carousels.carousel([product["id"] for product in products], search_query)
+
+
+@handler.add(MessageEvent, message=TextMessage)
+def handle_message(event):
+    # จับเวลาแต่ละขั้นตอน แล้วบันทึกลง histogram แยกตามประเภทคำตอบ (ดู /metrics)
+    timer = StageTimer()
+    branch = "error"
+    with profiler.profile() as capture:
+        try:
+            branch = respond_to_message(event, timer)
+        finally:
+            timer.finish(STAGE_SECONDS, MESSAGE_SECONDS, branch)
+            capture.annotate(intent=branch, stages=timer.stages)
+
+
+def respond_to_message(event, timer):
+    """ตอบข้อความหนึ่งข้อความ คืนชื่อประเภทคำตอบ (menu, detail, search, no_results)"""
+    user_message = event.message.text.strip()
+    with timer.stage("catalog"):
+        catalog = catalog_store.get()
+    menu_data = catalog.products
+
+    if not menu_data:
+        with timer.stage("reply"):
+            line_bot_api.reply_message(
+                event.reply_token,
+                TextSendMessage(text="⚠️ ไม่พบข้อมูลเมนู")
+            )
+        return "empty_catalog"
+
+    # เข้ารหัสข้อความครั้งเดียว แล้วแยกประเภทกับ anchor ทุกตัวในรอบเดียว
+    def embed():
+        with timer.stage("encode"):
+            return encode_query(user_message, catalog)
+
+    intent = intent_router.classify(user_message, embed)
+
+    # คำว่า "เมนู"
+    if intent == "menu":
+        # carousel เมนูแนะนำถูกสร้างและ serialize ไว้แล้วตอนโหลดแคตตาล็อก
+        with timer.stage("reply"):
+            if catalog.carousels.menu:
+                reply_cached(line_bot_api, event.reply_token, catalog.carousels.menu)
+            else:
+                line_bot_api.reply_message(
+                    event.reply_token,
+                    TextSendMessage(text="⚠️ ไม่สามารถแสดงเมนูได้ในขณะนี้")
+                )
+        return "menu"
+
+    if intent == "detail":
+        product_name = user_message.replace("รายละเอียด ", "").strip()
+        with timer.stage("lookup"):
+            matched = catalog.find_product(product_name)
+
+        if matched:
+            detail = matched["description"] or "ไม่มีรายละเอียดเพิ่มเติม"
+            reply_text = f"📦 {matched['name']}:\n{detail.strip()[:1000]}"
+        else:
+            reply_text = f"❌ ไม่พบรายละเอียดของ '{product_name}'"
+
+        with timer.stage("reply"):
+            line_bot_api.reply_message(
+                event.reply_token,
+                TextSendMessage(text=reply_text)
+            )
+        return "detail"
+
+    similar_products = find_similar_products(user_message, catalog, top_k=5, threshold=0.4, timer=timer)
+
+    if similar_products:
+        template_message = create_product_carousel(similar_products, user_message, catalog)
+
+        with timer.stage("reply"):
+            if template_message:
+                line_bot_api.reply_message(event.reply_token, template_message)
+            else:
+                line_bot_api.reply_message(
+                    event.reply_token,
+                    TextSendMessage(text=f"❌ ไม่สามารถแสดงผลการค้นหา '{user_message}' ได้")
+                )
+        return "search"
+
+    suggestion_text = f"❌ ไม่พบสินค้าที่เกี่ยวข้องกับ '{user_message}'\n\n" \
+                      f"💡 ลองใช้คำค้นหาเช่น:\n" \
+                      f"• ข้าว\n" \
+                      f"• น้ำจิ้ม\n" \
+                      f"• ซุป\n" \
+                      f"• ของหวาน\n" \
+                      f"• หรือพิมพ์ 'เมนู' เพื่อดูเมนูทั้งหมด"
+
+    with timer.stage("reply"):
+        line_bot_api.reply_message(
+            event.reply_token,
+            TextSendMessage(text=suggestion_text)   
+        )
+    return "no_results"
+
+
+def process_events(events):
+    """ส่ง event ที่ parse แล้วไปยัง handler ที่ลงทะเบียนไว้"""
+    text_events = [
+        event for event in events
+        if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage)
+    ]
+
+    # webhook เดียวมีหลายข้อความ (เช่นในกลุ่มแชท): เข้ารหัสทุกข้อความด้วยการเรียกโมเดลครั้งเดียว
+    if len(text_events) > 1:
+        texts = [event.message.text.strip() for event in text_events]
+        texts = [text for text in texts if intent_router.needs_embedding(text)]
+        prefetch_query_embeddings(texts, catalog_store.get())
+
+    for event in text_events:
+        handle_message(event)
+
+
+# โหลดแคตตาล็อกครั้งเดียวตอนเริ่ม แล้วโหลดใหม่เบื้องหลังเมื่อไฟล์ CSV เปลี่ยน
+catalog_store = CatalogStore(PRODUCTS_CSV, fetch_cp_products_from_csv, build_catalog)
+
+event_pool = EventWorkerPool(process_events, workers=WEBHOOK_WORKERS, max_queue=WEBHOOK_QUEUE_SIZE)
+
+metrics_registry.register_stats("linebot_catalog", catalog_store.stats, counters=("reloads", "reload_failures"))
+metrics_registry.register_stats("linebot_query_cache", query_cache.stats,
+                                counters=("hits", "misses", "evictions", "expirations", "invalidations"))
+metrics_registry.register_stats("linebot_webhook", event_pool.stats,
+                                counters=("submitted", "processed", "rejected", "failed"))
+
+
+if __name__ == "__main__":
+    # kill -HUP <pid> เพื่อสั่งโหลดแคตตาล็อกใหม่ทันที (ไม่ต้องรอเช็ค mtime)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: catalog_store.reload())
+
+    # เซิร์ฟเวอร์สำหรับพัฒนา ใช้งานจริงแบบหลาย process: python serve.py botcp --workers 4
+    app.run(port=5000)
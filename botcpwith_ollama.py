@@ -1,549 +1,840 @@
-from flask import Flask, request, abort
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
-from linebot.models import (
-    MessageEvent, TextMessage, TextSendMessage,URIAction,
-    TemplateSendMessage, CarouselTemplate, CarouselColumn, MessageAction
-)
-from sentence_transformers import SentenceTransformer, util
-import csv
-import requests
-import json
-import re
-
-app = Flask(__name__)
-
-# LINE Credentials
-CHANNEL_SECRET = 'xxx'
-CHANNEL_ACCESS_TOKEN = 'xxx'
-
-# Ollama Configuration
-OLLAMA_URL = "http://localhost:11434/api/generate"
-OLLAMA_MODEL = "llama3.2:3b"  # หรือ model อื่นที่คุณมี
-
-line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(CHANNEL_SECRET)
-
-model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-
-
-@app.route("/", methods=['POST'])
-def callback():
-    signature = request.headers['X-Line-Signature']
-    body = request.get_data(as_text=True)
-
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        abort(400)
-
-    return 'OK'
-
-
-def summarize_product_description(description):
-    """ใช้ Ollama สรุปคำอธิบายสินค้าให้กระชับ"""
-    if not description or len(description.strip()) < 50:
-        return description
-    
-    try:
-        prompt = f"""กรุณาสรุปคำอธิบายสินค้านี้ให้กระชับและเข้าใจง่าย โดย:
-        - ลบ emoji และสัญลักษณ์พิเศษออก
-        - เน้นข้อมูลสำคัญเช่น ส่วนผสม คุณประโยชน์ ขนาด
-        - ใช้ภาษาไทยง่ายๆ ไม่เกิน 3-4 บรรทัด
-        - ไม่ต้องมีข้อมูลการจัดส่งหรือเงื่อนไขการสั่งซื้อ
-        
-        คำอธิบายเดิม: {description}
-        
-        สรุป:"""
-
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.3,
-                "max_tokens": 200
-            }
-        }
-        
-        response = requests.post(OLLAMA_URL, json=payload, timeout=15)
-        if response.status_code == 200:
-            result = response.json()
-            summary = result.get("response", "").strip()
-            
-            # ตรวจสอบว่า summary ไม่ว่างและมีเนื้อหาที่เหมาะสม
-            if summary and len(summary) > 20:
-                return summary
-            else:
-                return clean_description_manually(description)
-        else:
-            return clean_description_manually(description)
-            
-    except Exception as e:
-        print(f"Summary error: {e}")
-        return clean_description_manually(description)
-
-
-def clean_description_manually(description):
-    """ทำความสะอาดคำอธิบายแบบง่ายๆ หาก Ollama ไม่สามารถใช้ได้"""
-    if not description:
-        return "ไม่มีรายละเอียด"
-    
-    # ลบ emoji และสัญลักษณ์พิเศษ
-    clean_text = re.sub(r'[❤️✅‼️?️?]', '', description)
-    clean_text = re.sub(r'#\w+', '', clean_text)  # ลบ hashtag
-    clean_text = re.sub(r'-{3,}', '', clean_text)  # ลบเส้นประ
-    
-    # แยกเป็นประโยค
-    sentences = [s.strip() for s in clean_text.split('.') if s.strip()]
-    
-    # เอาเฉพาะประโยคสำคัญ (ไม่เกิน 4 ประโยคแรก)
-    important_sentences = []
-    for sentence in sentences[:4]:
-        if any(keyword in sentence for keyword in ['ส่วนผสม', 'โปรตีน', 'วิตามิน', 'พลังงาน', 'ซุป', 'อาหาร']):
-            important_sentences.append(sentence)
-    
-    # ถ้าไม่มีประโยคสำคัญ เอา 2 ประโยคแรก
-    if not important_sentences:
-        important_sentences = sentences[:2]
-    
-    result = '. '.join(important_sentences).strip()
-    
-    # จำกัดความยาว
-    if len(result) > 300:
-        result = result[:300] + "..."
-    
-    return result if result else "ไม่มีรายละเอียดเพิ่มเติม"
-
-def call_ollama(prompt, context=""):
-    """เรียก Ollama API เพื่อสร้างคำตอบ"""
-    try:
-        full_prompt = f"""คุณเป็นผู้ช่วยในร้านอาหาร CP ที่ให้คำแนะนำเกี่ยวกับสินค้าและตอบคำถามของลูกค้า
-        
-        ข้อมูลบริบท: {context}
-        
-        คำถามของลูกค้า: {prompt}
-        
-        กรุณาตอบด้วยภาษาไทยในลักษณะที่เป็นมิตรและให้ข้อมูลที่เป็นประโยชน์ หากไม่มีข้อมูลที่เกี่ยวข้อง ให้แนะนำให้ลูกค้าดูเมนูหรือสินค้าที่มี
-        ตอบแค่ข้อความสั้นๆ ไม่เกิน 200 คำ"""
-
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": full_prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.7,
-                "max_tokens": 300
-            }
-        }
-
-        response = requests.post(OLLAMA_URL, json=payload, timeout=30)
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("response", "ขออภัย ไม่สามารถตอบได้ในขณะนี้")
-        else:
-            return "ขออภัย ระบบขัดข้อง กรุณาลองใหม่อีกครั้ง"
-
-    except requests.exceptions.RequestException:
-        return "ขออภัย ไม่สามารถเชื่อมต่อกับระบบได้ กรุณาลองใหม่อีกครั้ง"
-    except Exception as e:
-        print(f"Ollama error: {e}")
-        return "ขออภัย เกิดข้อผิดพลาด กรุณาลองใหม่อีกครั้ง"
-
-
-
-def fetch_cp_products_from_csv(csv_path="cp_products_detailed_new.csv"):
-    products = []
-    try:
-        with open(csv_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                name = row.get("ชื่อสินค้า")
-                image = row.get("รูปภาพ")
-                price = row.get("ราคาปกติ")
-                link = row.get("ลิงก์")
-                desc = row.get("คำอธิบาย")
-
-                if name and image:
-                    products.append({
-                        "name": name,
-                        "image_url": image,
-                        "price": price,
-                        "description": desc,
-                        "link": link
-                    })
-    except FileNotFoundError:
-        print(f"⚠️ CSV file '{csv_path}' not found.")
-
-    return products
-
-
-def word_similarity(word1, word2):
-    embeddings = model.encode([word1, word2], convert_to_tensor=True)
-    score = util.cos_sim(embeddings[0], embeddings[1]).item()
-    return score
-
-
-def extract_price_number(price_string):
-    """แยกตัวเลขราคาออกมาจาก string โดยเฉพาะเจาะจงกับราคา"""
-    if not price_string:
-        return 0
-    
-    # ลบช่องว่างและแปลงเป็นตัวพิมพ์เล็ก
-    price_clean = price_string.strip()
-    
-    # หา pattern ที่มีสัญลักษณ์ ฿ หรือคำว่า "บาท"
-    # Pattern 1: ฿XX หรือ ฿XX.XX
-    baht_pattern = r'฿\s*(\d{1,}(?:,\d{3})*(?:\.\d{2})?)'
-    match = re.search(baht_pattern, price_clean)
-    if match:
-        price_str = match.group(1).replace(',', '')
-        return float(price_str)
-    
-    # Pattern 2: XX บาท หรือ XX.XX บาท
-    baht_word_pattern = r'(\d{1,}(?:,\d{3})*(?:\.\d{2})?)\s*บาท'
-    match = re.search(baht_word_pattern, price_clean)
-    if match:
-        price_str = match.group(1).replace(',', '')
-        return float(price_str)
-    
-    # Pattern 3: ราคาเดิม ฿XX ราคาใหม่ ฿YY (เอาราคาใหม่)
-    multiple_prices = re.findall(baht_pattern, price_clean)
-    if len(multiple_prices) >= 2:
-        # เอาราคาตัวสุดท้าย (มักเป็นราคาที่ลดแล้ว)
-        return float(multiple_prices[-1].replace(',', ''))
-    
-    # Pattern 4: XX/YY (เช่น เดิม 150/ใหม่ 120) - เอาตัวสุดท้าย
-    slash_pattern = r'(\d+)/(\d+)'
-    match = re.search(slash_pattern, price_clean)
-    if match:
-        return float(match.group(2))  # เอาตัวหลัง slash
-    
-    # ถ้าไม่เจอ pattern ไหนเลย ลองหาเลขที่อยู่ในช่วงราคาที่เป็นไปได้
-    all_numbers = re.findall(r'\d+(?:\.\d{2})?', price_clean.replace(',', ''))
-    if all_numbers:
-        # กรองเอาเฉพาะตัวเลขที่อาจเป็นราคา (15-9999 บาท)
-        potential_prices = []
-        for num_str in all_numbers:
-            num = float(num_str)
-            if 15 <= num <= 9999:  # ช่วงราคาที่เป็นไปได้
-                potential_prices.append(num)
-        
-        if potential_prices:
-            return max(potential_prices)  # เอาราคาสูงสุด (มักเป็นราคาจริง)
-    
-    return 0
-
-
-def parse_user_query(user_message):
-    """วิเคราะห์คำค้นหาของผู้ใช้เพื่อหาเงื่อนไขต่างๆ"""
-    query_info = {
-        'keywords': [],
-        'max_price': None,
-        'min_price': None,
-        'price_range': None,
-        'original_query': user_message.lower()
-    }
-    
-    message_lower = user_message.lower()
-    
-    # หาเงื่อนไขราคาด้วย pattern ที่เฉพาะเจาะจงมากขึ้น
-    price_patterns = [
-        # ราคาต่ำกว่า, น้อยกว่า, ไม่เกิน + บาท
-        (r'(?:ราคา)?(?:ต่ำกว่า|น้อยกว่า|ไม่เกิน)\s*(\d+)\s*(?:บาท)?', 'max'),
-        # ราคาสูงกว่า, มากกว่า, เกิน + บาท  
-        (r'(?:ราคา)?(?:สูงกว่า|มากกว่า|เกิน)\s*(\d+)\s*(?:บาท)?', 'min'),
-        # ราคาประมาณ, รอบๆ + บาท
-        (r'(?:ราคา)?(?:ประมาณ|รอบ|รอบๆ)\s*(\d+)\s*(?:บาท)?', 'around'),
-        # ราคา XX บาท
-        (r'ราคา\s*(\d+)\s*บาท', 'around'),
-        # เฉพาะคำว่า ราคา ตามด้วยตัวเลข (ไม่มี กรัม, มล., กก., ชิ้น ด้านหลัง)
-        (r'ราคา\s*(\d+)(?!\s*(?:กรัม|มล|กก|ชิ้น|ก\.?|มล\.?))', 'around'),
-    ]
-    
-    for pattern, price_type in price_patterns:
-        match = re.search(pattern, message_lower)
-        if match:
-            price = int(match.group(1))
-            # ตรวจสอบว่าเป็นตัวเลขที่เป็นไปได้สำหรับราคา
-            if 10 <= price <= 9999:  # ช่วงราคาที่เหมาะสม
-                if price_type == 'max':
-                    query_info['max_price'] = price
-                elif price_type == 'min':
-                    query_info['min_price'] = price
-                elif price_type == 'around':
-                    # ประมาณ ±25%
-                    margin = int(price * 0.25)
-                    query_info['min_price'] = max(0, price - margin)
-                    query_info['max_price'] = price + margin
-                break
-    
-    # หาคำค้นหาหลักโดยลบเงื่อนไขราคาออก
-    keywords_text = message_lower
-    # ลบคำที่เกี่ยวกับราคาและหน่วยต่างๆ
-    remove_patterns = [
-        r'ราคา(?:ต่ำกว่า|น้อยกว่า|สูงกว่า|มากกว่า|ไม่เกิน|เกิน|ประมาณ|รอบ|รอบๆ)?\s*\d+\s*(?:บาท)?',
-        r'(?:ต่ำกว่า|น้อยกว่า|สูงกว่า|มากกว่า|ไม่เกิน|เกิน|ประมาณ|รอบ|รอบๆ)\s*\d+\s*(?:บาท)?',
-        r'\d+\s*(?:กรัม|มล|กก|ชิ้น|ก\.?|มล\.?)',  # ลบข้อมูลขนาด
-        r'(?:อยาก|ต้องการ|ขอ|หา|ให้)'  # ลบคำขอร้อง
-    ]
-    
-    for pattern in remove_patterns:
-        keywords_text = re.sub(pattern, ' ', keywords_text)
-    
-    keywords_text = re.sub(r'\s+', ' ', keywords_text).strip()
-    
-    if keywords_text:
-        query_info['keywords'] = [kw.strip() for kw in keywords_text.split() if len(kw.strip()) > 1]
-    
-    return query_info
-
-
-def filter_products_by_criteria(products, query_info):
-    """กรองสินค้าตามเงื่อนไขที่วิเคราะห์ได้"""
-    filtered_products = []
-    
-    for product in products:
-        price = extract_price_number(product.get('price', '0'))
-        
-        # ตรวจสอบเงื่อนไขราคา
-        if query_info['max_price'] is not None and price > query_info['max_price']:
-            continue
-        if query_info['min_price'] is not None and price < query_info['min_price']:
-            continue
-        
-        filtered_products.append(product)
-    
-    return filtered_products
-
-
-def smart_product_search(user_query, menu_items, top_k=5, threshold=0.3):
-    """ค้นหาสินค้าแบบฉลาดโดยพิจารณาเงื่อนไขต่างๆ"""
-    if not menu_items:
-        return []
-    
-    # วิเคราะห์คำค้นหา
-    query_info = parse_user_query(user_query)
-    
-    # กรองสินค้าตามเงื่อนไขราคาก่อน
-    filtered_products = filter_products_by_criteria(menu_items, query_info)
-    
-    if not filtered_products:
-        return []
-    
-    # ถ้ามีคำค้นหา ให้หาสินค้าที่ตรงกับคำค้นหา
-    if query_info['keywords']:
-        search_text = ' '.join(query_info['keywords'])
-        similarities = []
-        
-        for item in filtered_products:
-            score = word_similarity(search_text, item["name"].lower())
-            if score >= threshold:
-                similarities.append({
-                    "item": item,
-                    "score": score
-                })
-        
-        similarities.sort(key=lambda x: x["score"], reverse=True)
-        
-        unique_items = []
-        seen_names = set()
-        for sim in similarities:
-            item = sim["item"]
-            if item["name"] not in seen_names:
-                unique_items.append(item)
-                seen_names.add(item["name"])
-        
-        return unique_items[:top_k]
-    
-    # ถ้าไม่มีคำค้นหา แสดงสินค้าที่ตรงเงื่อนไขราคา เรียงตามราคา
-    else:
-        # เรียงตามราคา (ถ้าต้องการราคาต่ำ ให้เรียงจากต่ำไปสูง)
-        if query_info['max_price'] is not None:
-            filtered_products.sort(key=lambda x: extract_price_number(x.get('price', '0')))
-        else:
-            filtered_products.sort(key=lambda x: -extract_price_number(x.get('price', '0')))
-        
-        return filtered_products[:top_k]
-
-
-def create_product_carousel(products, search_query):
-    if not products:
-        return None
-
-    carousel_columns = []
-    for product in products:
-        title = product["name"][:40]
-        price = product["price"]
-        text = f"ราคา: {price}"[:60]
-
-        carousel_columns.append(
-            CarouselColumn(
-                thumbnail_image_url=product["image_url"],
-                title=title,
-                text=text,
-                actions=[
-                    MessageAction(label="รายละเอียด", text=f"รายละเอียด {product['name']}"),
-                    URIAction(label="สั่งซื้อ", uri=product["link"] or "https://example.com")
-                ]
-            )
-        )
-
-    return TemplateSendMessage(
-        alt_text=f"ผลการค้นหา: {search_query}",
-        template=CarouselTemplate(columns=carousel_columns)
-    )
-
-
-def is_product_related_query(user_message, menu_data):
-    """ตรวจสอบว่าข้อความเกี่ยวข้องกับการค้นหาสินค้าหรือไม่"""
-    # คำที่แสดงว่าต้องการดูเมนู
-    menu_keywords = ["เมนู", "menu", "สินค้า", "ของ", "อาหาร"]
-    
-    # คำที่แสดงว่าต้องการดูรายละเอียด
-    if user_message.startswith("รายละเอียด "):
-        return True
-    
-    # ตรวจสอบคำว่า "เมนู"
-    for keyword in menu_keywords:
-        if word_similarity(keyword, user_message) > 0.65:
-            return True
-    
-    # ตรวจสอบว่ามีคำเกี่ยวกับราคาหรือไม่
-    price_keywords = ["ราคา", "บาท", "ต่ำกว่า", "น้อยกว่า", "สูงกว่า", "มากกว่า", "ไม่เกิน", "เกิน", "ประมาณ"]
-    message_lower = user_message.lower()
-    has_price_keyword = any(keyword in message_lower for keyword in price_keywords)
-    
-    if has_price_keyword:
-        return True
-    
-    # ตรวจสอบว่ามีสินค้าที่คล้ายกับที่ผู้ใช้พิมพ์มาหรือไม่
-    similar_products = smart_product_search(user_message, menu_data, top_k=1, threshold=0.3)
-    if similar_products:
-        return True
-    
-    return False
-
-
-@handler.add(MessageEvent, message=TextMessage)
-def handle_message(event):
-    user_message = event.message.text.strip()
-    menu_data = fetch_cp_products_from_csv()
-
-    if not menu_data:
-        line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text="⚠️ ไม่พบข้อมูลเมนู")
-        )
-        return
-
-    # ตรวจสอบว่าเป็นคำขอดูเมนูหรือไม่
-    if word_similarity("menu", user_message) > 0.65 or word_similarity("เมนู", user_message) > 0.65:
-        top_items = menu_data[:10]
-        template_message = create_product_carousel(top_items, "เมนูแนะนำ")
-
-        if template_message:
-            line_bot_api.reply_message(event.reply_token, template_message)
-        else:
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="⚠️ ไม่สามารถแสดงเมนูได้ในขณะนี้")
-            )
-    
-    # ตรวจสอบว่าเป็นคำขอดูรายละเอียดหรือไม่
-    elif user_message.startswith("รายละเอียด "):
-        product_name = user_message.replace("รายละเอียด ", "").strip()
-        matched = next((item for item in menu_data if item["name"].strip().lower() == product_name.lower()), None)
-
-        if matched:
-            # ใช้ Ollama สรุปคำอธิบายก่อนแสดงผล
-            detail = matched["description"]
-            if detail:
-                summary = summarize_product_description(detail)
-                reply_text = f"📦 {matched['name']}:\n\n{summary}"
-            else:
-                reply_text = f"📦 {matched['name']}:\nไม่มีรายละเอียดเพิ่มเติม"
-
-            # จำกัดความยาวข้อความไม่เกิน 1000 ตัวอักษร
-            if len(reply_text) > 1000:
-                reply_text = reply_text[:997] + "..."
-
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text=reply_text)
-            )
-        else:
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text=f"❌ ไม่พบรายละเอียดของ '{product_name}'")
-            )
-    
-    # ตรวจสอบว่าเป็นการค้นหาสินค้าหรือไม่
-    elif is_product_related_query(user_message, menu_data):
-        similar_products = smart_product_search(user_message, menu_data, top_k=5, threshold=0.3)
-
-        if similar_products:
-            # วิเคราะห์คำค้นหาเพื่อสร้างข้อความตอบกลับ
-            query_info = parse_user_query(user_message)
-            search_title = user_message
-            
-            # ปรับข้อความแสดงผลตามเงื่อนไข
-            if query_info['max_price']:
-                search_title = f"สินค้าราคาไม่เกิน {query_info['max_price']} บาท"
-            elif query_info['min_price'] and query_info['max_price']:
-                search_title = f"สินค้าราคา {query_info['min_price']}-{query_info['max_price']} บาท"
-            elif query_info['min_price']:
-                search_title = f"สินค้าราคาตั้งแต่ {query_info['min_price']} บาท"
-            
-            template_message = create_product_carousel(similar_products, search_title)
-
-            if template_message:
-                line_bot_api.reply_message(event.reply_token, template_message)
-            else:
-                line_bot_api.reply_message(
-                    event.reply_token,
-                    TextSendMessage(text=f"❌ ไม่สามารถแสดงผลการค้นหา '{user_message}' ได้")
-                )
-        else:
-            # ใช้ Ollama ตอบกลับพร้อมแนะนำ
-            query_info = parse_user_query(user_message)
-            context = "ไม่พบสินค้าที่ตรงกับเงื่อนไขที่ต้องการ "
-            
-            if query_info['max_price']:
-                context += f"ราคาไม่เกิน {query_info['max_price']} บาท "
-            elif query_info['min_price']:
-                context += f"ราคาตั้งแต่ {query_info['min_price']} บาท ขึ้นไป "
-            
-            context += "สินค้าที่มีในร้าน ได้แก่ ข้าว, น้ำจิ้ม, ซุป"
-            
-            ollama_response = call_ollama(user_message, context)
-            
-            suggestion_text = f"{ollama_response}\n\n" \
-                              f"💡 ลองใช้คำค้นหาเช่น:\n" \
-                              f"• ข้าว\n" \
-                              f"• น้ำจิ้ม\n" \
-                              f"• ซุป\n" \
-                              f"• หรือพิมพ์ 'เมนู' เพื่อดูเมนูทั้งหมด"
-
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text=suggestion_text)   
-            )
-    
-    # สำหรับคำถามทั่วไปหรือการสนทนา ใช้ Ollama
-    else:
-        # สร้าง context จากข้อมูลเมนู (แค่ชื่อสินค้าเพื่อไม่ให้ยาวเกินไป)
-        menu_names = [item["name"] for item in menu_data[:20]]  # เอาแค่ 20 รายการ
-        context = f"สินค้าในร้าน CP: {', '.join(menu_names)}"
-        
-        ollama_response = call_ollama(user_message, context)
-        
-        line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text=ollama_response)
-        )
-
-
-if __name__ == "__main__":
-
-    app.run(port=5000)
+from flask import Flask, Response, request, abort
+from linebot import LineBotApi, WebhookHandler
+from linebot.exceptions import InvalidSignatureError
+from linebot.models import (
+    MessageEvent, TextMessage, TextSendMessage,URIAction,
+    CarouselColumn, MessageAction
+)
+from encoder import encoder_id, load_encoder
+from product_index import ProductIndex
+from lexical_index import LexicalIndex
+from embedding_store import EmbeddingStore
+from carousel_cache import CarouselCache, reply_cached
+from catalog_store import Catalog, CatalogStore, extract_product_id
+from price_index import PriceIndex
+from query_cache import QueryCache, normalize_query
+from intent_router import IntentRouter
+from event_worker import EventWorkerPool
+from summary_store import SummaryStore
+from ollama_client import OllamaClient
+from semantic_cache import SemanticCache
+from metrics import MetricsRegistry, StageTimer
+from profiling import RequestProfiler, register_admin_routes
+import csv
+import os
+import signal
+import sys
+import requests
+import json
+import re
+from functools import cached_property
+
+app = Flask(__name__)
+
+# LINE Credentials (ตั้งผ่าน environment ได้ เช่นตอนทดสอบด้วย benchmarks/loadtest.py)
+CHANNEL_SECRET = os.environ.get("LINE_CHANNEL_SECRET", 'xxx')
+CHANNEL_ACCESS_TOKEN = os.environ.get("LINE_CHANNEL_ACCESS_TOKEN", 'xxx')
+LINE_API_ENDPOINT = os.environ.get("LINE_API_ENDPOINT", "https://api.line.me")
+
+# Ollama Configuration
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = "llama3.2:3b"  # หรือ model อื่นที่คุณมี
+OLLAMA_CHAT_DEADLINE = 20     # วินาที ตัดคำตอบแชททันทีเมื่อเกินเวลานี้
+OLLAMA_SUMMARY_DEADLINE = 15  # วินาที
+MAX_REPLY_CHARS = 1000        # ความยาวข้อความตอบกลับสูงสุด
+OLLAMA_MAX_CONCURRENT = 4     # จำนวน generation ที่ส่งให้ Ollama พร้อมกันได้สูงสุด ที่เหลือรอคิว
+OLLAMA_POOL_SIZE = 8          # จำนวน keep-alive connection ใน pool
+
+# แคชคำตอบของ LLM ตามความหมายของคำถาม (ล้างอัตโนมัติเมื่อแคตตาล็อกเปลี่ยนเวอร์ชัน)
+SEMANTIC_CACHE_SIZE = 512
+SEMANTIC_CACHE_TTL = 1800           # วินาที
+SEMANTIC_CACHE_MAX_DISTANCE = 0.1   # cosine distance สูงสุดที่ถือว่าเป็นคำถามเดียวกัน
+
+# สรุปคำอธิบายสินค้าล่วงหน้า เก็บไว้ข้างไฟล์ CSV (คีย์คือ hash ของคำอธิบาย)
+SUMMARY_WORKERS = 2        # จำนวนคำขอสรุปที่ส่งให้ Ollama พร้อมกัน
+SUMMARIZE_ON_RELOAD = True
+
+ollama = OllamaClient(OLLAMA_URL, OLLAMA_MODEL, max_concurrent=OLLAMA_MAX_CONCURRENT, pool_size=OLLAMA_POOL_SIZE)
+
+line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN, endpoint=LINE_API_ENDPOINT)
+handler = WebhookHandler(CHANNEL_SECRET)
+
+# Webhook processing
+# 1 = ตอบ LINE ทันทีแล้วประมวลผลใน worker threads (ค่าเริ่มต้น: ประมวลผลใน request เดิมแบบเดิม)
+ASYNC_WEBHOOK = os.environ.get("ASYNC_WEBHOOK", "0") == "1"
+WEBHOOK_WORKERS = 4
+WEBHOOK_QUEUE_SIZE = 100
+
+# metrics แบบ Prometheus ที่ /metrics: เวลาของแต่ละขั้นตอนแยกตามประเภทคำตอบ + ตัวนับของแคช/คิว/Ollama
+metrics_registry = MetricsRegistry()
+STAGE_SECONDS = metrics_registry.histogram(
+    "linebot_stage_seconds", "Time spent in each stage of answering a message", ("intent", "stage"))
+MESSAGE_SECONDS = metrics_registry.histogram(
+    "linebot_message_seconds", "Total time to answer a message", ("intent",))
+
+# เก็บ profile ของข้อความที่ช้า (เปิดด้วย environment ไม่ต้องแก้โค้ด) ดูรายการได้ที่ /admin/profiles
+# โดยส่ง header Authorization: Bearer <LINEBOT_ADMIN_TOKEN> (ถ้าไม่ตั้ง token ไว้ endpoint จะปิด)
+PROFILE_SLOW_SECONDS = float(os.environ["PROFILE_SLOW_SECONDS"]) if os.environ.get("PROFILE_SLOW_SECONDS") else None
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))  # สัดส่วนข้อความที่เก็บ cProfile แบบเต็ม
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_TRACES = 50
+ADMIN_TOKEN = os.environ.get("LINEBOT_ADMIN_TOKEN")
+profiler = RequestProfiler(PROFILE_DIR, PROFILE_SLOW_SECONDS, PROFILE_SAMPLE_RATE, PROFILE_MAX_TRACES)
+OLLAMA_ERRORS = metrics_registry.counter(
+    "linebot_ollama_errors_total", "Chat calls to Ollama that returned no answer", ("reason",))
+
+# Product catalog
+PRODUCTS_CSV = "cp_products_detailed_new.csv"
+
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+# "torch", "torch-int8", "onnx" หรือ "onnx-int8" (เร็วกว่าบน CPU ตรวจความต่างของผลด้วย benchmarks/bench_encoder.py)
+ENCODER_BACKEND = "torch"
+model = load_encoder(MODEL_NAME, ENCODER_BACKEND)
+
+# embedding ของชื่อสินค้าถูกแคชไว้ข้างไฟล์ CSV ทุก process เปิดไฟล์เดียวกันแบบ read-only
+embedding_store = EmbeddingStore(PRODUCTS_CSV, encoder_id(MODEL_NAME, ENCODER_BACKEND))
+
+# วิธีหา top-k ของ embedding: "exact" (คูณเมทริกซ์ทุกชิ้น) หรือ "hnsw" (ANN ต้องติดตั้ง hnswlib
+# เหมาะกับแคตตาล็อกหลักแสนรายการขึ้นไป index ถูกบันทึกไว้ข้างไฟล์ CSV และอัปเดตเฉพาะสินค้าที่เปลี่ยน)
+# ชื่อไฟล์ใช้ prefix เดียวกับแคช embedding (แยกตามโมเดลและ backend) เวกเตอร์ต่าง encoder จึงไม่ปนกัน
+VECTOR_INDEX_BACKEND = "exact"
+VECTOR_INDEX_PATH = f"{embedding_store.prefix}.hnsw"
+
+summary_store = SummaryStore(f"{PRODUCTS_CSV}.summaries.json")
+
+
+@app.route("/", methods=['POST'])
+def callback():
+    signature = request.headers['X-Line-Signature']
+    body = request.get_data(as_text=True)
+
+    try:
+        events = handler.parser.parse(body, signature)
+    except InvalidSignatureError:
+        abort(400)
+
+    if ASYNC_WEBHOOK:
+        # ตอบ 200 ให้ LINE ทันที แล้วให้ worker ประมวลผลเบื้องหลัง
+        # ถ้าคิวเต็มตอบ 503 (LINE จะส่งซ้ำภายหลังถ้าเปิด webhook redelivery ไว้)
+        if not event_pool.submit(events):
+            abort(503)
+    else:
+        process_events(events)
+
+    return 'OK'
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+register_admin_routes(app, profiler, ADMIN_TOKEN)
+
+
+def generate_description_summary(description):
+    """ให้ Ollama สรุปคำอธิบายสินค้า คืน None ถ้าสรุปไม่ได้"""
+    try:
+        prompt = f"""กรุณาสรุปคำอธิบายสินค้านี้ให้กระชับและเข้าใจง่าย โดย:
+        - ลบ emoji และสัญลักษณ์พิเศษออก
+        - เน้นข้อมูลสำคัญเช่น ส่วนผสม คุณประโยชน์ ขนาด
+        - ใช้ภาษาไทยง่ายๆ ไม่เกิน 3-4 บรรทัด
+        - ไม่ต้องมีข้อมูลการจัดส่งหรือเงื่อนไขการสั่งซื้อ
+        
+        คำอธิบายเดิม: {description}
+        
+        สรุป:"""
+
+        result = ollama.generate(
+            prompt,
+            options={"temperature": 0.3, "num_predict": 200},
+            deadline=OLLAMA_SUMMARY_DEADLINE,
+            max_chars=MAX_REPLY_CHARS,
+        )
+        summary = result["text"]
+
+        # ตรวจสอบว่า summary ไม่ว่างและมีเนื้อหาที่เหมาะสม
+        if summary and len(summary) > 20:
+            return summary
+        return None
+
+    except Exception as e:
+        print(f"Summary error: {e}")
+        return None
+
+
+def summarize_product_description(description):
+    """ใช้ Ollama สรุปคำอธิบายสินค้าให้กระชับ"""
+    if not description or len(description.strip()) < 50:
+        return description
+
+    return generate_description_summary(description) or clean_description_manually(description)
+
+
+def get_product_summary(description):
+    """คืนสรุปที่สร้างไว้ล่วงหน้าจาก summary store ถ้ายังไม่มีใช้ clean_description_manually แทน"""
+    if not description or len(description.strip()) < 50:
+        return description
+
+    return summary_store.get(description) or clean_description_manually(description)
+
+
+def summarize_catalog_descriptions(products, wait=False):
+    """สรุปคำอธิบายที่ยังไม่มีใน summary store (เฉพาะรายการใหม่หรือที่เปลี่ยน)"""
+    descriptions = [
+        item["description"] for item in products
+        if item["description"] and len(item["description"].strip()) >= 50
+    ]
+    if wait:
+        return summary_store.summarize_missing(descriptions, generate_description_summary, SUMMARY_WORKERS)
+    summary_store.summarize_in_background(descriptions, generate_description_summary, SUMMARY_WORKERS)
+
+
+def clean_description_manually(description):
+    """ทำความสะอาดคำอธิบายแบบง่ายๆ หาก Ollama ไม่สามารถใช้ได้"""
+    if not description:
+        return "ไม่มีรายละเอียด"
+    
+    # ลบ emoji และสัญลักษณ์พิเศษ
+    clean_text = re.sub(r'[❤️✅‼️?️?]', '', description)
+    clean_text = re.sub(r'#\w+', '', clean_text)  # ลบ hashtag
+    clean_text = re.sub(r'-{3,}', '', clean_text)  # ลบเส้นประ
+    
+    # แยกเป็นประโยค
+    sentences = [s.strip() for s in clean_text.split('.') if s.strip()]
+    
+    # เอาเฉพาะประโยคสำคัญ (ไม่เกิน 4 ประโยคแรก)
+    important_sentences = []
+    for sentence in sentences[:4]:
+        if any(keyword in sentence for keyword in ['ส่วนผสม', 'โปรตีน', 'วิตามิน', 'พลังงาน', 'ซุป', 'อาหาร']):
+            important_sentences.append(sentence)
+    
+    # ถ้าไม่มีประโยคสำคัญ เอา 2 ประโยคแรก
+    if not important_sentences:
+        important_sentences = sentences[:2]
+    
+    result = '. '.join(important_sentences).strip()
+    
+    # จำกัดความยาว
+    if len(result) > 300:
+        result = result[:300] + "..."
+    
+    return result if result else "ไม่มีรายละเอียดเพิ่มเติม"
+
+def call_ollama(prompt, context="", catalog=None):
+    """เรียก Ollama API เพื่อสร้างคำตอบ (ถ้าส่ง catalog มา จะใช้คำตอบจาก semantic cache เมื่อเคยมีคำถามความหมายใกล้กัน)"""
+    query_embedding = None
+    if catalog is not None:
+        query_embedding = encode_query(prompt, catalog)
+        cached_answer = semantic_cache.get(query_embedding, context, catalog.version)
+        if cached_answer is not None:
+            return cached_answer
+
+    try:
+        full_prompt = f"""คุณเป็นผู้ช่วยในร้านอาหาร CP ที่ให้คำแนะนำเกี่ยวกับสินค้าและตอบคำถามของลูกค้า
+        
+        ข้อมูลบริบท: {context}
+        
+        คำถามของลูกค้า: {prompt}
+        
+        กรุณาตอบด้วยภาษาไทยในลักษณะที่เป็นมิตรและให้ข้อมูลที่เป็นประโยชน์ หากไม่มีข้อมูลที่เกี่ยวข้อง ให้แนะนำให้ลูกค้าดูเมนูหรือสินค้าที่มี
+        ตอบแค่ข้อความสั้นๆ ไม่เกิน 200 คำ"""
+
+        # stream แล้วตัดทันทีเมื่อเกินงบเวลาหรือยาวเกินที่ LINE จะแสดง (num_predict คือเพดาน token จริงของ Ollama)
+        result = ollama.generate(
+            full_prompt,
+            options={"temperature": 0.7, "num_predict": 300},
+            deadline=OLLAMA_CHAT_DEADLINE,
+            max_chars=MAX_REPLY_CHARS,
+        )
+        if not result["text"]:
+            OLLAMA_ERRORS.inc(result["stop_reason"])
+            return "ขออภัย ไม่สามารถตอบได้ในขณะนี้"
+
+        # แคชเฉพาะคำตอบที่สมบูรณ์ ไม่แคชข้อความแจ้งข้อผิดพลาด หรือคำตอบที่ถูกตัดเพราะหมดเวลา
+        # (ถ้าแคชไว้ คำถามที่คล้ายกันจะได้คำตอบครึ่งๆ กลางๆ จนกว่าแคชจะหมดอายุ)
+        if query_embedding is not None and result["stop_reason"] in ("done", "max_chars"):
+            semantic_cache.put(query_embedding, context, result["text"], catalog.version)
+        return result["text"]
+
+    except requests.exceptions.HTTPError:
+        OLLAMA_ERRORS.inc("http_error")
+        return "ขออภัย ระบบขัดข้อง กรุณาลองใหม่อีกครั้ง"
+    except requests.exceptions.RequestException:
+        OLLAMA_ERRORS.inc("connection_error")
+        return "ขออภัย ไม่สามารถเชื่อมต่อกับระบบได้ กรุณาลองใหม่อีกครั้ง"
+    except Exception as e:
+        print(f"Ollama error: {e}")
+        OLLAMA_ERRORS.inc("error")
+        return "ขออภัย เกิดข้อผิดพลาด กรุณาลองใหม่อีกครั้ง"
+
+
+
+def fetch_cp_products_from_csv(csv_path=PRODUCTS_CSV):
+    products = []
+    try:
+        with open(csv_path, newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                name = row.get("ชื่อสินค้า")
+                image = row.get("รูปภาพ")
+                price = row.get("ราคาปกติ")
+                link = row.get("ลิงก์")
+                desc = row.get("คำอธิบาย")
+
+                if name and image:
+                    # แปลงราคาเป็นตัวเลขครั้งเดียวตอนโหลด ไม่ต้อง regex ซ้ำทุกคำค้น
+                    price_value = extract_price_number(price)
+                    products.append({
+                        "id": len(products),
+                        "product_id": extract_product_id(link),
+                        "name": name,
+                        "image_url": image,
+                        "price": price,
+                        "description": desc,
+                        "link": link,
+                        "price_value": price_value,
+                    })
+    except FileNotFoundError:
+        print(f"⚠️ CSV file '{csv_path}' not found.")
+
+    return products
+
+
+def build_catalog(products, version, previous=None):
+    """สร้างแคตตาล็อกพร้อม index จากรายการสินค้าที่อ่านจาก CSV"""
+    catalog = Catalog(
+        products, version,
+        index=ProductIndex(
+            model, products, embedding_store,
+            vector_backend=VECTOR_INDEX_BACKEND,
+            vector_index_path=VECTOR_INDEX_PATH,
+            previous=previous.index if previous is not None else None,
+        ),
+        price_index=PriceIndex(products),
+        lexical_index=LexicalIndex(products),
+        carousels=CarouselCache(products, create_product_column),
+    )
+
+    # คำอธิบายใหม่หรือที่เปลี่ยนจะถูกสรุปเบื้องหลัง ระหว่างนี้ใช้ clean_description_manually ไปก่อน
+    if SUMMARIZE_ON_RELOAD:
+        summarize_catalog_descriptions(products)
+
+    return catalog
+
+
+# จำนวนสินค้าสูงสุดที่ lexical index คัดมาให้ embedding จัดอันดับ (แคตตาล็อกเล็กกว่านี้ค้นด้วย embedding ตรงๆ)
+LEXICAL_CANDIDATES = 100
+
+# แคชผลค้นหาและ embedding ของคำค้นที่ผู้ใช้พิมพ์ซ้ำบ่อยๆ (ล้างอัตโนมัติเมื่อแคตตาล็อกเปลี่ยนเวอร์ชัน)
+QUERY_CACHE_SIZE = 2048
+QUERY_CACHE_TTL = 600  # วินาที
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+semantic_cache = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_MAX_DISTANCE)
+
+
+def encode_query(text, catalog):
+    """เข้ารหัสคำค้นหา ถ้าเคยเข้ารหัสข้อความนี้แล้วจะใช้ค่าจากแคชโดยไม่เรียกโมเดล"""
+    query_text = normalize_query(text)
+    key = ("embedding", query_text)
+    embedding = query_cache.get(key, catalog.version)
+    if embedding is None:
+        embedding = catalog.index.encode_query(query_text)
+        query_cache.put(key, embedding, catalog.version)
+    return embedding
+
+
+def prefetch_query_embeddings(texts, catalog):
+    """เข้ารหัสคำค้นหลายข้อความด้วยการเรียกโมเดลครั้งเดียว แล้วเก็บลงแคชให้ encode_query ใช้ต่อ"""
+    pending = []
+    for text in texts:
+        query_text = normalize_query(text)
+        if query_text and query_text not in pending and not query_cache.contains(("embedding", query_text), catalog.version):
+            pending.append(query_text)
+
+    if pending:
+        embeddings = catalog.index.encode_texts(pending)
+        for query_text, embedding in zip(pending, embeddings):
+            query_cache.put(("embedding", query_text), embedding, catalog.version)
+
+
+# กฎแยกประเภทข้อความ เรียงตามลำดับความสำคัญ (anchor ถูกเข้ารหัสครั้งเดียวตอนเริ่ม)
+INTENT_RULES = [
+    {"intent": "detail", "prefix": "รายละเอียด "},
+    {"intent": "menu", "anchors": ["menu", "เมนู"], "threshold": 0.65},
+    {"intent": "price_search", "keywords": ["ราคา", "บาท", "ต่ำกว่า", "น้อยกว่า", "สูงกว่า", "มากกว่า", "ไม่เกิน", "เกิน", "ประมาณ"]},
+    {"intent": "product_search", "anchors": ["สินค้า", "ของ", "อาหาร"], "threshold": 0.65},
+]
+intent_router = IntentRouter(model, INTENT_RULES, default_intent="chit_chat")
+
+
+# pattern ราคาใน CSV (คอมไพล์ครั้งเดียว)
+BAHT_PATTERN = re.compile(r'฿\s*(\d{1,}(?:,\d{3})*(?:\.\d{2})?)')
+BAHT_WORD_PATTERN = re.compile(r'(\d{1,}(?:,\d{3})*(?:\.\d{2})?)\s*บาท')
+SLASH_PRICE_PATTERN = re.compile(r'(\d+)/(\d+)')
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d{2})?')
+
+
+def extract_price_number(price_string):
+    """แยกตัวเลขราคาออกมาจาก string โดยเฉพาะเจาะจงกับราคา"""
+    if not price_string:
+        return 0
+    
+    # ลบช่องว่างและแปลงเป็นตัวพิมพ์เล็ก
+    price_clean = price_string.strip()
+    
+    # หา pattern ที่มีสัญลักษณ์ ฿ หรือคำว่า "บาท"
+    # Pattern 1: ฿XX หรือ ฿XX.XX
+    match = BAHT_PATTERN.search(price_clean)
+    if match:
+        price_str = match.group(1).replace(',', '')
+        return float(price_str)
+    
+    # Pattern 2: XX บาท หรือ XX.XX บาท
+    match = BAHT_WORD_PATTERN.search(price_clean)
+    if match:
+        price_str = match.group(1).replace(',', '')
+        return float(price_str)
+    
+    # Pattern 3: ราคาเดิม ฿XX ราคาใหม่ ฿YY (เอาราคาใหม่)
+    multiple_prices = BAHT_PATTERN.findall(price_clean)
+    if len(multiple_prices) >= 2:
+        # เอาราคาตัวสุดท้าย (มักเป็นราคาที่ลดแล้ว)
+        return float(multiple_prices[-1].replace(',', ''))
+    
+    # Pattern 4: XX/YY (เช่น เดิม 150/ใหม่ 120) - เอาตัวสุดท้าย
+    match = SLASH_PRICE_PATTERN.search(price_clean)
+    if match:
+        return float(match.group(2))  # เอาตัวหลัง slash
+    
+    # ถ้าไม่เจอ pattern ไหนเลย ลองหาเลขที่อยู่ในช่วงราคาที่เป็นไปได้
+    all_numbers = NUMBER_PATTERN.findall(price_clean.replace(',', ''))
+    if all_numbers:
+        # กรองเอาเฉพาะตัวเลขที่อาจเป็นราคา (15-9999 บาท)
+        potential_prices = []
+        for num_str in all_numbers:
+            num = float(num_str)
+            if 15 <= num <= 9999:  # ช่วงราคาที่เป็นไปได้
+                potential_prices.append(num)
+        
+        if potential_prices:
+            return max(potential_prices)  # เอาราคาสูงสุด (มักเป็นราคาจริง)
+    
+    return 0
+
+
+# หาเงื่อนไขราคาด้วย pattern ที่เฉพาะเจาะจง (คอมไพล์ครั้งเดียวตอนโหลดโมดูล ไม่สร้างใหม่ทุกข้อความ)
+PRICE_PATTERNS = [
+    # ราคาต่ำกว่า, น้อยกว่า, ไม่เกิน + บาท
+    (re.compile(r'(?:ราคา)?(?:ต่ำกว่า|น้อยกว่า|ไม่เกิน)\s*(\d+)\s*(?:บาท)?'), 'max'),
+    # ราคาสูงกว่า, มากกว่า, เกิน + บาท
+    (re.compile(r'(?:ราคา)?(?:สูงกว่า|มากกว่า|เกิน)\s*(\d+)\s*(?:บาท)?'), 'min'),
+    # ราคาประมาณ, รอบๆ + บาท
+    (re.compile(r'(?:ราคา)?(?:ประมาณ|รอบ|รอบๆ)\s*(\d+)\s*(?:บาท)?'), 'around'),
+    # ราคา XX บาท
+    (re.compile(r'ราคา\s*(\d+)\s*บาท'), 'around'),
+    # เฉพาะคำว่า ราคา ตามด้วยตัวเลข (ไม่มี กรัม, มล., กก., ชิ้น ด้านหลัง)
+    (re.compile(r'ราคา\s*(\d+)(?!\s*(?:กรัม|มล|กก|ชิ้น|ก\.?|มล\.?))'), 'around'),
+]
+
+# คำที่เกี่ยวกับราคาและหน่วยต่างๆ ที่ลบออกก่อนใช้เป็นคำค้นหา
+KEYWORD_REMOVE_PATTERNS = [
+    re.compile(r'ราคา(?:ต่ำกว่า|น้อยกว่า|สูงกว่า|มากกว่า|ไม่เกิน|เกิน|ประมาณ|รอบ|รอบๆ)?\s*\d+\s*(?:บาท)?'),
+    re.compile(r'(?:ต่ำกว่า|น้อยกว่า|สูงกว่า|มากกว่า|ไม่เกิน|เกิน|ประมาณ|รอบ|รอบๆ)\s*\d+\s*(?:บาท)?'),
+    re.compile(r'\d+\s*(?:กรัม|มล|กก|ชิ้น|ก\.?|มล\.?)'),  # ลบข้อมูลขนาด
+    re.compile(r'(?:อยาก|ต้องการ|ขอ|หา|ให้)'),  # ลบคำขอร้อง
+]
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def parse_user_query(user_message):
+    """วิเคราะห์คำค้นหาของผู้ใช้เพื่อหาเงื่อนไขต่างๆ"""
+    query_info = {
+        'keywords': [],
+        'max_price': None,
+        'min_price': None,
+        'price_range': None,
+        'original_query': user_message.lower()
+    }
+    
+    message_lower = user_message.lower()
+    
+    for pattern, price_type in PRICE_PATTERNS:
+        match = pattern.search(message_lower)
+        if match:
+            price = int(match.group(1))
+            # ตรวจสอบว่าเป็นตัวเลขที่เป็นไปได้สำหรับราคา
+            if 10 <= price <= 9999:  # ช่วงราคาที่เหมาะสม
+                if price_type == 'max':
+                    query_info['max_price'] = price
+                elif price_type == 'min':
+                    query_info['min_price'] = price
+                elif price_type == 'around':
+                    # ประมาณ ±25%
+                    margin = int(price * 0.25)
+                    query_info['min_price'] = max(0, price - margin)
+                    query_info['max_price'] = price + margin
+                break
+    
+    # หาคำค้นหาหลักโดยลบเงื่อนไขราคาออก
+    keywords_text = message_lower
+    for pattern in KEYWORD_REMOVE_PATTERNS:
+        keywords_text = pattern.sub(' ', keywords_text)
+    
+    keywords_text = WHITESPACE_PATTERN.sub(' ', keywords_text).strip()
+    
+    if keywords_text:
+        query_info['keywords'] = [kw.strip() for kw in keywords_text.split() if len(kw.strip()) > 1]
+    
+    return query_info
+
+
+def filter_products_by_criteria(catalog, query_info, descending=False, limit=None):
+    """กรองสินค้าตามเงื่อนไขที่วิเคราะห์ได้ คืน id ของสินค้าที่ผ่านเงื่อนไข เรียงตามราคา"""
+    return catalog.price_index.range(query_info['min_price'], query_info['max_price'], descending, limit)
+
+
+# จำนวนสินค้าและคะแนนขั้นต่ำของผลค้นหาที่ตอบกลับเป็น carousel
+SEARCH_TOP_K = 5
+SEARCH_THRESHOLD = 0.3
+
+
+class QueryContext:
+    """ค่าที่ได้จากข้อความหนึ่งข้อความ (ผลวิเคราะห์คำค้น, embedding, สินค้าที่ผ่านเงื่อนไขราคา, ผลค้นหา)
+
+    แต่ละค่าคำนวณครั้งแรกที่ถูกใช้ แล้วทุกขั้นตอนของ handle_message ใช้ค่าเดิมซ้ำ
+    """
+
+    def __init__(self, message, catalog, timer=None):
+        self.message = message
+        self.catalog = catalog
+        self.timer = timer or StageTimer()
+
+    @cached_property
+    def embedding(self):
+        """embedding ของข้อความทั้งข้อความ (ใช้แยกประเภทข้อความ)"""
+        with self.timer.stage("encode"):
+            return encode_query(self.message, self.catalog)
+
+    @cached_property
+    def query_info(self):
+        with self.timer.stage("parse"):
+            return parse_user_query(self.message)
+
+    @cached_property
+    def search_text(self):
+        """คำค้นหาที่ตัดเงื่อนไขราคาและคำขอร้องออกแล้ว"""
+        return ' '.join(self.query_info['keywords'])
+
+    @cached_property
+    def search_embedding(self):
+        with self.timer.stage("encode"):
+            return encode_query(self.search_text, self.catalog)
+
+    @cached_property
+    def has_price_filter(self):
+        return self.query_info['max_price'] is not None or self.query_info['min_price'] is not None
+
+    @cached_property
+    def candidate_ids(self):
+        """id ของสินค้าที่ผ่านเงื่อนไขราคา (ถ้าต้องการราคาต่ำ ให้เรียงจากต่ำไปสูง) หรือ None ถ้าไม่มีเงื่อนไขราคา
+
+        ไม่มีเงื่อนไขราคาก็ไม่ต้อง copy id ของสินค้าทุกชิ้น
+        """
+        if not self.has_price_filter:
+            return None
+        query_info = self.query_info
+        with self.timer.stage("price_filter"):
+            return filter_products_by_criteria(self.catalog, query_info, descending=query_info['max_price'] is None)
+
+    @cached_property
+    def products(self):
+        """ผลค้นหาสินค้า ค้นครั้งเดียวต่อข้อความ"""
+        return smart_product_search(self.message, self.catalog, SEARCH_TOP_K, SEARCH_THRESHOLD, context=self)
+
+
+def smart_product_search(user_query, catalog, top_k=5, threshold=0.3, context=None):
+    """ค้นหาสินค้าแบบฉลาดโดยพิจารณาเงื่อนไขต่างๆ (คำค้นที่เคยค้นแล้วจะใช้ผลจากแคช)"""
+    key = ("search", normalize_query(user_query), top_k, threshold)
+    ranked_ids = query_cache.get(key, catalog.version)
+
+    if ranked_ids is None:
+        if context is None:
+            context = QueryContext(user_query, catalog)
+        results = rank_products(context, top_k, threshold)
+        ranked_ids = tuple(item["id"] for item in results)
+        query_cache.put(key, ranked_ids, catalog.version)
+
+    return [catalog.products[row] for row in ranked_ids]
+
+
+def rank_products(context, top_k=5, threshold=0.3):
+    """จัดอันดับสินค้าตามเงื่อนไขราคาและความใกล้เคียงของชื่อสินค้า"""
+    menu_items = context.catalog.products
+    if not menu_items:
+        return []
+    
+    # กรองสินค้าตามเงื่อนไขราคาก่อน (None = ไม่มีเงื่อนไขราคา ใช้ได้ทุกชิ้น)
+    candidate_ids = context.candidate_ids
+    
+    if candidate_ids is not None and not candidate_ids:
+        return []
+    
+    # ถ้ามีคำค้นหา ให้หาสินค้าที่ตรงกับคำค้นหา
+    if context.search_text:
+        # เข้ารหัสคำค้นหาครั้งเดียว แล้วให้คะแนนเฉพาะสินค้าที่ผ่านเงื่อนไขราคา
+        # ถ้าแคตตาล็อกใหญ่ จะคัดสินค้าด้วย n-gram ก่อนแล้วให้คะแนนเฉพาะสินค้าที่คัดมา
+        query_embedding = context.search_embedding
+        with context.timer.stage("rank"):
+            results = context.catalog.search(
+                context.search_text, query_embedding, top_k=top_k, threshold=threshold,
+                candidate_ids=candidate_ids,
+                lexical_limit=LEXICAL_CANDIDATES,
+            )
+
+        return [menu_items[row] for row, score in results]
+    
+    # ถ้าไม่มีคำค้นหา แสดงสินค้าที่ตรงเงื่อนไขราคา (เรียงตามราคาจากดัชนีแล้ว)
+    else:
+        if candidate_ids is None:
+            # ไม่มีเงื่อนไขราคา: อ่านแค่ top_k รายการแรกจากดัชนี (ราคาสูงไปต่ำ) ไม่ต้อง copy ทั้งหมด
+            candidate_ids = filter_products_by_criteria(context.catalog, context.query_info, descending=True, limit=top_k)
+        return [menu_items[row] for row in candidate_ids[:top_k]]
+
+
+def create_product_column(product):
+    """คอลัมน์ carousel ของสินค้าหนึ่งชิ้น (สร้างครั้งเดียวตอนโหลดแคตตาล็อก ดู CarouselCache)"""
+    title = product["name"][:40]
+    price = product["price"]
+    text = f"ราคา: {price}"[:60]
+
+    return CarouselColumn(
+        thumbnail_image_url=product["image_url"],
+        title=title,
+        text=text,
+        actions=[
+            # ส่ง product id แทนชื่อเต็ม ข้อความสั้นและหาได้ทันทีจาก catalog.find_product
+            MessageAction(label="รายละเอียด", text=f"รายละเอียด {product['product_id'] or product['name']}"),
+            URIAction(label="สั่งซื้อ", uri=product["link"] or "https://example.com")
+        ]
+    )
+
+
+def create_product_carousel(products, search_query, catalog):
+    """ประกอบ carousel จากคอลัมน์ที่สร้างไว้แล้วของแคตตาล็อก"""
+    return catalog.carousels.carousel([product["id"] for product in products], search_query)
+
+
+def is_product_related_query(user_message, catalog, intent=None, context=None):
+    """ตรวจสอบว่าข้อความเกี่ยวข้องกับการค้นหาสินค้าหรือไม่"""
+    if context is None:
+        context = QueryContext(user_message, catalog)
+    if intent is None:
+        intent = intent_router.classify(user_message, lambda: context.embedding)
+
+    # เมนู, รายละเอียด, คำเกี่ยวกับราคา หรือคำที่คล้าย "สินค้า/ของ/อาหาร"
+    if intent != "chit_chat":
+        return True
+
+    # ตรวจสอบว่ามีสินค้าที่คล้ายกับที่ผู้ใช้พิมพ์มาหรือไม่ (ผลค้นหาเก็บไว้ใน context ให้ handle_message ใช้ต่อ)
+    if context.products:
+        return True
+
+    return False
+
+
+@handler.add(MessageEvent, message=TextMessage)
+def handle_message(event):
+    # จับเวลาแต่ละขั้นตอน แล้วบันทึกลง histogram แยกตามประเภทคำตอบ (ดู /metrics)
+    timer = StageTimer()
+    branch = "error"
+    with profiler.profile() as capture:
+        try:
+            branch = respond_to_message(event, timer)
+        finally:
+            timer.finish(STAGE_SECONDS, MESSAGE_SECONDS, branch)
+            capture.annotate(intent=branch, stages=timer.stages)
+
+
+def respond_to_message(event, timer):
+    """ตอบข้อความหนึ่งข้อความ คืนชื่อประเภทคำตอบ (menu, detail, search, llm_fallback, chit_chat)"""
+    user_message = event.message.text.strip()
+    with timer.stage("catalog"):
+        catalog = catalog_store.get()
+    menu_data = catalog.products
+
+    if not menu_data:
+        with timer.stage("reply"):
+            line_bot_api.reply_message(
+                event.reply_token,
+                TextSendMessage(text="⚠️ ไม่พบข้อมูลเมนู")
+            )
+        return "empty_catalog"
+
+    # ค่าที่คำนวณจากข้อความนี้ (embedding, เงื่อนไขราคา, ผลค้นหา) คำนวณครั้งเดียวแล้วใช้ซ้ำทุกขั้นตอน
+    context = QueryContext(user_message, catalog, timer)
+
+    # เข้ารหัสข้อความครั้งเดียว แล้วแยกประเภทกับ anchor ทุกตัวในรอบเดียว
+    intent = intent_router.classify(user_message, lambda: context.embedding)
+
+    # ตรวจสอบว่าเป็นคำขอดูเมนูหรือไม่
+    if intent == "menu":
+        # carousel เมนูแนะนำถูกสร้างและ serialize ไว้แล้วตอนโหลดแคตตาล็อก
+        with timer.stage("reply"):
+            if catalog.carousels.menu:
+                reply_cached(line_bot_api, event.reply_token, catalog.carousels.menu)
+            else:
+                line_bot_api.reply_message(
+                    event.reply_token,
+                    TextSendMessage(text="⚠️ ไม่สามารถแสดงเมนูได้ในขณะนี้")
+                )
+        return "menu"
+    
+    # ตรวจสอบว่าเป็นคำขอดูรายละเอียดหรือไม่
+    if intent == "detail":
+        product_name = user_message.replace("รายละเอียด ", "").strip()
+        with timer.stage("lookup"):
+            matched = catalog.find_product(product_name)
+
+            if matched:
+                # ใช้สรุปที่ Ollama สร้างไว้ล่วงหน้า (ไม่เรียก Ollama ระหว่างตอบข้อความ)
+                detail = matched["description"]
+                if detail:
+                    summary = get_product_summary(detail)
+                    reply_text = f"📦 {matched['name']}:\n\n{summary}"
+                else:
+                    reply_text = f"📦 {matched['name']}:\nไม่มีรายละเอียดเพิ่มเติม"
+
+                # จำกัดความยาวข้อความไม่เกิน 1000 ตัวอักษร
+                if len(reply_text) > 1000:
+                    reply_text = reply_text[:997] + "..."
+            else:
+                reply_text = f"❌ ไม่พบรายละเอียดของ '{product_name}'"
+
+        with timer.stage("reply"):
+            line_bot_api.reply_message(
+                event.reply_token,
+                TextSendMessage(text=reply_text)
+            )
+        return "detail"
+    
+    # ตรวจสอบว่าเป็นการค้นหาสินค้าหรือไม่
+    if is_product_related_query(user_message, catalog, intent, context):
+        similar_products = context.products
+
+        if similar_products:
+            # วิเคราะห์คำค้นหาเพื่อสร้างข้อความตอบกลับ
+            query_info = context.query_info
+            search_title = user_message
+            
+            # ปรับข้อความแสดงผลตามเงื่อนไข
+            if query_info['max_price']:
+                search_title = f"สินค้าราคาไม่เกิน {query_info['max_price']} บาท"
+            elif query_info['min_price'] and query_info['max_price']:
+                search_title = f"สินค้าราคา {query_info['min_price']}-{query_info['max_price']} บาท"
+            elif query_info['min_price']:
+                search_title = f"สินค้าราคาตั้งแต่ {query_info['min_price']} บาท"
+            
+            template_message = create_product_carousel(similar_products, search_title, catalog)
+
+            with timer.stage("reply"):
+                if template_message:
+                    line_bot_api.reply_message(event.reply_token, template_message)
+                else:
+                    line_bot_api.reply_message(
+                        event.reply_token,
+                        TextSendMessage(text=f"❌ ไม่สามารถแสดงผลการค้นหา '{user_message}' ได้")
+                    )
+            return "search"
+
+        # ใช้ Ollama ตอบกลับพร้อมแนะนำ
+        query_info = context.query_info
+        context_text = "ไม่พบสินค้าที่ตรงกับเงื่อนไขที่ต้องการ "
+        
+        if query_info['max_price']:
+            context_text += f"ราคาไม่เกิน {query_info['max_price']} บาท "
+        elif query_info['min_price']:
+            context_text += f"ราคาตั้งแต่ {query_info['min_price']} บาท ขึ้นไป "
+        
+        context_text += "สินค้าที่มีในร้าน ได้แก่ ข้าว, น้ำจิ้ม, ซุป"
+        
+        with timer.stage("ollama"):
+            ollama_response = call_ollama(user_message, context_text, catalog)
+        
+        suggestion_text = f"{ollama_response}\n\n" \
+                          f"💡 ลองใช้คำค้นหาเช่น:\n" \
+                          f"• ข้าว\n" \
+                          f"• น้ำจิ้ม\n" \
+                          f"• ซุป\n" \
+                          f"• หรือพิมพ์ 'เมนู' เพื่อดูเมนูทั้งหมด"
+
+        with timer.stage("reply"):
+            line_bot_api.reply_message(
+                event.reply_token,
+                TextSendMessage(text=suggestion_text)   
+            )
+        return "llm_fallback"
+    
+    # สำหรับคำถามทั่วไปหรือการสนทนา ใช้ Ollama
+    # สร้าง context จากข้อมูลเมนู (แค่ชื่อสินค้าเพื่อไม่ให้ยาวเกินไป)
+    menu_names = [item["name"] for item in menu_data[:20]]  # เอาแค่ 20 รายการ
+    context_text = f"สินค้าในร้าน CP: {', '.join(menu_names)}"
+    
+    with timer.stage("ollama"):
+        ollama_response = call_ollama(user_message, context_text, catalog)
+    
+    with timer.stage("reply"):
+        line_bot_api.reply_message(
+            event.reply_token,
+            TextSendMessage(text=ollama_response)
+        )
+    return "chit_chat"
+
+
+def process_events(events):
+    """ส่ง event ที่ parse แล้วไปยัง handler ที่ลงทะเบียนไว้"""
+    text_events = [
+        event for event in events
+        if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage)
+    ]
+
+    # webhook เดียวมีหลายข้อความ (เช่นในกลุ่มแชท): เข้ารหัสทุกข้อความด้วยการเรียกโมเดลครั้งเดียว
+    if len(text_events) > 1:
+        texts = [event.message.text.strip() for event in text_events]
+        texts = [text for text in texts if intent_router.needs_embedding(text)]
+        # ข้อความที่ต้องค้นสินค้าจะเข้ารหัสคำค้นที่ตัดเงื่อนไขราคาออกแล้วด้วย (ดู rank_products)
+        texts += [' '.join(parse_user_query(text)['keywords']) for text in texts]
+        prefetch_query_embeddings(texts, catalog_store.get())
+
+    for event in text_events:
+        handle_message(event)
+
+
+# โหลดแคตตาล็อกครั้งเดียวตอนเริ่ม แล้วโหลดใหม่เบื้องหลังเมื่อไฟล์ CSV เปลี่ยน
+catalog_store = CatalogStore(PRODUCTS_CSV, fetch_cp_products_from_csv, build_catalog)
+
+event_pool = EventWorkerPool(process_events, workers=WEBHOOK_WORKERS, max_queue=WEBHOOK_QUEUE_SIZE)
+
+metrics_registry.register_stats("linebot_catalog", catalog_store.stats, counters=("reloads", "reload_failures"))
+metrics_registry.register_stats("linebot_query_cache", query_cache.stats,
+                                counters=("hits", "misses", "evictions", "expirations", "invalidations"))
+metrics_registry.register_stats("linebot_semantic_cache", semantic_cache.stats,
+                                counters=("hits", "misses", "evictions", "invalidations"))
+metrics_registry.register_stats("linebot_ollama", ollama.stats,
+                                counters=("requests", "failures", "queue_timeouts", "tokens_total"))
+metrics_registry.register_stats("linebot_webhook", event_pool.stats,
+                                counters=("submitted", "processed", "rejected", "failed"))
+
+
+if __name__ == "__main__":
+    # python botcpwith_ollama.py --summarize : สรุปคำอธิบายทั้งแคตตาล็อกล่วงหน้าแล้วออก (ไม่เปิดเซิร์ฟเวอร์)
+    if "--summarize" in sys.argv:
+        summarize_catalog_descriptions(catalog_store.get().products, wait=True)
+        sys.exit(0)
+
+    # kill -HUP <pid> เพื่อสั่งโหลดแคตตาล็อกใหม่ทันที (ไม่ต้องรอเช็ค mtime)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: catalog_store.reload())
+
+    # เซิร์ฟเวอร์สำหรับพัฒนา ใช้งานจริงแบบหลาย process: python serve.py botcpwith_ollama --workers 4
+    app.run(port=5000)
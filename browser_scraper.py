@@ -0,0 +1,377 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from catalog_store import extract_product_id
+from scrape_state import listing_key
+from scraping import (
+    BASE_URL, MAX_PAGES, MAX_RETRIES, REQUESTS_PER_SECOND, SCRAPER_WORKERS,
+    HostRateLimiter, find_page_pattern, with_retries,
+)
+
+WAIT_TIMEOUT = 10.0      # วินาทีที่รอให้องค์ประกอบในหน้าโผล่ขึ้นมา
+PAGE_LOAD_TIMEOUT = 30.0
+RETRY_ON = (WebDriverException, OSError)  # โหลดหน้าไม่ขึ้น/Chrome พัง/เครือข่ายล้มเหลว
+
+PRODUCT_CONTAINER_SELECTOR = ".product, .item, .card, .product-item, div[class*='product']"
+NAME_SELECTORS = ["h1", "h2", "h3", "h4", "h5", ".product-name", ".item-name", ".title", ".name"]
+DESCRIPTION_SELECTOR = ".product-description, .description, [class*=desc]"
+PRICE_SELECTOR = ".price, .product-price, [class*=price]"
+NEXT_BUTTON_XPATHS = [
+    "//button[contains(text(), 'ถัดไป')]",
+    "//a[contains(text(), 'ถัดไป')]",
+    "//button[contains(text(), 'Next')]",
+    "//a[contains(text(), 'Next')]",
+    "//button[contains(text(), '>>')]",
+    "//a[contains(text(), '>>')]",
+    "//*[contains(@class, 'next')]",
+    "//*[contains(@class, 'pagination-next')]",
+]
+
+
+def create_driver(headless=True):
+    """เปิด Chrome หนึ่ง session"""
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--window-size=1366,900')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+    # ไม่ต้องโหลดรูป (ใช้แค่ URL จาก src) และไม่ต้องรอทุก resource เพราะรอองค์ประกอบที่ต้องการเองอยู่แล้ว
+    chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    chrome_options.page_load_strategy = "eager"
+
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    return driver
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class DriverPool:
+    """Chrome หลาย session ให้ thread ยืมไปใช้ทีละ session
+
+    เปิด session ใหม่เฉพาะตอนที่ไม่มีตัวว่าง (ไม่เกิน size) และ session ที่พังจะถูกปิดแล้วเปิดใหม่ตอนยืมครั้งถัดไป
+    """
+
+    def __init__(self, size, factory=create_driver):
+        self.size = size
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)  # None = ช่องที่ยังไม่ได้เปิด Chrome
+
+    def acquire(self):
+        driver = self._idle.get()
+        if driver is None:
+            try:
+                driver = self.factory()
+            except BaseException:
+                self._idle.put(None)
+                raise
+        return driver
+
+    def release(self, driver, broken=False):
+        if broken:
+            _quit(driver)
+            driver = None
+        self._idle.put(driver)
+
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except TimeoutException:
+            raise
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken)
+
+    def close(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if driver is not None:
+                _quit(driver)
+
+
+class BrowserScraper:
+    """ดึงรายการสินค้าด้วย Chrome จากหน้า listing แล้วเปิดหน้ารายละเอียดพร้อมกันผ่าน DriverPool
+
+    ใช้เป็นทางสำรองเมื่อดึงจาก __NEXT_DATA__ (next_data.py) ไม่ได้
+    ถ้าให้ state (ScrapeState) จะข้ามหน้าสินค้าที่ชื่อ รูป และราคาใน listing ไม่เปลี่ยน และบันทึกสถานะหลังจบทุกหน้า
+    (ทำต่อจากหน้าที่ค้างได้เฉพาะเว็บที่เปลี่ยนหน้าด้วย URL ถ้าต้องกดปุ่ม next จะเริ่มหน้าแรกใหม่)
+    """
+
+    def __init__(self, base_url=BASE_URL, workers=SCRAPER_WORKERS, requests_per_second=REQUESTS_PER_SECOND,
+                 retries=MAX_RETRIES, wait_timeout=WAIT_TIMEOUT, headless=True, state=None):
+        self.base_url = base_url
+        self.workers = max(1, workers)
+        self.retries = retries
+        self.wait_timeout = wait_timeout
+        self.state = state
+
+        self.limiter = HostRateLimiter(requests_per_second)
+        self.pool = DriverPool(self.workers, lambda: create_driver(headless))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scraper")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    def _load(self, driver, url, ready_selector):
+        """เปิด url แล้วรอจนมีองค์ประกอบตาม ready_selector (คืน False ถ้ารอจนหมดเวลาแล้วยังไม่มี)"""
+        self.limiter.wait(url)
+        driver.get(url)
+        try:
+            WebDriverWait(driver, self.wait_timeout).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, ready_selector)))
+            return True
+        except TimeoutException:
+            return False
+
+    def get_product_details(self, product_url):
+        """เปิดหน้ารายละเอียดสินค้าแล้วดึงคำอธิบายและราคา"""
+        with self.pool.driver() as driver:
+            self._load(driver, product_url, f"{DESCRIPTION_SELECTOR}, {PRICE_SELECTOR}")
+
+            details = {}
+
+            # คำอธิบาย
+            try:
+                desc_elem = driver.find_element(By.CSS_SELECTOR, DESCRIPTION_SELECTOR)
+                details['description'] = desc_elem.text.strip()
+            except WebDriverException:
+                details['description'] = 'ไม่พบคำอธิบาย'
+
+            # ราคา
+            try:
+                price_elem = driver.find_element(By.CSS_SELECTOR, PRICE_SELECTOR)
+                details['price'] = price_elem.text.strip()
+            except WebDriverException:
+                details['price'] = 'ไม่พบราคา'
+
+            return details
+
+    def _details_or_error(self, product_url):
+        if not product_url:
+            return {'description': 'ไม่มีลิงก์', 'price': ''}
+        try:
+            return with_retries(self.get_product_details, product_url, retries=self.retries, label=product_url,
+                                retry_on=RETRY_ON)
+        except Exception as e:
+            print(f"เกิดข้อผิดพลาดในหน้าสินค้า: {e}")
+            return {'description': 'เกิดข้อผิดพลาด', 'price': ''}
+
+    def details_for(self, product_urls):
+        """คำอธิบายและราคาของหลายหน้าสินค้า เปิดพร้อมกัน (ผลลัพธ์เรียงตาม product_urls)"""
+        return list(self._executor.map(self._details_or_error, product_urls))
+
+    @staticmethod
+    def extract_listing(driver):
+        """ชื่อ, รูปภาพ, ราคา และลิงก์ของสินค้าทุกชิ้นในหน้าที่เปิดอยู่"""
+        entries = []
+        containers = driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR)
+        print(f"🔍 พบสินค้าทั้งหมด: {len(containers)} รายการ")
+
+        for idx, container in enumerate(containers, 1):
+            try:
+                product_name = ""
+
+                # ชื่อสินค้า
+                for sel in NAME_SELECTORS:
+                    name_elems = container.find_elements(By.CSS_SELECTOR, sel)
+                    if name_elems and name_elems[0].text.strip():
+                        product_name = name_elems[0].text.strip()
+                        break
+
+                if not product_name or len(product_name) < 4:
+                    continue
+
+                # รูปภาพ
+                img_elems = container.find_elements(By.TAG_NAME, "img")
+                image_url = (img_elems[0].get_attribute("src") or img_elems[0].get_attribute("data-src")) if img_elems else ""
+
+                # ลิงก์สินค้า
+                link_elems = container.find_elements(By.CSS_SELECTOR, "a")
+                product_link = link_elems[0].get_attribute("href") if link_elems else ""
+
+                # ราคาที่แสดงใน listing (ใช้ตรวจว่าสินค้าเปลี่ยนหรือไม่ ราคาที่บันทึกมาจากหน้ารายละเอียด)
+                price_elems = container.find_elements(By.CSS_SELECTOR, PRICE_SELECTOR)
+                listing_price = price_elems[0].text.strip() if price_elems else ""
+
+                entries.append({'index': idx, 'name': product_name, 'image': image_url or '', 'url': product_link or '',
+                                'price': listing_price})
+            except WebDriverException as e:
+                print(f"⚠️ เกิดข้อผิดพลาดกับสินค้าชิ้นที่ {idx}: {e}")
+
+        return entries
+
+    def _listing(self, url):
+        with self.pool.driver() as driver:
+            if not self._load(driver, url, PRODUCT_CONTAINER_SELECTOR):
+                return []
+            return self.extract_listing(driver)
+
+    def _with_details(self, entries, page_num):
+        """เปิดหน้ารายละเอียดของทุกรายการพร้อมกัน (ผลลัพธ์เรียงตามลำดับเดิม)"""
+        products_data = []
+        for entry in entries:
+            products_data.append({
+                'name': entry['name'],
+                'image': entry['image'] if entry['image'] else 'ไม่พบรูปภาพ',
+                'price': '',
+                'description': '',
+                'url': entry['url'],
+                'source': f'หน้า {page_num}',
+                'id': extract_product_id(entry['url']) or entry['url'] or entry['name'],
+                'listing_key': listing_key(entry['name'], entry['image'], entry['price'], entry['url']),
+            })
+
+        # สินค้าที่ listing ไม่เปลี่ยนจากรอบก่อนใช้คำอธิบายและราคาเดิม ไม่ต้องเปิดหน้ารายละเอียด
+        pending = products_data
+        if self.state is not None:
+            pending = [product for product in products_data
+                       if not self.state.reuse_details(product, keys=("description", "price"))]
+        for product, details in zip(pending, self.details_for([product['url'] for product in pending])):
+            product['price'] = details['price']
+            product['description'] = details['description']
+
+        for entry in entries:
+            print(f"✅ [{entry['index']}] {entry['name'][:50]}...")
+        return products_data
+
+    def scrape_page(self, url, page_num):
+        """ดึงข้อมูลจากหน้าหนึ่ง - ทั้งชื่อ, รูปภาพ, ลิงก์ และรายละเอียดภายใน"""
+        print(f"\n📄 กำลังดึงข้อมูลจากหน้า {page_num}: {url}")
+        try:
+            entries = with_retries(self._listing, url, retries=self.retries, label=f"หน้า {page_num}",
+                                   retry_on=RETRY_ON)
+        except Exception as e:
+            print(f"❌ Error scraping page {page_num}: {e}")
+            return None
+        return self._with_details(entries, page_num)
+
+    def scrape_by_pattern(self, pattern, max_pages, done_pages=()):
+        """ดึงทีละหน้าตาม pattern ต่อจาก done_pages (หน้าที่เสร็จแล้วจากรอบที่ค้าง) คืน (สินค้า, ครบทุกหน้าหรือไม่)"""
+        all_products_data = [product for page in done_pages for product in page]
+        for page in range(len(done_pages) + 1, max_pages + 1):
+            page_products = self.scrape_page(pattern.format(page), page)
+            if page_products is None and self.state is not None:
+                # ไม่บันทึกหน้าที่ล้มเหลว รันอีกครั้งจะเริ่มจากหน้านี้
+                print(f"⚠️ หยุดที่หน้า {page} รันอีกครั้งเพื่อทำต่อจากหน้านี้")
+                return all_products_data, False
+            if self.state is not None:
+                self.state.checkpoint(page_products)
+
+            if page_products:
+                all_products_data.extend(page_products)
+                print(f"หน้า {page}: พบ {len(page_products)} รายการ")
+                # แสดงตัวอย่าง 2 รายการแรก
+                for i, product in enumerate(page_products[:2], 1):
+                    print(f"  {i}. {product['name'][:50]}...")
+            else:
+                print(f"หน้า {page}: ไม่พบข้อมูลหรือหน้าไม่มีอยู่")
+                if page > 2:  # ถ้าหน้า 3+ ไม่มีข้อมูล ให้หยุด
+                    break
+        return all_products_data, True
+
+    def scrape_by_next_button(self, max_pages):
+        """เริ่มจากหน้าแรกแล้วกดปุ่ม next ไปเรื่อยๆ (ต้องใช้ session เดียวตลอดเพราะหน้าเปลี่ยนด้วย JavaScript)
+
+        เก็บรายการของทุกหน้าก่อนแล้วค่อยเปิดหน้ารายละเอียด เพื่อคืน session ให้พูลก่อน (กันค้างเมื่อ workers=1)
+        """
+        pages = []
+        driver = self.pool.acquire()
+        broken = False
+        try:
+            self._load(driver, self.base_url, PRODUCT_CONTAINER_SELECTOR)
+
+            for page_num in range(1, max_pages + 1):
+                print(f"\n=== หน้า {page_num} ===")
+                pages.append((page_num, self.extract_listing(driver)))
+                if page_num == max_pages or not self._click_next(driver):
+                    break
+        except WebDriverException as e:
+            broken = not isinstance(e, TimeoutException)
+            print(f"❌ Error while paging: {e}")
+        finally:
+            self.pool.release(driver, broken)
+
+        all_products_data = []
+        for page_num, entries in pages:
+            current_products = self._with_details(entries, page_num)
+            if self.state is not None:
+                self.state.checkpoint(current_products)
+            all_products_data.extend(current_products)
+            print(f"หน้า {page_num}: พบ {len(current_products)} รายการ")
+        return all_products_data
+
+    def _click_next(self, driver):
+        for selector in NEXT_BUTTON_XPATHS:
+            buttons = driver.find_elements(By.XPATH, selector)
+            if not buttons or not buttons[0].is_enabled():
+                continue
+
+            first = driver.find_elements(By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR)
+            driver.execute_script("arguments[0].click();", buttons[0])
+            # รอให้รายการเดิมหายไปแล้วรายการใหม่โผล่ขึ้นมา
+            try:
+                if first:
+                    WebDriverWait(driver, self.wait_timeout).until(EC.staleness_of(first[0]))
+                WebDriverWait(driver, self.wait_timeout).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_CONTAINER_SELECTOR)))
+            except TimeoutException:
+                print("⚠️ หน้าถัดไปโหลดไม่ทัน")
+            return True
+
+        print("ไม่พบปุ่ม next")
+        return False
+
+    def run(self, max_pages=MAX_PAGES, restart=False):
+        done_pages = self.state.resume(self.base_url, restart) if self.state is not None else []
+        pattern = find_page_pattern(self.base_url, self.limiter)
+        if pattern:
+            all_products_data, complete = self.scrape_by_pattern(pattern, max_pages, done_pages)
+        else:
+            print("ไม่พบ URL pattern ที่รู้จัก ลองใช้วิธีคลิกปุ่ม next")
+            if done_pages:
+                self.state.resume(self.base_url, restart=True)
+            all_products_data, complete = self.scrape_by_next_button(max_pages), True
+
+        if self.state is not None and complete:
+            self.state.finish()
+        return all_products_data
+
+    def print_debug_info(self):
+        """พิมพ์ข้อมูลของหน้าแรกไว้ตรวจสอบเมื่อไม่พบสินค้าเลย"""
+        with self.pool.driver() as driver:
+            self._load(driver, self.base_url, "img")
+            print(f"\nPage Title: {driver.title}")
+            print(f"Current URL: {driver.current_url}")
+
+            # ดูรูปภาพทั้งหมดในหน้า
+            all_images = driver.find_elements(By.TAG_NAME, "img")
+            print(f"พบรูปภาพทั้งหมด: {len(all_images)} รูป")
+            for i, img in enumerate(all_images[:5], 1):
+                src = img.get_attribute('src')
+                print(f"  {i}. {src}")
@@ -0,0 +1,57 @@
+import json
+
+from linebot.models import CarouselTemplate, TemplateSendMessage
+
+# LINE carousel แสดงได้ไม่เกิน 10 คอลัมน์
+MAX_CAROUSEL_COLUMNS = 10
+
+REPLY_PATH = "/v2/bot/message/reply"
+
+
+class CachedMessage:
+    """ข้อความที่สร้างและ serialize เป็น JSON ไว้แล้ว ตอบกลับได้โดยไม่ต้องสร้าง object หรือ encode ใหม่"""
+
+    def __init__(self, message):
+        self.message = message
+        self.json = json.dumps(message.as_json_dict(), ensure_ascii=False)
+
+
+class CarouselCache:
+    """CarouselColumn ของสินค้าทุกชิ้น สร้างครั้งเดียวตอนโหลดแคตตาล็อก
+
+    column_fn(product) สร้างคอลัมน์ของสินค้าหนึ่งชิ้น ผลค้นหาแต่ละครั้งแค่หยิบคอลัมน์ที่สร้างไว้มาประกอบ
+    ส่วนเมนูแนะนำ (สินค้า menu_size ชิ้นแรก) เก็บเป็นข้อความที่ serialize แล้วทั้งก้อน
+    """
+
+    def __init__(self, products, column_fn, menu_size=MAX_CAROUSEL_COLUMNS, menu_title="เมนูแนะนำ"):
+        self.columns = [column_fn(product) for product in products]
+        self.menu = None
+        if products:
+            self.menu = CachedMessage(self.carousel(range(min(menu_size, len(products))), menu_title))
+
+    def carousel(self, ids, search_query):
+        """ประกอบ carousel จากคอลัมน์ที่สร้างไว้แล้วของสินค้า id เหล่านี้ คืน None ถ้าไม่มีสินค้า"""
+        columns = [self.columns[product_id] for product_id in ids][:MAX_CAROUSEL_COLUMNS]
+        if not columns:
+            return None
+
+        return TemplateSendMessage(
+            alt_text=f"ผลการค้นหา: {search_query}",
+            template=CarouselTemplate(columns=columns)
+        )
+
+
+def reply_cached(line_bot_api, reply_token, cached):
+    """ตอบกลับด้วย CachedMessage โดยส่ง JSON ที่ serialize ไว้แล้วตรงๆ
+
+    ถ้า SDK ไม่มี LineBotApi._post (เช่นเวอร์ชันอื่น) จะส่งผ่าน reply_message ตามปกติ
+    _post เป็น method ภายใน: รุ่นของ line-bot-sdk ถูก pin ไว้ใน requirements.txt และ tests/test_carousel_cache.py
+    ตรวจว่า argument และ body ยังตรงกับที่ reply_message ส่ง
+    """
+    post = getattr(line_bot_api, "_post", None)
+    if post is None:
+        line_bot_api.reply_message(reply_token, cached.message)
+        return
+
+    body = '{"replyToken":' + json.dumps(reply_token) + ',"messages":[' + cached.json + ']}'
+    post(REPLY_PATH, data=body.encode("utf-8"))
@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+import time
+
+# ลิงก์สินค้าเป็นรูปแบบ https://shop.cpbrandsite.com/th/product/<id>/...
+PRODUCT_ID_PATTERN = re.compile(r"/product/(\d+)")
+
+
+def extract_product_id(link):
+    """ดึง product id จากลิงก์สินค้า คืน None ถ้าไม่พบ"""
+    if not link:
+        return None
+    match = PRODUCT_ID_PATTERN.search(link)
+    return match.group(1) if match else None
+
+
+def normalize_name(name):
+    return name.strip().lower()
+
+
+class Catalog:
+    """สแนปช็อตของแคตตาล็อกที่โหลดเสร็จแล้ว ห้ามแก้ไขหลังสร้าง (request ที่ถืออยู่จะเห็นข้อมูลชุดเดิมเสมอ)"""
+
+    def __init__(self, products, version, index=None, price_index=None, lexical_index=None, carousels=None):
+        self.products = products
+        self.version = version
+        self.index = index
+        self.price_index = price_index
+        self.lexical_index = lexical_index
+        self.carousels = carousels
+
+        # ดัชนีสำหรับ "รายละเอียด": ชื่อที่ normalize แล้ว และ product id จากลิงก์ -> สินค้า (ถ้าซ้ำใช้รายการแรก)
+        self.by_name = {}
+        self.by_product_id = {}
+        for item in products:
+            self.by_name.setdefault(normalize_name(item["name"]), item)
+            if item.get("product_id"):
+                self.by_product_id.setdefault(item["product_id"], item)
+
+    def search(self, query_text, query_embedding, top_k=5, threshold=0.3, candidate_ids=None, lexical_limit=100):
+        """ค้นหาแบบ hybrid: คัดสินค้าด้วย lexical index ก่อน แล้วให้ embedding จัดอันดับเฉพาะสินค้าที่คัดมา
+
+        ถ้า lexical ไม่เจออะไร หรือจัดอันดับแล้วไม่มีสินค้าผ่าน threshold จะค้นด้วย embedding กับสินค้าทั้งหมดแทน
+        (ผลที่ผ่าน threshold ไม่ครบ top_k ไม่ต้องเติม ไม่งั้นคำค้นเฉพาะเจาะจงจะต้องคูณเมทริกซ์ทั้งแคตตาล็อกทุกครั้ง)
+        แคตตาล็อกที่มีสินค้าไม่เกิน lexical_limit จะค้นด้วย embedding ตรงๆ เลย
+        คืนรายการ (id, คะแนน) แบบเดียวกับ ProductIndex.search
+        """
+        if self.lexical_index is not None and len(self.products) > lexical_limit:
+            lexical_ids = self.lexical_index.candidates(query_text, limit=lexical_limit, allowed=candidate_ids)
+            if lexical_ids:
+                results = self.index.search(query_embedding, top_k=top_k, threshold=threshold, candidate_ids=lexical_ids)
+                if results:
+                    return results
+
+        return self.index.search(query_embedding, top_k=top_k, threshold=threshold, candidate_ids=candidate_ids)
+
+    def find_product(self, key):
+        """หาสินค้าจาก product id หรือชื่อสินค้า คืน None ถ้าไม่พบ"""
+        key = key.strip()
+        return self.by_product_id.get(key) or self.by_name.get(key.lower())
+
+
+class CatalogStore:
+    """เก็บแคตตาล็อกไว้ในหน่วยความจำ โหลดใหม่เบื้องหลังเมื่อไฟล์ CSV เปลี่ยน แล้วสลับแบบ atomic"""
+
+    def __init__(self, csv_path, load_fn, build_fn, check_interval=5.0):
+        self.csv_path = csv_path
+        self.load_fn = load_fn
+        self.build_fn = build_fn
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._version = 0
+        self._last_check = 0.0
+        self._file_state = None
+        self._catalog = None
+
+        self.reloads = 0
+        self.reload_failures = 0
+        self.last_load_seconds = 0.0
+        self.last_build_seconds = 0.0
+
+        # โหลดครั้งแรกแบบ synchronous ให้พร้อมก่อนรับ request แรก
+        self._reload()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.csv_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def get(self):
+        """คืนแคตตาล็อกปัจจุบัน (เช็ค mtime ของไฟล์อย่างมากทุก check_interval วินาที)"""
+        now = time.monotonic()
+        if self.check_interval is not None and now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if self.is_stale():
+                self.reload()
+        return self._catalog
+
+    def is_stale(self):
+        """True ถ้าไฟล์ CSV เปลี่ยนไปจากตอนที่โหลดแคตตาล็อกปัจจุบัน"""
+        return self._stat() != self._file_state
+
+    def reload(self, wait=False):
+        """สั่งโหลดแคตตาล็อกใหม่ในเธรดเบื้องหลัง (ถ้ากำลังโหลดอยู่จะไม่เริ่มซ้ำ)"""
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+
+        thread = threading.Thread(target=self._reload_in_background, name="catalog-reload", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+
+    def _reload_in_background(self):
+        try:
+            self._reload()
+        except Exception as e:
+            print(f"⚠️ Catalog reload failed: {e}")
+            self.reload_failures += 1
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def _reload(self):
+        before = self._stat()
+        started = time.perf_counter()
+        products = self.load_fn(self.csv_path)
+        self.last_load_seconds = time.perf_counter() - started
+
+        # ไฟล์ถูกเขียนทับระหว่างอ่าน ข้ามรอบนี้ไปก่อน get() ครั้งถัดไปจะโหลดใหม่อีกครั้ง
+        if self._stat() != before and self._catalog is not None:
+            print(f"⚠️ '{self.csv_path}' changed while loading, retrying later")
+            return
+
+        if not products and self._catalog is not None:
+            print(f"⚠️ '{self.csv_path}' has no products, keeping catalog v{self._catalog.version}")
+            self._file_state = before
+            return
+
+        # สร้างข้อมูลที่คำนวณต่อ (index, embeddings) ให้เสร็จก่อน แล้วค่อยสลับทีเดียว
+        # ส่งแคตตาล็อกเดิมไปด้วย ให้ index ที่อัปเดตทีละรายการได้ (เช่น HNSW) ใช้ต่อแทนการสร้างใหม่
+        started = time.perf_counter()
+        catalog = self.build_fn(products, self._version + 1, self._catalog)
+        self.last_build_seconds = time.perf_counter() - started
+        self.reloads += 1
+        self._version = catalog.version
+        self._file_state = before
+        self._catalog = catalog
+        print(f"📦 Catalog v{catalog.version} loaded: {len(products)} products")
+
+    def stats(self):
+        """เวอร์ชันปัจจุบัน จำนวนสินค้า และเวลาที่ใช้อ่าน CSV / สร้าง index รอบล่าสุด"""
+        catalog = self._catalog
+        return {
+            "version": catalog.version if catalog is not None else 0,
+            "products": len(catalog.products) if catalog is not None else 0,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "last_load_seconds": self.last_load_seconds,
+            "last_build_seconds": self.last_build_seconds,
+        }
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+
+def text_key(text, model_name):
+    """คีย์ของ embedding หนึ่งแถว = hash ของชื่อโมเดล + ข้อความ"""
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """แคช embedding ลงดิสก์ข้างไฟล์ CSV แล้วเปิดแบบ memory-map (read-only) ให้ทุก process ใช้ไฟล์เดียวกัน
+
+    ไฟล์ที่ใช้:
+    - <csv>.<model>.emb.json  บอกชื่อไฟล์เมทริกซ์และคีย์ของแต่ละแถว
+    - <csv>.<model>.<digest>.npy  เมทริกซ์ float32 (ไม่แก้ไขหลังเขียนเสร็จ)
+    """
+
+    def __init__(self, csv_path, model_name):
+        self.model_name = model_name
+        model_slug = re.sub(r"[^0-9A-Za-z_.-]+", "_", model_name)
+        self.prefix = f"{csv_path}.{model_slug}"
+        self.manifest_path = f"{self.prefix}.emb.json"
+
+    def _read(self):
+        """อ่าน manifest และเปิดเมทริกซ์แบบ memmap คืน (keys, matrix) หรือ ([], None)"""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("model") != self.model_name:
+                return [], None
+
+            matrix_path = os.path.join(os.path.dirname(self.manifest_path), manifest["matrix"])
+            matrix = np.load(matrix_path, mmap_mode="r")
+            keys = manifest["keys"]
+            if matrix.shape[0] != len(keys):
+                return [], None
+            return keys, matrix
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"⚠️ Embedding cache '{self.manifest_path}' unreadable: {e}")
+            return [], None
+
+    def _write(self, keys, matrix):
+        """เขียนเมทริกซ์ใหม่แล้วสลับ manifest แบบ atomic (os.replace)"""
+        digest = hashlib.sha1("".join(keys).encode("utf-8")).hexdigest()[:16]
+        matrix_path = f"{self.prefix}.{digest}.npy"
+        tmp_matrix = f"{matrix_path}.{os.getpid()}.tmp"
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        os.replace(tmp_matrix, matrix_path)
+
+        manifest = {
+            "model": self.model_name,
+            "dim": int(matrix.shape[1]),
+            "matrix": os.path.basename(matrix_path),
+            "keys": keys,
+        }
+        tmp_manifest = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest, self.manifest_path)
+
+        self._remove_stale(os.path.basename(matrix_path))
+
+    def _remove_stale(self, current_name):
+        """ลบไฟล์เมทริกซ์เก่า (process ที่ map ไว้แล้วยังใช้ต่อได้บน POSIX)"""
+        folder = os.path.dirname(self.manifest_path) or "."
+        base = os.path.basename(self.prefix) + "."
+        for name in os.listdir(folder):
+            if name.startswith(base) and name.endswith(".npy") and name != current_name:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
+
+    def load(self, texts, encode_fn):
+        """คืน embedding ของ texts ตามลำดับ เข้ารหัสเฉพาะแถวที่ใหม่หรือเปลี่ยน ที่เหลืออ่านจากไฟล์"""
+        keys = [text_key(text, self.model_name) for text in texts]
+        stored_keys, stored = self._read()
+
+        # กรณีปกติ: ไฟล์ตรงกับแคตตาล็อกทุกแถว ใช้ memmap ตรงๆ ไม่ต้อง copy
+        if stored is not None and stored_keys == keys:
+            return stored
+
+        positions = {key: i for i, key in enumerate(stored_keys)}
+        missing = [i for i, key in enumerate(keys) if key not in positions]
+
+        if missing:
+            print(f"🧮 Encoding {len(missing)}/{len(keys)} new or changed rows")
+        encoded = encode_fn([texts[i] for i in missing])
+
+        if stored is not None:
+            dim = stored.shape[1]
+        elif len(encoded):
+            dim = encoded.shape[1]
+        else:
+            return encoded
+        matrix = np.zeros((len(keys), dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            if key in positions:
+                matrix[i] = stored[positions[key]]
+        if missing:
+            matrix[missing] = encoded
+
+        try:
+            self._write(keys, matrix)
+        except OSError as e:
+            print(f"⚠️ Cannot write embedding cache '{self.manifest_path}': {e}")
+            return matrix
+
+        # เปิดไฟล์ที่เพิ่งเขียนแบบ memmap (ถ้ามี process อื่นเขียนทับพร้อมกันก็ใช้เมทริกซ์ในหน่วยความจำแทน)
+        mapped_keys, mapped = self._read()
+        return mapped if mapped_keys == keys else matrix
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from product_index import encode_texts
+
+# backend ที่รองรับ ทุกตัวใช้โมเดลเดียวกันและมี encode()/get_sentence_embedding_dimension() แบบ SentenceTransformer
+# - "torch": PyTorch ตามปกติ
+# - "torch-int8": PyTorch ที่ quantize ชั้น Linear เป็น int8 แบบ dynamic (ไม่ต้องติดตั้งอะไรเพิ่ม)
+# - "onnx": ONNX Runtime (ต้องใช้ sentence-transformers >= 3.2 และ pip install optimum[onnxruntime])
+# - "onnx-int8": ONNX Runtime + quantize int8 แบบ dynamic (export ครั้งแรกแล้วเก็บไว้ใน cache_dir)
+ENCODER_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def encoder_id(model_name, backend="torch"):
+    """ชื่อที่ใช้แยกแคช embedding ของแต่ละ backend (ค่าที่ได้ต่างกันเล็กน้อย ห้ามปนกัน)"""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def _load_onnx_int8(model_name, cache_dir, quantization):
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    local_dir = os.path.join(cache_dir, model_name.replace("/", "_") + "-onnx")
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        print(f"⏳ Exporting int8 ONNX model to '{local_dir}' ...")
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save(local_dir)
+        export_dynamic_quantized_onnx_model(model, quantization, local_dir)
+
+    return SentenceTransformer(local_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def load_encoder(model_name, backend="torch", cache_dir="models", quantization="avx2"):
+    """โหลด sentence encoder ตาม backend ที่เลือก (ดู ENCODER_BACKENDS)"""
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    if backend == "torch-int8":
+        import torch
+
+        # quantize แบบ dynamic ใช้ได้เฉพาะบน CPU
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+
+    if backend == "onnx-int8":
+        return _load_onnx_int8(model_name, cache_dir, quantization)
+
+    raise ValueError(f"Unknown encoder backend '{backend}', choose from {ENCODER_BACKENDS}")
+
+
+def check_parity(reference, candidate, corpus, queries, top_k=5):
+    """เทียบ backend ใหม่กับ backend อ้างอิงบนข้อมูลชุดเดียวกัน
+
+    - embedding_cosine_min/mean: cosine ระหว่าง embedding ของข้อความเดียวกันจากสอง backend
+    - score_diff_max: ผลต่างสูงสุดของคะแนน cosine ระหว่างคำค้นกับสินค้า
+    - top1_agreement: สัดส่วนคำค้นที่สินค้าอันดับ 1 ตรงกัน
+    - topk_overlap: สัดส่วนเฉลี่ยของสินค้า top_k ที่ตรงกัน
+    """
+    ref_corpus = encode_texts(reference, corpus)
+    new_corpus = encode_texts(candidate, corpus)
+    ref_queries = encode_texts(reference, queries)
+    new_queries = encode_texts(candidate, queries)
+
+    cosines = np.sum(ref_corpus * new_corpus, axis=1)
+    ref_scores = ref_queries @ ref_corpus.T
+    new_scores = new_queries @ new_corpus.T
+
+    k = min(top_k, len(corpus))
+    ref_top = np.argsort(-ref_scores, axis=1, kind="stable")[:, :k]
+    new_top = np.argsort(-new_scores, axis=1, kind="stable")[:, :k]
+    overlaps = [len(set(a) & set(b)) / k for a, b in zip(ref_top.tolist(), new_top.tolist())]
+
+    return {
+        "embedding_cosine_min": float(cosines.min()),
+        "embedding_cosine_mean": float(cosines.mean()),
+        "score_diff_max": float(np.abs(ref_scores - new_scores).max()),
+        "top1_agreement": float(np.mean(ref_top[:, 0] == new_top[:, 0])),
+        "topk_overlap": float(np.mean(overlaps)),
+    }
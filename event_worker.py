@@ -0,0 +1,102 @@
+import os
+import queue
+import threading
+import time
+
+
+class EventWorkerPool:
+    """คิวงานจำกัดขนาด + worker threads สำหรับประมวลผล webhook event หลังตอบ LINE ไปแล้ว"""
+
+    def __init__(self, process_fn, workers=4, max_queue=100, put_timeout=0.5):
+        self.process_fn = process_fn
+        self.workers = workers
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._busy = 0
+
+        self.submitted = 0
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        """เริ่ม worker threads (เริ่มใหม่อัตโนมัติหลัง fork เพราะ thread ไม่ตามไปใน process ลูก)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # ตั้ง _pid เป็นขั้นสุดท้าย: submit ที่เห็น pid ใหม่ (โดยไม่ถือ lock) ต้องได้คิวใหม่ที่มี worker อ่านแล้ว
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"event-worker-{i}", daemon=True)
+                thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, events):
+        """ใส่ event เข้าคิว คืน False ถ้าคิวเต็มเกิน put_timeout (ให้ผู้เรียกตอบ 503)"""
+        if self._pid != os.getpid():
+            self.start()
+
+        try:
+            self._queue.put((time.monotonic(), events), timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _run(self):
+        while True:
+            enqueued_at, events = self._queue.get()
+            wait = time.monotonic() - enqueued_at
+            with self._lock:
+                self._busy += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+            try:
+                self.process_fn(events)
+                with self._lock:
+                    self.processed += 1
+            except Exception as e:
+                print(f"⚠️ Event processing error: {e}")
+                with self._lock:
+                    self.failed += 1
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                self._queue.task_done()
+
+    def drain(self, timeout=None):
+        """รอจนงานที่อยู่ในคิวและกำลังประมวลผลเสร็จหมด (ใช้ก่อนปิด process) คืน False ถ้าหมดเวลาก่อน"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self):
+        """ความลึกของคิว เวลารอในคิว และตัวนับงาน"""
+        with self._lock:
+            dequeued = self.processed + self.failed + self._busy
+            return {
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "wait_avg_seconds": self.wait_total / dequeued if dequeued else 0.0,
+                "wait_max_seconds": self.wait_max,
+            }
@@ -0,0 +1,73 @@
+import numpy as np
+
+from product_index import encode_texts
+
+
+class IntentRouter:
+    """จัดประเภทข้อความตามกฎที่เรียงลำดับความสำคัญไว้ embedding ของคำตั้งต้น (anchor) ถูกเข้ารหัสครั้งเดียวตอนเริ่ม
+
+    กฎแต่ละข้อเป็น dict ที่มี "intent" และอย่างใดอย่างหนึ่งต่อไปนี้:
+    - "prefix": ข้อความขึ้นต้นด้วยคำนี้
+    - "keywords": ข้อความมีคำใดคำหนึ่งในรายการ
+    - "anchors" + "threshold": cosine similarity กับ anchor ใด anchor หนึ่งเกิน threshold
+    ถ้าไม่เข้ากฎข้อไหนเลย จะได้ default_intent
+    """
+
+    def __init__(self, model, rules, default_intent="chit_chat"):
+        self.rules = rules
+        self.default_intent = default_intent
+
+        # รวม anchor ของทุก intent เป็นเมทริกซ์เดียว แล้วจำช่วงแถวของแต่ละ intent ไว้
+        anchor_texts = []
+        self.anchor_rows = {}
+        for rule in rules:
+            anchors = rule.get("anchors")
+            if anchors:
+                start = len(anchor_texts)
+                anchor_texts.extend(anchors)
+                self.anchor_rows[rule["intent"]] = (start, len(anchor_texts))
+
+        self.anchor_embeddings = encode_texts(model, anchor_texts)
+
+    def scores(self, query_embedding):
+        """คะแนนสูงสุดของแต่ละ intent จากการคูณเมทริกซ์ครั้งเดียว"""
+        if not self.anchor_rows:
+            return {}
+        similarities = self.anchor_embeddings @ query_embedding
+        return {
+            intent: float(np.max(similarities[start:end]))
+            for intent, (start, end) in self.anchor_rows.items()
+        }
+
+    def _matches_text(self, rule, message, message_lower):
+        if "prefix" in rule:
+            return message.startswith(rule["prefix"])
+        if "keywords" in rule:
+            return any(keyword in message_lower for keyword in rule["keywords"])
+        return False
+
+    def needs_embedding(self, message):
+        """True ถ้าต้องใช้ embedding ในการจัดประเภทข้อความนี้ (ไม่เข้ากฎ prefix/keyword ก่อนถึงกฎ anchor)"""
+        message_lower = message.lower()
+        for rule in self.rules:
+            if "anchors" in rule:
+                return True
+            if self._matches_text(rule, message, message_lower):
+                return False
+        return False
+
+    def classify(self, message, embed):
+        """คืนชื่อ intent ของข้อความ embed() จะถูกเรียกอย่างมากครั้งเดียว และเฉพาะเมื่อต้องใช้กฎแบบ anchor"""
+        message_lower = message.lower()
+        scores = None
+
+        for rule in self.rules:
+            if "anchors" in rule:
+                if scores is None:
+                    scores = self.scores(embed())
+                if scores[rule["intent"]] > rule["threshold"]:
+                    return rule["intent"]
+            elif self._matches_text(rule, message, message_lower):
+                return rule["intent"]
+
+        return self.default_intent
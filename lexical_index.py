@@ -0,0 +1,70 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+
+
+def char_ngrams(text, n=3):
+    """แยกข้อความเป็น character n-gram ในแต่ละคำ (ภาษาไทยไม่มีช่องว่างระหว่างคำ จึงไม่ต้องตัดคำ)"""
+    grams = []
+    for token in text.lower().split():
+        if len(token) <= n:
+            grams.append(token)
+        else:
+            grams.extend(token[i:i + n] for i in range(len(token) - n + 1))
+    return grams
+
+
+class LexicalIndex:
+    """inverted index ของ character n-gram ให้คะแนนแบบ BM25 ใช้คัดสินค้าที่น่าจะเกี่ยวข้องก่อนให้ embedding จัดอันดับ"""
+
+    def __init__(self, products, n=3, k1=1.2, b=0.75, name_weight=3, max_df_ratio=0.5):
+        self.n = n
+        self.k1 = k1
+
+        # ชื่อสินค้าสำคัญกว่าคำอธิบาย นับ n-gram ของชื่อเป็น name_weight เท่า
+        self.postings = defaultdict(list)  # gram -> [(id, tf), ...]
+        doc_lengths = {}
+        for item in products:
+            tf = Counter()
+            for gram, count in Counter(char_ngrams(item["name"], n)).items():
+                tf[gram] += count * name_weight
+            tf.update(char_ngrams(item["description"] or "", n))
+
+            doc_lengths[item["id"]] = sum(tf.values())
+            for gram, count in tf.items():
+                self.postings[gram].append((item["id"], count))
+
+        doc_count = len(doc_lengths)
+        avg_length = sum(doc_lengths.values()) / doc_count if doc_count else 0.0
+
+        # ตัวหารของ BM25 ที่ขึ้นกับความยาวเอกสาร คำนวณไว้ล่วงหน้า
+        self.length_norm = {
+            doc_id: k1 * (1 - b + b * length / avg_length) if avg_length else k1
+            for doc_id, length in doc_lengths.items()
+        }
+
+        # n-gram ที่พบในสินค้าเกิน max_df_ratio (เช่นข้อความเรื่องการจัดส่ง) แทบไม่ช่วยแยกสินค้า ข้ามไปเพื่อให้ค้นเร็ว
+        self.idf = {}
+        max_df = max(1, int(doc_count * max_df_ratio))
+        for gram, postings in self.postings.items():
+            df = len(postings)
+            if df <= max_df:
+                self.idf[gram] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+    def candidates(self, query, limit=100, allowed=None):
+        """id ของสินค้าที่คะแนน BM25 สูงสุดไม่เกิน limit รายการ (allowed = จำกัดเฉพาะ id เหล่านี้)"""
+        if allowed is not None and not isinstance(allowed, (set, frozenset)):
+            allowed = set(allowed)
+
+        scores = defaultdict(float)
+        for gram in set(char_ngrams(query, self.n)):
+            idf = self.idf.get(gram)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[gram]:
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.length_norm[doc_id])
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda pair: pair[1])
+        return [doc_id for doc_id, _ in best]
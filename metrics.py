@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# ขอบบนของ bucket (วินาที) ครอบคลุมตั้งแต่ lookup ในหน่วยความจำจนถึงคำตอบจาก LLM
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """histogram แบบ Prometheus แยกตาม label (observe หนึ่งครั้ง = bisect + lock หนึ่งครั้ง)"""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [counts ต่อ bucket (+Inf ท้ายสุด), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self, extra_labels=()):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, list(extra_labels) + [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels, extra_labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, extra_labels=()):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels, extra_labels)} {_format_value(value)}")
+        return lines
+
+
+class StageTimer:
+    """จับเวลาแต่ละขั้นตอนของการตอบข้อความหนึ่งข้อความ แล้วบันทึกลง histogram ทีเดียวตอน finish
+
+    ขั้นตอนชื่อเดียวกันที่เกิดหลายครั้งจะถูกรวมเวลากัน ชื่อ intent รู้ตอนจบจึงส่งให้ตอน finish
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def stage(self, name):
+        return _Span(self, name)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def finish(self, stage_histogram, request_histogram, intent):
+        for name, seconds in self.stages.items():
+            stage_histogram.observe(seconds, intent, name)
+        request_histogram.observe(time.perf_counter() - self.started, intent)
+
+
+class _Span:
+    __slots__ = ("timer", "name", "started")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class MetricsRegistry:
+    """รวม metric ทั้งหมดของ process และแปลงเป็น Prometheus text format สำหรับ /metrics
+
+    นอกจาก histogram/counter แล้ว ยังดึงค่าจาก stats() ของส่วนต่างๆ (แคช, คิว, Ollama client) ตอน scrape
+    ทุก series มี label worker=<pid> เพราะเมื่อรันผ่าน serve.py แต่ละ worker นับของตัวเอง
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._stats = []
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix, stats_fn, counters=()):
+        """ส่งออกค่าตัวเลขจาก stats_fn() เป็น gauge ชื่อ <prefix>_<key> (key ใน counters เป็น counter ชื่อ _total)"""
+        self._stats.append((prefix, stats_fn, frozenset(counters)))
+
+    def render(self):
+        extra = (("worker", os.getpid()),)
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(extra))
+
+        for prefix, stats_fn, counters in self._stats:
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                print(f"⚠️ Metrics collection for {prefix} failed: {e}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if key in counters:
+                    suffix = "" if key.endswith("_total") else "_total"
+                    name, kind = f"{prefix}_{key}{suffix}", "counter"
+                else:
+                    name, kind = f"{prefix}_{key}", "gauge"
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels((), (), extra)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,342 @@
+import html
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scrape_state import listing_key
+from scraping import (
+    BASE_URL, MAX_PAGES, MAX_RETRIES, REQUESTS_PER_SECOND, SCRAPER_WORKERS,
+    HostRateLimiter, find_page_pattern, with_retries,
+)
+
+# เว็บที่สร้างด้วย Next.js ฝังข้อมูลของหน้าไว้เป็น JSON ใน <script id="__NEXT_DATA__">
+NEXT_DATA_PATTERN = re.compile(r'<script[^>]*\bid=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.S)
+BLOCK_TAG_PATTERN = re.compile(r"<\s*(br|/p|/div|/li|/h\d)\b[^>]*>", re.I)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+NUMBER_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+REQUEST_TIMEOUT = 15
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# ชื่อ key ที่ลองตามลำดับ (ร้านไม่มี schema ทางการ จึงรองรับชื่อที่ร้านค้าบน Next.js ใช้กันบ่อย)
+ID_KEYS = ("id", "product_id", "productId")
+NAME_KEYS = ("name", "title", "product_name", "productName")
+PRICE_KEYS = ("price", "sell_price", "sale_price", "special_price", "final_price", "salePrice", "specialPrice")
+FULL_PRICE_KEYS = ("full_price", "compare_price", "compare_at_price", "original_price", "regular_price",
+                   "normal_price", "fullPrice", "comparePrice", "originalPrice")
+DESCRIPTION_KEYS = ("description", "short_description", "detail", "details", "content", "body")
+IMAGE_KEYS = ("image", "image_url", "imageUrl", "thumbnail", "cover", "photo", "images")
+SLUG_KEYS = ("slug", "permalink", "handle")
+URL_KEYS = ("url", "link", "href")
+
+NOT_MODIFIED = object()  # ผลของ _get เมื่อเซิร์ฟเวอร์ตอบ 304 (ข้อมูลเหมือนรอบก่อน)
+
+
+class NextDataUnavailable(Exception):
+    """หน้าไม่มี __NEXT_DATA__ หรือหาสินค้าในนั้นไม่เจอ (ต้องใช้ BrowserScraper แทน)"""
+
+
+def extract_next_data(page_html):
+    """JSON ใน <script id="__NEXT_DATA__"> ของหน้า หรือ None ถ้าไม่มี"""
+    match = NEXT_DATA_PATTERN.search(page_html)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def _first(raw, keys):
+    for key in keys:
+        value = raw.get(key)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+
+def _is_product(node):
+    # ต้องมีราคา เพื่อไม่ให้หมวดหมู่/แบนเนอร์ที่มี id กับ name เหมือนกันถูกนับเป็นสินค้า
+    return (isinstance(node, dict) and _first(node, ID_KEYS) is not None and isinstance(_first(node, NAME_KEYS), str)
+            and any(key in node for key in PRICE_KEYS + FULL_PRICE_KEYS))
+
+
+def find_products(data):
+    """object ที่หน้าตาเป็นสินค้าทั้งหมดใน JSON เรียงตามลำดับที่พบ (ไม่ลงไปค้นข้างในสินค้าอีก)"""
+    products = []
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if _is_product(node):
+            products.append(node)
+        elif isinstance(node, dict):
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return products
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return _number(_first(value, ("amount", "value", "price")))
+    if isinstance(value, str):
+        match = NUMBER_PATTERN.search(value)
+        if match:
+            return float(match.group(0).replace(",", ""))
+    return None
+
+
+def format_price(price, full_price=None):
+    """ราคาแบบเดียวกับที่หน้าเว็บแสดง: "฿ 465.00 ฿ 534.00" (ราคาขาย ราคาเต็ม) หรือ "฿ 465.00" ถ้าไม่มีส่วนลด"""
+    if price is None:
+        price, full_price = full_price, None
+    if price is None:
+        return ""
+    text = f"฿ {price:,.2f}"
+    if full_price is not None and full_price > price:
+        text += f" ฿ {full_price:,.2f}"
+    return text
+
+
+def clean_text(value):
+    """แปลงคำอธิบายที่เป็น HTML เป็นข้อความบรรทัดเดียว"""
+    if not isinstance(value, str):
+        return ""
+    text = BLOCK_TAG_PATTERN.sub(" ", value)
+    text = html.unescape(TAG_PATTERN.sub("", text))
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def _image_url(value):
+    if isinstance(value, list):
+        return _image_url(value[0]) if value else ""
+    if isinstance(value, dict):
+        return _image_url(_first(value, ("url", "src", "original", "large", "medium", "thumbnail")))
+    return value if isinstance(value, str) else ""
+
+
+def normalize_product(raw, page_url):
+    """แปลงสินค้าจาก JSON เป็น dict รูปแบบเดียวกับที่ BrowserScraper คืน (ยังไม่มี key source)"""
+    product_id = str(_first(raw, ID_KEYS))
+
+    link = _first(raw, URL_KEYS)
+    if isinstance(link, str) and "/product/" in link:
+        url = urljoin(page_url, link)
+    else:
+        # ลิงก์สินค้าของร้านเป็น /<lang>/product/<id>/<slug> โดย <lang> ตามหน้า listing
+        prefix = urlsplit(page_url).path.split("/category/")[0].split("/product/")[0].rstrip("/")
+        slug = _first(raw, SLUG_KEYS) or f"product-{product_id}"
+        url = urljoin(page_url, f"{prefix}/product/{product_id}/{slug}")
+
+    image = _image_url(_first(raw, IMAGE_KEYS))
+    return {
+        'id': product_id,
+        'name': WHITESPACE_PATTERN.sub(" ", _first(raw, NAME_KEYS)).strip(),
+        'image': urljoin(page_url, image) if image else "",
+        'price': format_price(_number(_first(raw, PRICE_KEYS)), _number(_first(raw, FULL_PRICE_KEYS))),
+        'description': clean_text(_first(raw, DESCRIPTION_KEYS)),
+        'url': url,
+    }
+
+
+class NextDataScraper:
+    """ดึงสินค้าจาก __NEXT_DATA__ ผ่าน HTTP ธรรมดา ไม่ต้องเปิด Chrome
+
+    หน้า listing ให้ชื่อ รูป ลิงก์ และราคา ส่วนคำอธิบายดึงจาก Next.js data route
+    (/_next/data/<buildId>/<path>.json) ของหน้าสินค้า ถ้าใช้ไม่ได้จะอ่าน __NEXT_DATA__ จากหน้า HTML แทน
+    สินค้าที่หารายละเอียดไม่ได้จะอยู่ใน incomplete ให้ BrowserScraper เติมต่อ
+
+    ถ้าให้ state (ScrapeState) จะดึงแบบ incremental: ข้ามหน้าสินค้าที่ข้อมูลใน listing ไม่เปลี่ยน
+    ส่ง If-None-Match/If-Modified-Since ทุก request บันทึกสถานะหลังจบทุกหน้า และทำต่อจากรอบที่ค้างไว้
+    """
+
+    def __init__(self, base_url=BASE_URL, workers=SCRAPER_WORKERS, requests_per_second=REQUESTS_PER_SECOND,
+                 retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT, state=None):
+        self.base_url = base_url
+        self.workers = max(1, workers)
+        self.retries = retries
+        self.timeout = timeout
+        self.state = state
+
+        self.limiter = HostRateLimiter(requests_per_second)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "th,en;q=0.8"})
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="next-data")
+
+        self.build_id = None
+        self.incomplete = []
+        self.requests_made = 0
+        self._count_lock = threading.Lock()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def _get(self, url, accept, conditional=True):
+        """GET แบบจำกัดความถี่ คืน None ถ้า 404 และ NOT_MODIFIED ถ้า 304 (5xx/429 โยน exception ให้ with_retries ลองใหม่)"""
+        headers = {"Accept": accept}
+        if self.state is not None and conditional:
+            headers.update(self.state.request_headers(url))
+
+        self.limiter.wait(url)
+        with self._count_lock:
+            self.requests_made += 1
+        response = self.session.get(url, timeout=self.timeout, headers=headers)
+        if response.status_code == 404:
+            return None
+        if response.status_code == 304:
+            self.state.mark_not_modified(url)
+            return NOT_MODIFIED
+        response.raise_for_status()
+        if "charset" not in response.headers.get("Content-Type", ""):
+            response.encoding = "utf-8"  # requests เดาเป็น ISO-8859-1 ทำให้ภาษาไทยเพี้ยน
+        if self.state is not None:
+            self.state.remember_response(url, response.headers)
+        return response
+
+    def page_data(self, url, conditional=True):
+        """__NEXT_DATA__ ของหน้า (จำ buildId ไว้ใช้กับ data route)"""
+        response = self._get(url, "text/html", conditional)
+        if response is None or response is NOT_MODIFIED:
+            return response
+        data = extract_next_data(response.text)
+        if data and data.get("buildId"):
+            self.build_id = data["buildId"]
+        return data
+
+    def data_route(self, url, conditional=True):
+        """pageProps ของหน้าจาก /_next/data/<buildId>/<path>.json หรือ None ถ้าใช้ไม่ได้"""
+        if not self.build_id:
+            return None
+        parts = urlsplit(url)
+        route = f"{parts.scheme}://{parts.netloc}/_next/data/{self.build_id}{parts.path.rstrip('/')}.json"
+        if parts.query:
+            route += "?" + parts.query
+        response = self._get(route, "application/json", conditional)
+        if response is None or response is NOT_MODIFIED:
+            return response
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def _product_data(self, url, conditional=True):
+        data = self.data_route(url, conditional)
+        if data is None:
+            data = self.page_data(url, conditional)
+        return data
+
+    def get_product_details(self, product):
+        """เติมคำอธิบาย (และราคา/รูปที่ยังขาด) จากหน้าสินค้า คืน False ถ้าหาไม่เจอ"""
+        try:
+            data = with_retries(self._product_data, product['url'], retries=self.retries, label=product['url'])
+            # หน้าสินค้าไม่เปลี่ยนตั้งแต่รอบก่อน (ราคาใน listing อาจเปลี่ยน) ใช้คำอธิบายเดิม
+            if data is NOT_MODIFIED and self.state.reuse_details(product, check_listing=False):
+                return True
+            if data is NOT_MODIFIED:
+                data = with_retries(self._product_data, product['url'], False, retries=self.retries,
+                                    label=product['url'])
+        except Exception as e:
+            print(f"เกิดข้อผิดพลาดในหน้าสินค้า: {e}")
+            return False
+        if not data:
+            return False
+
+        candidates = find_products(data)
+        raw = next((c for c in candidates if str(_first(c, ID_KEYS)) == product['id']), None)
+        if raw is None:
+            return False
+
+        details = normalize_product(raw, product['url'])
+        for key in ('description', 'price', 'image'):
+            if details[key]:
+                product[key] = details[key]
+        return bool(product['description'])
+
+    def scrape_page(self, url, page_num, seen=()):
+        """สินค้าของหน้า listing หนึ่งหน้าที่ id ไม่อยู่ใน seen คืน None ถ้าหน้านั้นไม่มี __NEXT_DATA__"""
+        print(f"\n📄 กำลังดึงข้อมูลจากหน้า {page_num}: {url}")
+        data = with_retries(self.page_data, url, retries=self.retries, label=f"หน้า {page_num}")
+        products = self.state.page_products(url) if data is NOT_MODIFIED else None
+        if products is not None:
+            print(f"♻️ หน้า {page_num} ไม่เปลี่ยนตั้งแต่รอบก่อน ({len(products)} รายการ)")
+        else:
+            if data is NOT_MODIFIED:
+                data = with_retries(self.page_data, url, False, retries=self.retries, label=f"หน้า {page_num}")
+            if data is None:
+                return None
+
+            products = [normalize_product(raw, url) for raw in find_products(data.get("props", data))]
+            print(f"🔍 พบสินค้าทั้งหมด: {len(products)} รายการ")
+            for product in products:
+                product['listing_key'] = listing_key(product['name'], product['image'], product['price'], product['url'])
+            if self.state is not None:
+                self.state.remember_page(url, [product['id'] for product in products])
+        products = [product for product in products if product['id'] not in seen]
+
+        # หน้า listing ส่วนใหญ่ไม่มีคำอธิบาย ดึงจากหน้าสินค้าพร้อมกัน (ข้ามสินค้าที่ listing ไม่เปลี่ยนจากรอบก่อน)
+        missing = [product for product in products if not product['description']]
+        if self.state is not None:
+            missing = [product for product in missing if not self.state.reuse_details(product)]
+        for product, found in zip(missing, self._executor.map(self.get_product_details, missing)):
+            if not found:
+                self.incomplete.append(product)
+
+        for idx, product in enumerate(products, 1):
+            product.update({
+                'image': product['image'] or 'ไม่พบรูปภาพ',
+                'price': product['price'] or 'ไม่พบราคา',
+                'description': product['description'] or 'ไม่พบคำอธิบาย',
+                'source': f'หน้า {page_num}',
+            })
+            print(f"✅ [{idx}] {product['name'][:50]}...")
+        return products
+
+    def run(self, max_pages=MAX_PAGES, restart=False):
+        done_pages = self.state.resume(self.base_url, restart) if self.state is not None else []
+        all_products_data = [product for page in done_pages for product in page]
+        seen = {product['id'] for product in all_products_data}
+
+        if not done_pages:
+            first_page = self.scrape_page(self.base_url, 1)
+            if not first_page:
+                raise NextDataUnavailable(f"No __NEXT_DATA__ products found on {self.base_url}")
+            self._checkpoint(first_page)
+            all_products_data.extend(first_page)
+            seen.update(product['id'] for product in first_page)
+
+        start_page = max(len(done_pages), 1) + 1
+        pattern = find_page_pattern(self.base_url, self.limiter) if max_pages >= start_page else None
+
+        for page in range(start_page, max_pages + 1) if pattern else ():
+            # เว็บที่ไม่สนพารามิเตอร์หน้าจะส่งหน้าเดิมกลับมา ไม่มีสินค้าใหม่ถือว่าหมดแล้ว
+            new_products = self.scrape_page(pattern.format(page), page, seen)
+            if not new_products:
+                print(f"หน้า {page}: ไม่พบข้อมูลหรือหน้าไม่มีอยู่")
+                break
+            self._checkpoint(new_products)
+            seen.update(product['id'] for product in new_products)
+            all_products_data.extend(new_products)
+            print(f"หน้า {page}: พบ {len(new_products)} รายการ")
+
+        print(f"🌐 {self.requests_made} HTTP requests, {len(self.incomplete)} products without details")
+        if self.state is not None:
+            self.state.finish()
+        return all_products_data
+
+    def _checkpoint(self, page_products):
+        if self.state is not None:
+            self.state.checkpoint(page_products)
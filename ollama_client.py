@@ -0,0 +1,277 @@
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+# จุดตัดประโยค: ขึ้นบรรทัดใหม่ หรือ . ! ? ที่ตามด้วยช่องว่าง (ภาษาไทยใช้ช่องว่างคั่นประโยค)
+SENTENCE_END = re.compile(r"\n|[.!?](?=\s)|[.!?]$")
+
+
+def cut_at_sentence_boundary(text, max_chars=None):
+    """ตัดข้อความให้ไม่เกิน max_chars โดยตัดที่ท้ายประโยคสุดท้ายที่สมบูรณ์"""
+    text = text.strip()
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars]
+
+    ends = [m.end() for m in SENTENCE_END.finditer(text)]
+    if ends and ends[-1] >= len(text) // 2:
+        return text[:ends[-1]].strip()
+
+    # ไม่มีจุดจบประโยคในครึ่งหลัง ตัดที่ช่องว่างสุดท้ายแทนเพื่อไม่ให้คำขาดกลาง
+    space = text.rfind(" ")
+    if space >= len(text) // 2:
+        return text[:space].strip()
+    return text
+
+
+def _set_read_timeout(response, seconds):
+    """ตั้ง read timeout ของ socket ที่กำลัง stream (requests กำหนด timeout ได้ครั้งเดียวตอนส่ง request)"""
+    connection = getattr(getattr(response, "raw", None), "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        sock.settimeout(max(seconds, 0.01))
+
+
+def _is_read_timeout(error):
+    """requests แปลง read timeout ระหว่าง stream เป็น ConnectionError ต้องดูสาเหตุข้างใน"""
+    if isinstance(error, requests.exceptions.ReadTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    return isinstance(reason, (ReadTimeoutError, socket.timeout))
+
+
+def stream_generate(url, model, prompt, options=None, deadline=20.0, max_chars=1000,
+                    connect_timeout=5.0, session=None):
+    """เรียก Ollama /api/generate แบบ stream หยุดทันทีเมื่อเกินเวลา deadline หรือยาวเกิน max_chars
+
+    คืน dict:
+    - text: ข้อความที่ได้ (ถ้าถูกตัดจะตัดที่ท้ายประโยค)
+    - stop_reason: "done", "deadline" หรือ "max_chars"
+    - eval_count: จำนวน token ที่ Ollama รายงาน (มีเฉพาะเมื่อ done)
+    - tokens: จำนวน token ที่ได้รับจริง (นับจาก chunk ที่ stream มา)
+    - elapsed: เวลาที่ใช้ (วินาที)
+    ถ้าหมดงบเวลาระหว่างรอ token คืนข้อความที่ได้แล้ว (stop_reason = "deadline") ไม่ถือเป็นข้อผิดพลาด
+    ข้อผิดพลาดด้านเครือข่ายอื่นๆ จะถูกส่งต่อเป็น requests.exceptions.RequestException
+    """
+    started = time.monotonic()
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": True,
+        "options": options or {},
+    }
+
+    http = session or requests
+    chunks = []
+    length = 0
+    tokens = 0
+    stop_reason = "done"
+    eval_count = None
+
+    # read timeout เท่ากับงบเวลาทั้งหมด กันกรณี Ollama ค้างไม่ส่ง token มาเลย
+    try:
+        response = http.post(url, json=payload, stream=True, timeout=(connect_timeout, deadline))
+    except requests.exceptions.ReadTimeout:
+        response = None
+        stop_reason = "deadline"
+
+    if response is not None:
+        try:
+            response.raise_for_status()
+            # หลังจากนี้ทุกครั้งที่อ่านใช้ timeout เท่างบเวลาที่เหลือ deadline จึงเป็นเพดานจริง
+            _set_read_timeout(response, deadline - (time.monotonic() - started))
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+
+                piece = data.get("response", "")
+                if piece:
+                    chunks.append(piece)
+                    length += len(piece)
+                    tokens += 1  # Ollama ส่งทีละ token ต่อหนึ่งบรรทัด
+
+                if data.get("done"):
+                    eval_count = data.get("eval_count")
+                    break
+                if length >= max_chars:
+                    stop_reason = "max_chars"
+                    break
+                remaining = deadline - (time.monotonic() - started)
+                if remaining <= 0:
+                    stop_reason = "deadline"
+                    break
+                _set_read_timeout(response, remaining)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if not _is_read_timeout(e):
+                raise
+            stop_reason = "deadline"
+        finally:
+            # ปิด connection กลางทาง Ollama จะหยุด generate ให้เอง
+            response.close()
+
+    text = "".join(chunks)
+    if stop_reason == "done" and length <= max_chars:
+        text = text.strip()
+    else:
+        text = cut_at_sentence_boundary(text, max_chars)
+
+    return {
+        "text": text,
+        "stop_reason": stop_reason,
+        "eval_count": eval_count,
+        "tokens": eval_count if eval_count is not None else tokens,
+        "elapsed": time.monotonic() - started,
+    }
+
+
+class FairSemaphore:
+    """semaphore ที่ปล่อยสิทธิ์ตามลำดับคิว (ใครรอก่อนได้ก่อน)"""
+
+    def __init__(self, value):
+        self._value = value
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        with self._lock:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return True
+            event = threading.Event()
+            self._waiters.append(event)
+
+        if event.wait(timeout):
+            return True
+
+        with self._lock:
+            # ได้สิทธิ์พอดีระหว่างที่หมดเวลา
+            if event.is_set():
+                return True
+            self._waiters.remove(event)
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # ส่งสิทธิ์ให้ผู้ที่รอคนแรกโดยตรง ไม่ให้ผู้มาใหม่แซงคิว
+                self._waiters.popleft().set()
+            else:
+                self._value += 1
+
+    def waiting(self):
+        with self._lock:
+            return len(self._waiters)
+
+
+class OllamaClient:
+    """client ที่ใช้ร่วมกันทั้งแอป: connection pool แบบ keep-alive และจำกัดจำนวน generation ที่รันพร้อมกัน"""
+
+    def __init__(self, url, model, max_concurrent=4, pool_size=8, connect_timeout=5.0):
+        self.url = url
+        self.model = model
+        self.max_concurrent = max_concurrent
+        self.connect_timeout = connect_timeout
+
+        self.pool_size = pool_size
+
+        self.session = self._create_session()
+        self._slots = FairSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        self.requests_total = 0
+        self.failures = 0
+        self.queue_timeouts = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.generation_time_total = 0.0
+        self.tokens_total = 0
+
+        # process ลูกหลัง fork (ดู serve.py) ต้องไม่ใช้ keep-alive connection และ lock ชุดเดียวกับ process แม่
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _after_fork(self):
+        self.session = self._create_session()
+        self._slots = FairSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def generate(self, prompt, options=None, deadline=20.0, max_chars=1000):
+        """เหมือน stream_generate แต่รอคิวก่อน เวลาที่รอคิวนับรวมอยู่ในงบ deadline ด้วย
+
+        ถ้ารอคิวจนหมดงบเวลา คืน text ว่างและ stop_reason = "queue_timeout"
+        """
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=deadline)
+        wait = time.monotonic() - started
+
+        with self._lock:
+            self.requests_total += 1
+            self.queue_wait_total += wait
+            self.queue_wait_max = max(self.queue_wait_max, wait)
+            if not acquired:
+                self.queue_timeouts += 1
+
+        if not acquired:
+            return {"text": "", "stop_reason": "queue_timeout", "eval_count": None, "tokens": 0, "elapsed": wait}
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            result = stream_generate(
+                self.url, self.model, prompt,
+                options=options,
+                deadline=max(deadline - wait, 0.1),
+                max_chars=max_chars,
+                connect_timeout=self.connect_timeout,
+                session=self.session,
+            )
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+        with self._lock:
+            self.generation_time_total += result["elapsed"]
+            self.tokens_total += result["tokens"]
+
+        result["queue_wait"] = wait
+        return result
+
+    def stats(self):
+        """เวลารอคิว เวลา generate และ tokens/s"""
+        with self._lock:
+            completed = self.requests_total - self.queue_timeouts - self.failures - self._in_flight
+            return {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self._in_flight,
+                "waiting": self._slots.waiting(),
+                "requests": self.requests_total,
+                "failures": self.failures,
+                "queue_timeouts": self.queue_timeouts,
+                "queue_wait_avg_seconds": self.queue_wait_total / self.requests_total if self.requests_total else 0.0,
+                "queue_wait_max_seconds": self.queue_wait_max,
+                "generation_avg_seconds": self.generation_time_total / completed if completed > 0 else 0.0,
+                "tokens_total": self.tokens_total,
+                "tokens_per_second": self.tokens_total / self.generation_time_total if self.generation_time_total else 0.0,
+            }
@@ -0,0 +1,31 @@
+from bisect import bisect_left, bisect_right
+
+
+class PriceIndex:
+    """ดัชนีราคาที่เรียงไว้แล้ว ตอบคำค้นช่วงราคาด้วย bisect แทนการไล่ดูสินค้าทุกชิ้น"""
+
+    def __init__(self, products, key="price_value"):
+        # เรียงจากน้อยไปมาก ราคาเท่ากันเรียงตามลำดับในแคตตาล็อก
+        ascending = sorted((item[key], item["id"]) for item in products)
+        self.prices = [price for price, _ in ascending]
+        self.ids = [product_id for _, product_id in ascending]
+
+        # เรียงจากมากไปน้อย (เก็บราคาติดลบไว้ให้ bisect ได้) ราคาเท่ากันยังเรียงตามลำดับในแคตตาล็อก
+        descending = sorted((-item[key], item["id"]) for item in products)
+        self.negated_prices = [price for price, _ in descending]
+        self.ids_descending = [product_id for _, product_id in descending]
+
+    def range(self, min_price=None, max_price=None, descending=False, limit=None):
+        """id ของสินค้าที่ราคาอยู่ในช่วง [min_price, max_price] เรียงตามราคา (ไม่เกิน limit รายการ) ใช้เวลา O(log N + k)"""
+        if descending:
+            lo = bisect_left(self.negated_prices, -max_price) if max_price is not None else 0
+            hi = bisect_right(self.negated_prices, -min_price) if min_price is not None else len(self.negated_prices)
+            ids = self.ids_descending
+        else:
+            lo = bisect_left(self.prices, min_price) if min_price is not None else 0
+            hi = bisect_right(self.prices, max_price) if max_price is not None else len(self.prices)
+            ids = self.ids
+
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return ids[lo:hi]
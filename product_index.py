@@ -0,0 +1,156 @@
+import hashlib
+import os
+
+import numpy as np
+
+from vector_index import VECTOR_BACKENDS, ExactVectorIndex, create_vector_index
+
+
+def encode_texts(model, texts):
+    """เข้ารหัสข้อความหลายข้อความในครั้งเดียว คืนเมทริกซ์ float32 ที่ normalize แล้ว"""
+    if not texts:
+        dim = model.get_sentence_embedding_dimension()
+        return np.zeros((0, dim), dtype=np.float32)
+
+    embeddings = model.encode(
+        list(texts),
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        batch_size=64,
+    )
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def name_label(name):
+    """label ถาวรของชื่อสินค้าใน vector index แบบ ANN (ไม่เปลี่ยนตามลำดับแถว จึงเพิ่ม/ลบทีละรายการได้)"""
+    return int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:15], 16)
+
+
+class ProductIndex:
+    """ดัชนี embedding ของชื่อสินค้า สร้างครั้งเดียวตอนโหลดแคตตาล็อก
+
+    การหา top-k ทำผ่าน vector index ที่เลือกได้:
+    - "exact": คูณเมทริกซ์กับสินค้าทุกชิ้น (ใช้เมทริกซ์ embedding เดิมโดยไม่ copy)
+    - "hnsw": ANN สำหรับแคตตาล็อกขนาดใหญ่ ถ้ามี index ของแคตตาล็อกก่อนหน้า (previous)
+      จะเพิ่ม/ลบเฉพาะชื่อที่เปลี่ยน และบันทึกลง vector_index_path ถ้ากำหนดไว้
+    การค้นที่จำกัดด้วย candidate_ids คูณเมทริกซ์เฉพาะแถวที่คัดมาเสมอ ไม่ผ่าน vector index
+    """
+
+    def __init__(self, model, products, embedding_store=None, vector_backend="exact",
+                 vector_index_path=None, previous=None, **backend_options):
+        self.model = model
+        self.products = products
+        self.names = tuple(item["name"] for item in products)
+
+        # เข้ารหัสชื่อสินค้าทั้งหมดครั้งเดียว แบบ normalize แล้ว (cosine = dot product)
+        # ถ้ามี embedding_store จะเข้ารหัสเฉพาะชื่อที่ยังไม่เคยแคชไว้บนดิสก์
+        texts = [name.lower() for name in self.names]
+        if embedding_store is not None:
+            self.embeddings = embedding_store.load(texts, self.encode_texts)
+        else:
+            self.embeddings = self.encode_texts(texts)
+
+        # จำนวนแถวที่ชื่อซ้ำกับแถวก่อนหน้า ใช้เผื่อจำนวน top-k ตอนตัดชื่อซ้ำ
+        self.duplicate_count = len(self.names) - len(set(self.names))
+
+        dim = self.embeddings.shape[1]
+        if vector_backend == "exact":
+            # label = ลำดับแถว
+            self.row_labels = list(range(len(self.names)))
+            self.vectors = ExactVectorIndex(dim, labels=self.row_labels, vectors=self.embeddings)
+        else:
+            # label = hash ของชื่อ หนึ่งเวกเตอร์ต่อหนึ่งชื่อ
+            self.row_labels = [name_label(name) for name in self.names]
+            self.vectors = self._build_ann(vector_backend, dim, vector_index_path, previous, backend_options)
+
+        self.label_rows = {}
+        for row, label in enumerate(self.row_labels):
+            self.label_rows.setdefault(label, []).append(row)
+
+    def _build_ann(self, backend, dim, path, previous, options):
+        vectors = None
+        shared = False
+        if previous is not None and isinstance(previous.vectors, VECTOR_BACKENDS[backend]):
+            vectors = previous.vectors
+            shared = True
+        elif path and os.path.exists(path):
+            try:
+                vectors = VECTOR_BACKENDS[backend].load(path, dim)
+            except Exception as e:
+                print(f"⚠️ Cannot load vector index '{path}': {e}")
+
+        if vectors is None:
+            vectors = create_vector_index(backend, dim, max_elements=max(len(self.names), 1), **options)
+
+        # เพิ่มเฉพาะชื่อใหม่ ลบชื่อที่ไม่อยู่ในแคตตาล็อกแล้ว
+        first_rows = {}
+        for row, label in enumerate(self.row_labels):
+            first_rows.setdefault(label, row)
+        existing = vectors.labels
+        added = [label for label in first_rows if label not in existing]
+        removed = existing - set(first_rows)
+
+        # สแนปช็อตก่อนหน้ายังค้นหา index เดิมอยู่ ถ้ามีการเปลี่ยนแปลงต้องแก้บนสำเนาเท่านั้น
+        # (ถ้าไม่เปลี่ยนใช้ร่วมกันได้ เพราะหลังสร้างเสร็จ index เป็นแบบอ่านอย่างเดียว)
+        if shared and (added or removed):
+            vectors = vectors.copy()
+
+        vectors.remove(removed)
+        if added:
+            vectors.add(added, self.embeddings[[first_rows[label] for label in added]])
+        if (added or removed) and path:
+            vectors.save(path)
+        return vectors
+
+    def encode_texts(self, texts):
+        """เข้ารหัสข้อความหลายข้อความในครั้งเดียว คืนเมทริกซ์ float32 ที่ normalize แล้ว"""
+        return encode_texts(self.model, texts)
+
+    def encode_query(self, query):
+        """เข้ารหัสคำค้นหาหนึ่งข้อความ"""
+        return self.encode_texts([query])[0]
+
+    def search(self, query_embedding, top_k=5, threshold=0.3, candidate_ids=None):
+        """คืนรายการ (ลำดับสินค้า, คะแนน) ที่คะแนน >= threshold เรียงจากมากไปน้อย ตัดชื่อซ้ำแล้ว"""
+        if len(self.names) == 0 or top_k <= 0:
+            return []
+
+        if candidate_ids is not None:
+            # ชุดที่ถูกคัดมาแล้ว (ช่วงราคา, lexical) มีขนาดเล็ก คูณเมทริกซ์เฉพาะแถวนั้นตรงๆ
+            # การค้น HNSW แบบมี filter ต้องเดินกราฟเกือบทั้งหมดเมื่อแถวที่อนุญาตกระจายอยู่ห่างกัน
+            rows = np.array(sorted(set(candidate_ids)), dtype=np.int64)
+            if rows.size == 0:
+                return []
+            scores = self.embeddings[rows] @ query_embedding
+
+            # argpartition หา top-k (เผื่อชื่อซ้ำ) โดยไม่ต้องเรียงทั้งหมด เช่นเมื่อช่วงราคาครอบคลุมเกือบทั้งแคตตาล็อก
+            k = min(top_k + self.duplicate_count, rows.size)
+            if k < rows.size:
+                part = np.sort(np.argpartition(-scores, k - 1)[:k])
+                rows, scores = rows[part], scores[part]
+            order = np.argsort(-scores, kind="stable")
+            return self._top_unique(zip(rows[order], scores[order]), top_k, threshold)
+
+        # เผื่อจำนวนแถวชื่อซ้ำ เพื่อให้ได้ชื่อไม่ซ้ำครบ top_k
+        labels, scores = self.vectors.search(query_embedding, top_k + self.duplicate_count)
+        ranked = ((self.label_rows[int(label)][0], score) for label, score in zip(labels, scores)
+                  if int(label) in self.label_rows)
+        return self._top_unique(ranked, top_k, threshold)
+
+    def _top_unique(self, ranked, top_k, threshold):
+        """เลือก (แถว, คะแนน) ที่เรียงแล้วจนครบ top_k ข้ามชื่อซ้ำ หยุดเมื่อคะแนนต่ำกว่า threshold"""
+        results = []
+        seen_names = set()
+        for row, score in ranked:
+            if score < threshold:
+                break
+
+            name = self.names[row]
+            if name in seen_names:
+                continue
+            seen_names.add(name)
+            results.append((int(row), float(score)))
+            if len(results) >= top_k:
+                break
+
+        return results
@@ -0,0 +1,246 @@
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import abort, jsonify, request, send_file
+
+TRACE_ID_PATTERN = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+
+# ไฟล์ข้อมูลของ trace แต่ละแบบ (.prof เปิดด้วย snakeviz/pstats, .folded เปิดด้วย speedscope/flamegraph.pl)
+TRACE_FILES = {"cprofile": ".prof", "sampler": ".folded"}
+
+
+def collapse_stack(frame, max_depth=64):
+    """แปลง stack เป็นบรรทัดเดียวแบบ folded (root;...;leaf)"""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """เธรดเดียวที่เก็บ stack ของเธรดที่กำลังตอบข้อความอยู่ทุก interval วินาที (หลับเมื่อไม่มีข้อความ)"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._active = {}  # thread id -> Counter ของ stack
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def begin(self, thread_id):
+        samples = Counter()
+        with self._lock:
+            self._active[thread_id] = samples
+            if self._pid != os.getpid():
+                # เริ่มเธรดใหม่หลัง fork เพราะ thread ไม่ตามไปใน process ลูก
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="stack-sampler", daemon=True).start()
+        self._wakeup.set()
+        return samples
+
+    def end(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._active
+                if idle:
+                    self._wakeup.clear()
+            if idle:
+                self._wakeup.wait()
+                continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class Capture:
+    """ข้อมูลของ request หนึ่งระหว่างจับ profile (annotate เพิ่ม intent และเวลาแต่ละขั้นตอนได้)"""
+
+    def __init__(self):
+        self.meta = {}
+        self.profile = None
+        self.samples = None
+
+    def annotate(self, **meta):
+        self.meta.update(meta)
+
+
+class RequestProfiler:
+    """เก็บ profile ของข้อความที่ช้าหรือถูกสุ่มเลือก ลงไดเรกทอรีที่เก็บไว้ไม่เกิน max_traces ชุด (ลบชุดเก่าสุดก่อน)
+
+    - slow_threshold: ทุกข้อความถูกเก็บ stack แบบ sampling เก็บลงดิสก์เฉพาะที่ใช้เวลาเกินค่านี้ (วินาที)
+    - sample_rate: สัดส่วนข้อความที่ถูกสุ่มมาเก็บ cProfile แบบเต็ม (ครั้งละหนึ่งข้อความ)
+    ถ้าไม่ตั้งทั้งสองค่า profile() แทบไม่มีค่าใช้จ่าย
+    """
+
+    def __init__(self, trace_dir="profiles", slow_threshold=None, sample_rate=0.0, max_traces=50,
+                 sample_interval=0.005):
+        self.trace_dir = trace_dir
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self.max_traces = max_traces
+
+        self._sampler = StackSampler(sample_interval) if slow_threshold is not None else None
+        self._cprofile_lock = threading.Lock()  # cProfile เปิดได้ทีละตัวต่อ process
+        self._write_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._sampler is not None or self.sample_rate > 0
+
+    def profile(self):
+        return _Profiling(self)
+
+    def _start(self, capture):
+        if self.sample_rate > 0 and random.random() < self.sample_rate and self._cprofile_lock.acquire(blocking=False):
+            capture.profile = cProfile.Profile()
+            try:
+                capture.profile.enable()
+            except ValueError:
+                # มีเครื่องมือ profile อื่นทำงานอยู่
+                capture.profile = None
+                self._cprofile_lock.release()
+        if self._sampler is not None:
+            capture.samples = self._sampler.begin(threading.get_ident())
+
+    def _finish(self, capture, duration):
+        if capture.profile is not None:
+            capture.profile.disable()
+            self._cprofile_lock.release()
+        if self._sampler is not None:
+            self._sampler.end(threading.get_ident())
+
+        if capture.profile is not None:
+            self._write(capture, duration, "cprofile", "sampled")
+        elif capture.samples and self.slow_threshold is not None and duration >= self.slow_threshold:
+            self._write(capture, duration, "sampler", "slow")
+
+    def _write(self, capture, duration, kind, reason):
+        now = time.time()
+        trace_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + "-" + uuid.uuid4().hex[:8]
+        meta = dict(capture.meta, id=trace_id, time=now, duration=duration, kind=kind, reason=reason, pid=os.getpid())
+
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            data_path = os.path.join(self.trace_dir, trace_id + TRACE_FILES[kind])
+            if kind == "cprofile":
+                capture.profile.dump_stats(data_path)
+            else:
+                with open(data_path, "w", encoding="utf-8") as f:
+                    for stack, count in capture.samples.most_common():
+                        f.write(f"{stack} {count}\n")
+
+            # เขียน metadata ทีหลังสุด list_traces จะเห็นเฉพาะ trace ที่เขียนเสร็จแล้ว
+            tmp_path = os.path.join(self.trace_dir, f".{trace_id}.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_path, os.path.join(self.trace_dir, trace_id + ".json"))
+        except OSError as e:
+            print(f"⚠️ Cannot write profile trace: {e}")
+            return
+
+        print(f"🐢 Profile {trace_id} saved ({reason}, {duration * 1000:.0f} ms)")
+        self._rotate()
+
+    def _rotate(self):
+        with self._write_lock:
+            trace_ids = sorted(name[:-5] for name in os.listdir(self.trace_dir) if name.endswith(".json"))
+            for trace_id in trace_ids[:max(len(trace_ids) - self.max_traces, 0)]:
+                for suffix in (".json",) + tuple(TRACE_FILES.values()):
+                    try:
+                        os.remove(os.path.join(self.trace_dir, trace_id + suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def list_traces(self):
+        """metadata ของ trace ที่เก็บไว้ ใหม่สุดก่อน"""
+        traces = []
+        try:
+            names = sorted((name for name in os.listdir(self.trace_dir) if name.endswith(".json")), reverse=True)
+        except FileNotFoundError:
+            return []
+        for name in names:
+            try:
+                with open(os.path.join(self.trace_dir, name), encoding="utf-8") as f:
+                    traces.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return traces
+
+    def trace_path(self, trace_id):
+        """path ของไฟล์ข้อมูลของ trace หรือ None ถ้าไม่มี"""
+        if not TRACE_ID_PATTERN.match(trace_id):
+            return None
+        for suffix in TRACE_FILES.values():
+            path = os.path.join(self.trace_dir, trace_id + suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+
+class _Profiling:
+    __slots__ = ("profiler", "capture", "started")
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.capture = Capture()
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        if self.profiler.enabled:
+            self.profiler._start(self.capture)
+        return self.capture
+
+    def __exit__(self, *exc_info):
+        if self.profiler.enabled:
+            self.profiler._finish(self.capture, time.perf_counter() - self.started)
+        return False
+
+
+def register_admin_routes(app, profiler, token):
+    """GET /admin/profiles (รายการ) และ /admin/profiles/<id> (ดาวน์โหลด) ต้องส่ง Authorization: Bearer <token>
+
+    ถ้าไม่ได้ตั้ง token ไว้ endpoint จะตอบ 404 เสมอ
+    """
+
+    def check_token():
+        if not token:
+            abort(404)
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+            abort(401)
+
+    @app.route("/admin/profiles", methods=['GET'])
+    def list_profiles():
+        check_token()
+        return jsonify(profiler.list_traces())
+
+    @app.route("/admin/profiles/<trace_id>", methods=['GET'])
+    def download_profile(trace_id):
+        check_token()
+        path = profiler.trace_path(trace_id)
+        if path is None:
+            abort(404)
+        return send_file(os.path.abspath(path), as_attachment=True, download_name=os.path.basename(path))
+
+    return list_profiles, download_profile
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(text):
+    """ทำข้อความคำค้นให้อยู่ในรูปเดียวกัน (ตัวพิมพ์เล็ก ช่องว่างเดียว) ใช้เป็นคีย์แคช"""
+    return " ".join(text.lower().split())
+
+
+class QueryCache:
+    """แคช LRU จำกัดขนาด มี TTL และล้างทั้งหมดอัตโนมัติเมื่อแคตตาล็อกเวอร์ชันใหม่กว่าเข้ามา
+
+    ระหว่างโหลดแคตตาล็อกใหม่ request ที่ยังถือสแนปช็อตเก่าอยู่จะไม่ล้างแคช แค่ไม่ได้ใช้แคช (get คืน None, put ถูกข้าม)
+    """
+
+    def __init__(self, max_size=2048, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        """คืน False ถ้า version เก่ากว่าเวอร์ชันของแคช ถ้าใหม่กว่าจะล้างแคชแล้วใช้เวอร์ชันนั้น"""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+        return True
+
+    def get(self, key, version):
+        """คืนค่าที่แคชไว้ หรือ None ถ้าไม่มี/หมดอายุ/เป็นของแคตตาล็อกเวอร์ชันเก่า"""
+        with self._lock:
+            entry = self._entries.get(key) if self._check_version(version) else None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def contains(self, key, version):
+        """เช็คว่ามีค่าที่ยังไม่หมดอายุอยู่หรือไม่ โดยไม่นับเป็น hit/miss และไม่ขยับลำดับ LRU"""
+        with self._lock:
+            if version != self._version:
+                return False
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() < entry[0]
+
+    def put(self, key, value, version):
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """ตัวนับ hit/miss สำหรับดูประสิทธิภาพของแคช"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from catalog_store import extract_product_id
+
+SCRAPE_STATE_PATH = "scrape_state.json"
+
+# ค่าที่ scraper ใส่แทนเมื่อหารายละเอียดไม่ได้ สินค้าที่มีค่าเหล่านี้ต้องดึงใหม่รอบหน้า
+MISSING_DESCRIPTIONS = {"", "ไม่พบคำอธิบาย", "เกิดข้อผิดพลาด", "ไม่มีลิงก์"}
+
+
+def listing_key(name, image, price, url):
+    """hash ของข้อมูลสินค้าที่เห็นในหน้า listing ถ้าไม่เปลี่ยนก็ไม่ต้องเปิดหน้ารายละเอียดใหม่"""
+    # ใช้ product id แทนลิงก์เต็ม เพราะ query string (?page=...) เปลี่ยนตามหน้าที่สินค้าอยู่
+    data = json.dumps([name, image, price, extract_product_id(url) or url], ensure_ascii=False)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class ScrapeState:
+    """สถานะของการดึงข้อมูลแบบ incremental เก็บเป็นไฟล์ JSON (key ของสินค้าคือ id จากลิงก์ /product/<id>/)
+
+    - products: ข้อมูลล่าสุดของสินค้าแต่ละชิ้นพร้อม listing key ใช้ข้ามหน้ารายละเอียดที่ไม่เปลี่ยน
+    - http: ETag/Last-Modified ของแต่ละ URL สำหรับ conditional request (304 = ใช้ข้อมูลเดิม)
+    - run: หน้าที่ดึงเสร็จแล้วของรอบปัจจุบัน บันทึกหลังจบทุกหน้า ถ้ารอบก่อนหยุดกลางทางจะทำต่อจากหน้าถัดไป
+    """
+
+    def __init__(self, path=SCRAPE_STATE_PATH):
+        self.path = path
+        self.run_info = None
+        self.products = {}
+        self.http = {}
+        self.reused = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Scrape state '{self.path}' unreadable, starting from scratch: {e}")
+            data = {}
+
+        with self._lock:
+            self.run_info = data.get("run")
+            self.products = data.get("products", {})
+            self.http = data.get("http", {})
+
+    def save(self):
+        """เขียนไฟล์แบบ atomic (เขียนไฟล์ชั่วคราวแล้ว os.replace) ไฟล์จึงไม่เสียแม้ process ถูก kill ระหว่างเขียน"""
+        with self._lock:
+            data = {"run": self.run_info, "products": dict(self.products), "http": dict(self.http)}
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    # ---- รอบการดึงข้อมูล ----
+
+    def resume(self, base_url, restart=False):
+        """เริ่มรอบใหม่ หรือทำต่อจากรอบที่ค้างไว้ของ base_url เดียวกัน คืนสินค้าของหน้าที่เสร็จแล้ว (list ต่อหน้า)"""
+        run = self.run_info
+        if not restart and run and not run.get("complete") and run.get("base_url") == base_url and run.get("pages"):
+            pages = [[self._stored(pid) for pid in ids if pid in self.products] for ids in run["pages"]]
+            print(f"⏯️ Resuming run {run['id']} after page {len(pages)} ({sum(map(len, pages))} products)")
+            return pages
+
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}.{time.time_ns() // 1000 % 10**6:06d}"
+        self.run_info = {"id": run_id, "base_url": base_url, "pages": [], "complete": False}
+        self.save()
+        return []
+
+    def checkpoint(self, page_products):
+        """บันทึกสินค้าของหน้าที่เพิ่งดึงเสร็จ แล้วเขียนไฟล์ทันที"""
+        self.update(page_products)
+        with self._lock:
+            self.run_info["pages"].append([product["id"] for product in page_products])
+        self.save()
+
+    def update(self, products):
+        run_id = self.run_info["id"] if self.run_info else None
+        with self._lock:
+            for product in products:
+                self.products[product["id"]] = {
+                    "listing_key": product.get("listing_key"),
+                    "product": {key: value for key, value in product.items() if key != "listing_key"},
+                    "run": run_id,
+                }
+
+    def finish(self):
+        """จบรอบ: ลบสินค้าและ validator ที่ไม่เห็นในรอบนี้ (สินค้าถูกถอดออกจากร้านแล้ว)"""
+        run_id = self.run_info["id"]
+        with self._lock:
+            self.products = {pid: entry for pid, entry in self.products.items() if entry.get("run") == run_id}
+            # validator ของหน้าสินค้าที่ข้ามไปเพราะ listing ไม่เปลี่ยนยังใช้ได้ เก็บไว้ตราบที่สินค้ายังอยู่
+            self.http = {url: entry for url, entry in self.http.items()
+                         if entry.get("run") == run_id or extract_product_id(url) in self.products}
+            self.run_info["complete"] = True
+        self.save()
+        print(f"💾 Scrape state: {self.reused} product details reused, {self.not_modified} responses 304 Not Modified")
+
+    # ---- สินค้า ----
+
+    def _stored(self, product_id):
+        entry = self.products[product_id]
+        return dict(entry["product"], listing_key=entry.get("listing_key"))
+
+    def reuse_details(self, product, keys=("description",), check_listing=True):
+        """เติม keys จากรอบก่อนแล้วคืน True ถ้ารอบก่อนได้รายละเอียดครบ และ listing ไม่เปลี่ยน (เมื่อ check_listing)"""
+        with self._lock:
+            entry = self.products.get(product["id"])
+        if not entry or (check_listing and entry.get("listing_key") != product.get("listing_key")):
+            return False
+        stored = entry["product"]
+        if stored.get("description", "") in MISSING_DESCRIPTIONS:
+            return False
+        for key in keys:
+            product[key] = stored.get(key, product.get(key))
+        with self._lock:
+            self.reused += 1
+        return True
+
+    def page_products(self, url):
+        """สินค้าของหน้า listing จากรอบก่อน (ใช้เมื่อหน้าตอบ 304) หรือ None ถ้าไม่ได้เก็บไว้"""
+        with self._lock:
+            ids = self.http.get(url, {}).get("ids")
+            if ids is None or any(pid not in self.products for pid in ids):
+                return None
+            products = [self._stored(pid) for pid in ids]
+        for product in products:
+            if product.get("description", "") in MISSING_DESCRIPTIONS:
+                product["description"] = ""
+        return products
+
+    # ---- conditional request ----
+
+    def request_headers(self, url):
+        """If-None-Match / If-Modified-Since จากครั้งก่อนที่ดึง url นี้"""
+        with self._lock:
+            entry = self.http.get(url)
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def remember_response(self, url, headers):
+        """เก็บ ETag/Last-Modified ของ response 200 ไว้ใช้รอบหน้า"""
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        run_id = self.run_info["id"] if self.run_info else None
+        with self._lock:
+            if etag or last_modified:
+                self.http[url] = {"etag": etag, "last_modified": last_modified, "run": run_id}
+            else:
+                self.http.pop(url, None)
+
+    def remember_page(self, url, product_ids):
+        """จำว่าหน้า listing นี้มีสินค้าอะไร เพื่อใช้ต่อเมื่อรอบหน้าตอบ 304"""
+        with self._lock:
+            if url in self.http:
+                self.http[url]["ids"] = list(product_ids)
+
+    def mark_not_modified(self, url):
+        """url ตอบ 304: นับสถิติ และนับว่าเห็นในรอบนี้ (ไม่ถูกลบตอน finish)"""
+        with self._lock:
+            self.not_modified += 1
+            if url in self.http:
+                self.http[url]["run"] = self.run_info["id"] if self.run_info else None
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+BASE_URL = os.environ.get("SCRAPER_BASE_URL", "https://shop.cpbrandsite.com/th/category/133840/all-product")
+MAX_PAGES = 2
+SCRAPER_WORKERS = int(os.environ.get("SCRAPER_WORKERS", 4))   # จำนวน request/Chrome ที่ทำพร้อมกัน
+REQUESTS_PER_SECOND = float(os.environ.get("SCRAPER_RATE", 2.0))  # ต่อ host
+MAX_RETRIES = 2
+RETRY_BACKOFF = 1.0      # วินาที เพิ่มเป็นสองเท่าทุกครั้งที่ลองใหม่
+
+# รูปแบบ URL ของหน้า listing ที่ลองตามลำดับ
+PAGE_URL_PATTERNS = ["{base}?page={{}}", "{base}?p={{}}", "{base}/page/{{}}", "{base}#page={{}}"]
+
+
+# ฟังก์ชันเช็คว่า URL มีอยู่จริงหรือไม่
+def url_exists(url):
+    try:
+        response = requests.head(url, timeout=5)
+        return response.status_code < 400
+    except requests.RequestException:
+        return False
+
+
+class HostRateLimiter:
+    """จำกัด request ต่อ host ไม่เกิน requests_per_second (ทุก thread ต่อคิวเดียวกัน)"""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def with_retries(fn, *args, retries=MAX_RETRIES, backoff=RETRY_BACKOFF, label="", retry_on=(OSError,)):
+    """เรียก fn ซ้ำเมื่อเกิด exception ใน retry_on (รอนานขึ้นเป็นสองเท่าทุกครั้ง)
+
+    ค่าเริ่มต้น OSError ครอบคลุม requests.RequestException ด้วย
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except retry_on as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"⚠️ {label or fn.__name__} failed ({e.__class__.__name__}), retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def find_page_pattern(base_url, limiter=None):
+    """ลอง URL patterns ต่างๆ กับหน้า 2 แล้วคืน pattern แรกที่ใช้ได้ (None ถ้าไม่มี)"""
+    for pattern in PAGE_URL_PATTERNS:
+        pattern = pattern.format(base=base_url)
+        test_url = pattern.format(2)
+        print(f"ทดสอบ URL pattern: {test_url}")
+        if limiter is not None:
+            limiter.wait(test_url)
+        if url_exists(test_url):
+            print(f"พบ pattern ที่ใช้ได้: {pattern}")
+            return pattern
+    return None
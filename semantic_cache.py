@@ -0,0 +1,124 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+def context_id(context):
+    """hash ของ prompt context (คำตอบใช้ซ้ำได้เฉพาะเมื่อ context เหมือนกันทุกตัวอักษร)"""
+    return zlib.crc32(context.encode("utf-8"))
+
+
+class SemanticCache:
+    """แคชคำตอบของ LLM ตามความหมายของคำถาม
+
+    คำถามใหม่ที่ cosine distance กับคำถามที่แคชไว้ไม่เกิน max_distance (และ context เดียวกัน)
+    จะได้คำตอบเดิมทันที ค้นด้วยการคูณเมทริกซ์ครั้งเดียวกับทุกช่องในแคช
+    """
+
+    def __init__(self, max_size=512, ttl=1800, max_distance=0.1):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._embeddings = None                      # (max_size, dim) จองตอน put ครั้งแรก
+        self._contexts = np.zeros(max_size, dtype=np.int64)
+        self._expires = np.zeros(max_size, dtype=np.float64)
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._answers = [None] * max_size
+        self._lru = OrderedDict()                    # slot -> None เรียงจากใช้ล่าสุดน้อยไปมาก
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        """คืน False ถ้า version เก่ากว่าเวอร์ชันของแคช (request ที่ยังถือแคตตาล็อกเก่าระหว่าง reload ไม่ล้างแคช)"""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._lru:
+                self.invalidations += 1
+            self._valid[:] = False
+            self._answers = [None] * self.max_size
+            self._lru.clear()
+            self._version = version
+        return True
+
+    def _nearest(self, query_embedding, context):
+        """ช่องที่ใกล้ที่สุดซึ่ง context ตรงกันและยังไม่หมดอายุ คืน (slot, distance) หรือ (None, None)"""
+        if self._embeddings is None or not self._lru:
+            return None, None
+
+        mask = self._valid & (self._contexts == context_id(context)) & (self._expires > time.monotonic())
+        if not mask.any():
+            return None, None
+
+        similarities = np.where(mask, self._embeddings @ query_embedding, -np.inf)
+        slot = int(np.argmax(similarities))
+        return slot, 1.0 - float(similarities[slot])
+
+    def get(self, query_embedding, context, version):
+        """คืนคำตอบที่แคชไว้ หรือ None"""
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return None
+            slot, distance = self._nearest(query_embedding, context)
+            if slot is None or distance > self.max_distance:
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return self._answers[slot]
+
+    def put(self, query_embedding, context, answer, version):
+        with self._lock:
+            if not self._check_version(version):
+                return
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_size, len(query_embedding)), dtype=np.float32)
+
+            # คำถามที่ใกล้กันมากอยู่แล้วให้เขียนทับช่องเดิม ไม่เก็บซ้ำ
+            slot, distance = self._nearest(query_embedding, context)
+            if slot is None or distance > self.max_distance:
+                slot = self._free_slot()
+
+            self._embeddings[slot] = query_embedding
+            self._contexts[slot] = context_id(context)
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._valid[slot] = True
+            self._answers[slot] = answer
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def _free_slot(self):
+        free = np.flatnonzero(~self._valid | (self._expires <= time.monotonic()))
+        if free.size:
+            slot = int(free[0])
+            self._lru.pop(slot, None)
+            return slot
+
+        # เต็มแล้ว ทิ้งช่องที่ไม่ได้ใช้นานที่สุด
+        slot, _ = self._lru.popitem(last=False)
+        self.evictions += 1
+        return slot
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._lru),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
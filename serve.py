@@ -0,0 +1,237 @@
+"""รันบอทแบบหลาย process (prefork) สำหรับ production บน Linux/macOS
+
+    python serve.py botcpwith_ollama --workers 4 --port 5000
+
+process แม่โหลดโมเดล แคตตาล็อก และ embedding ครั้งเดียว แล้ว fork worker ตามจำนวนที่กำหนด
+worker ทุกตัวใช้หน่วยความจำของโมเดลและเมทริกซ์ร่วมกันแบบ copy-on-write (ไม่โหลดซ้ำ)
+และรับ connection จาก socket เดียวกันที่ process แม่ bind ไว้
+
+process แม่เป็นผู้เดียวที่เฝ้าไฟล์ CSV เมื่อไฟล์เปลี่ยน (หรือได้ SIGHUP) จะโหลดแคตตาล็อกใหม่
+แล้ว restart worker ทีละตัว (เปิดตัวใหม่ก่อนแล้วค่อยปิดตัวเก่า) ระหว่างนั้นยังรับ request ได้ตลอด
+kill -USR1 <pid แม่> เพื่อพิมพ์การใช้หน่วยความจำ (RSS/PSS) ของแต่ละ worker
+"""
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+
+def bind_socket(host, port, backlog=128):
+    """bind socket ใน process แม่ ให้ worker ทุกตัว accept จาก socket เดียวกัน"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def memory_usage(pid):
+    """RSS, PSS และหน่วยความจำส่วนตัวของ process (kB) จาก /proc/<pid>/smaps_rollup (Linux เท่านั้น)"""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    usage[key] = int(value.split()[0])
+    except OSError:
+        return None
+    return {
+        "rss_kb": usage.get("Rss", 0),
+        "pss_kb": usage.get("Pss", 0),
+        "private_kb": usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0),
+    }
+
+
+class PreforkServer:
+    """process แม่: สร้าง/เฝ้า worker และประสานการโหลดแคตตาล็อกใหม่
+
+    bot คือโมดูลของบอทที่มี app (Flask), catalog_store และ event_pool
+    """
+
+    def __init__(self, bot, sock, workers=4, check_interval=5.0, drain_timeout=30.0, threads_per_worker=None):
+        self.bot = bot
+        self.sock = sock
+        self.worker_count = workers
+        self.check_interval = check_interval
+        self.drain_timeout = drain_timeout
+        self.threads_per_worker = threads_per_worker
+
+        self.workers = set()
+        self._stopping = False
+        self._reload_requested = False
+        self._report_requested = False
+
+        # process แม่เช็คไฟล์เองในลูปหลัก แคตตาล็อกจึงไม่ถูกโหลดในเธรดเบื้องหลังระหว่าง fork
+        self.bot.catalog_store.check_interval = None
+
+    def spawn(self):
+        # object ที่สร้างมาแล้วไม่ต้องให้ GC ไล่ตรวจอีก (GC เขียน header ของ object ทำให้หน้าหน่วยความจำถูก copy)
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker_main()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+
+        self.workers.add(pid)
+        return pid
+
+    def _worker_main(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)     # Ctrl+C ให้ process แม่จัดการ
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)     # worker ไม่โหลดแคตตาล็อกเอง
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+
+        if self.threads_per_worker and "torch" in sys.modules:
+            # กัน worker หลายตัวแย่ง CPU core เดียวกันตอน encode
+            sys.modules["torch"].set_num_threads(self.threads_per_worker)
+
+        host, port = self.sock.getsockname()[:2]
+        server = make_server(host, port, self.bot.app, threaded=True, fd=self.sock.fileno())
+
+        # SIGTERM: หยุดรับ request ใหม่ แล้วรอ event ที่ค้างในคิวให้เสร็จก่อนออก
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start())
+        print(f"👷 Worker {os.getpid()} serving catalog v{self.bot.catalog_store.get().version}")
+        server.serve_forever()
+        self.bot.event_pool.drain(self.drain_timeout)
+
+    def stop_worker(self, pid, timeout):
+        """ส่ง SIGTERM แล้วรอ worker ออก ถ้าเกิน timeout จะ SIGKILL"""
+        self.workers.discard(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return
+            time.sleep(0.1)
+
+        print(f"⚠️ Worker {pid} did not exit in {timeout:.0f}s, killing")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def rolling_restart(self):
+        """แทน worker ทุกตัวด้วยตัวใหม่ที่เห็นแคตตาล็อกล่าสุด ทีละตัว"""
+        for pid in list(self.workers):
+            self.spawn()
+            self.stop_worker(pid, self.drain_timeout + 5)
+
+    def _reap(self):
+        """เก็บ worker ที่ตายไปแล้ว และเปิดตัวใหม่แทน"""
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if pid in self.workers:
+                self.workers.discard(pid)
+                print(f"⚠️ Worker {pid} exited with status {status}, restarting")
+                if not self._stopping:
+                    self.spawn()
+
+    def _reload_catalog(self):
+        store = self.bot.catalog_store
+        version = store.get().version
+        store.reload(wait=True)
+        if store.get().version != version:
+            print(f"🔄 Catalog v{store.get().version}: restarting workers")
+            self.rolling_restart()
+
+    def report_memory(self):
+        for pid in sorted(self.workers):
+            usage = memory_usage(pid)
+            if usage:
+                print(f"📊 Worker {pid}: RSS {usage['rss_kb'] / 1024:.0f} MB, "
+                      f"PSS {usage['pss_kb'] / 1024:.0f} MB, private {usage['private_kb'] / 1024:.0f} MB")
+
+    def _install_signals(self):
+        def stop(signum, frame):
+            self._stopping = True
+
+        def reload(signum, frame):
+            self._reload_requested = True
+
+        def report(signum, frame):
+            self._report_requested = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, reload)
+        signal.signal(signal.SIGUSR1, report)
+
+    def run(self):
+        self._install_signals()
+        for _ in range(self.worker_count):
+            self.spawn()
+        print(f"🚀 Serving on {self.sock.getsockname()} with {self.worker_count} workers (master {os.getpid()})")
+
+        last_check = time.monotonic()
+        while not self._stopping:
+            time.sleep(0.5)
+            self._reap()
+
+            if self._report_requested:
+                self._report_requested = False
+                self.report_memory()
+
+            now = time.monotonic()
+            if self._reload_requested or now - last_check >= self.check_interval:
+                last_check = now
+                if self._reload_requested or self.bot.catalog_store.is_stale():
+                    self._reload_requested = False
+                    self._reload_catalog()
+
+        print("🛑 Shutting down workers")
+        for pid in list(self.workers):
+            self.stop_worker(pid, self.drain_timeout + 5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bot", nargs="?", default="botcpwith_ollama", help="bot module (botcp or botcpwith_ollama)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="torch threads per worker")
+    parser.add_argument("--check-interval", type=float, default=5.0, help="seconds between CSV checks")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork() (Linux/macOS), use 'python <bot>.py' on Windows")
+
+    # โหลดโมเดล แคตตาล็อก และ embedding ครั้งเดียวใน process แม่
+    bot = importlib.import_module(args.bot)
+    sock = bind_socket(args.host, args.port)
+
+    PreforkServer(
+        bot, sock,
+        workers=args.workers,
+        check_interval=args.check_interval,
+        drain_timeout=args.drain_timeout,
+        threads_per_worker=args.threads_per_worker,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def description_key(description):
+    """คีย์ของสรุป = hash ของคำอธิบายสินค้า (คำอธิบายเปลี่ยนเมื่อไหร่ก็จะสรุปใหม่)"""
+    return hashlib.sha1(description.strip().encode("utf-8")).hexdigest()
+
+
+class SummaryStore:
+    """เก็บสรุปคำอธิบายสินค้าที่สร้างไว้ล่วงหน้าลงไฟล์ JSON ให้ handler อ่านได้ทันทีโดยไม่ต้องเรียก Ollama
+
+    get() อ่านไฟล์ใหม่เมื่อไฟล์เปลี่ยน (เช็คอย่างมากทุก check_interval วินาที) จึงเห็นสรุปที่งาน --summarize
+    หรือ process อื่นเขียนไว้ระหว่างที่บอทรันอยู่
+    """
+
+    def __init__(self, path, save_every=10, check_interval=5.0):
+        self.path = path
+        self.save_every = save_every
+        self.check_interval = check_interval
+
+        self._summaries = {}
+        self._file_state = None
+        self._last_check = time.monotonic()
+        self._lock = threading.Lock()
+        self._job_lock = threading.Lock()
+        self._queued = []
+        self._job_running = False
+        self.load()
+
+        # งานสรุปเบื้องหลังอาจถือ lock อยู่ตอน fork (ดู serve.py) process ลูกจึงสร้าง lock ใหม่และอ่านสรุปล่าสุดจากไฟล์
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._job_lock = threading.Lock()
+        self._queued = []
+        self._job_running = False
+        self.load()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _read(self):
+        """อ่านไฟล์ คืน (สรุป, สถานะไฟล์ตอนอ่าน)"""
+        state = self._stat()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f), state
+        except FileNotFoundError:
+            return {}, state
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Summary store '{self.path}' unreadable: {e}")
+            return {}, state
+
+    def load(self):
+        """อ่านสรุปจากไฟล์ รวมกับสรุปในหน่วยความจำที่ยังไม่ได้บันทึก"""
+        summaries, state = self._read()
+        with self._lock:
+            summaries.update(self._summaries)
+            self._summaries = summaries
+            self._file_state = state
+
+    def refresh(self):
+        """อ่านไฟล์ใหม่ถ้าเปลี่ยนไปจากครั้งล่าสุดที่อ่านหรือเขียน"""
+        self._last_check = time.monotonic()
+        if self._stat() != self._file_state:
+            self.load()
+
+    def save(self):
+        """เขียนไฟล์แบบ atomic (เขียนไฟล์ชั่วคราวแล้ว os.replace) รวมสรุปที่ process อื่นเขียนไว้ก่อน จะได้ไม่ทับกัน"""
+        self.refresh()
+        with self._lock:
+            data = dict(self._summaries)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._file_state = self._stat()
+
+    def get(self, description):
+        if not description:
+            return None
+        if self.check_interval is not None and time.monotonic() - self._last_check >= self.check_interval:
+            self.refresh()
+        with self._lock:
+            return self._summaries.get(description_key(description))
+
+    def put(self, description, summary):
+        with self._lock:
+            self._summaries[description_key(description)] = summary
+
+    def missing(self, descriptions):
+        """คำอธิบาย (ไม่ซ้ำ) ที่ยังไม่มีสรุป"""
+        pending = {}
+        with self._lock:
+            for description in descriptions:
+                if not description:
+                    continue
+                key = description_key(description)
+                if key not in self._summaries and key not in pending:
+                    pending[key] = description
+        return list(pending.values())
+
+    def summarize_missing(self, descriptions, summarize_fn, max_workers=2):
+        """สรุปเฉพาะคำอธิบายที่ยังไม่มีสรุป โดยเรียก summarize_fn พร้อมกันไม่เกิน max_workers งาน
+
+        summarize_fn คืนข้อความสรุป หรือ None ถ้าสรุปไม่ได้ (จะลองใหม่ในรอบถัดไป)
+        คืนจำนวนคำอธิบายที่สรุปสำเร็จ
+        """
+        with self._job_lock:
+            pending = self.missing(descriptions)
+            if not pending:
+                return 0
+
+            print(f"📝 Summarizing {len(pending)} product descriptions")
+            done = 0
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(summarize_fn, description): description for description in pending}
+                for future in as_completed(futures):
+                    try:
+                        summary = future.result()
+                    except Exception as e:
+                        print(f"Summary error: {e}")
+                        continue
+                    if not summary:
+                        continue
+
+                    self.put(futures[future], summary)
+                    done += 1
+                    if done % self.save_every == 0:
+                        self.save()
+
+            if done:
+                self.save()
+            print(f"📝 Summarized {done}/{len(pending)} product descriptions")
+            return done
+
+    def summarize_in_background(self, descriptions, summarize_fn, max_workers=2):
+        """เหมือน summarize_missing แต่รันในเธรดเบื้องหลัง
+
+        ถ้ามีงานสรุปกำลังรันอยู่ คำอธิบายจะถูกต่อคิวไว้ให้งานเดิมสรุปต่อเมื่อจบรอบปัจจุบัน
+        """
+        with self._lock:
+            self._queued.extend(descriptions)
+            if self._job_running:
+                return
+            self._job_running = True
+
+        thread = threading.Thread(
+            target=self._run_queued,
+            args=(summarize_fn, max_workers),
+            name="summary-job",
+            daemon=True,
+        )
+        thread.start()
+
+    def _run_queued(self, summarize_fn, max_workers):
+        while True:
+            with self._lock:
+                descriptions, self._queued = self._queued, []
+                if not descriptions:
+                    self._job_running = False
+                    return
+            try:
+                self.summarize_missing(descriptions, summarize_fn, max_workers)
+            except Exception as e:
+                print(f"⚠️ Summary job failed: {e}")
@@ -0,0 +1,48 @@
+"""reply_cached เรียก LineBotApi._post (method ภายในของ line-bot-sdk) ตรงๆ ทดสอบว่า SDK ที่ติดตั้งยังรับ argument แบบเดิม
+และ body ที่ส่งตรงกับที่ reply_message ของ SDK ส่งเอง (ดูเวอร์ชันที่ pin ไว้ใน requirements.txt)
+
+    python -m unittest discover tests
+"""
+import inspect
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from linebot import LineBotApi
+    from linebot.models import TextSendMessage
+except ImportError:
+    LineBotApi = None
+
+
+@unittest.skipIf(LineBotApi is None, "line-bot-sdk is not installed")
+class ReplyCachedTest(unittest.TestCase):
+    def test_post_signature(self):
+        parameters = inspect.signature(LineBotApi._post).parameters
+        self.assertEqual(list(parameters)[:2], ["self", "path"])
+        self.assertIn("data", parameters)
+
+    def test_body_matches_reply_message(self):
+        from carousel_cache import REPLY_PATH, CachedMessage, reply_cached
+
+        message = TextSendMessage(text="เมนูแนะนำ")
+        api = LineBotApi("test-token")
+        with mock.patch.object(LineBotApi, "_post") as post:
+            api.reply_message("reply-token", message)
+            reply_cached(api, "reply-token", CachedMessage(message))
+
+        (sdk_args, sdk_kwargs), (cached_args, cached_kwargs) = post.call_args_list
+        self.assertEqual(cached_args, (REPLY_PATH,))
+        self.assertEqual(sdk_args, (REPLY_PATH,))
+        sdk_body = json.loads(sdk_kwargs["data"])
+        # SDK ใส่ notificationDisabled=False ซึ่งเป็นค่าเริ่มต้นของ LINE อยู่แล้ว
+        sdk_body.pop("notificationDisabled", None)
+        self.assertEqual(json.loads(cached_kwargs["data"]), sdk_body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+"""LexicalIndex.candidates: คัดสินค้าด้วย n-gram และจำกัดเฉพาะ id ใน allowed (เช่นสินค้าที่ผ่านเงื่อนไขราคา)
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexical_index import LexicalIndex  # noqa: E402
+
+NAMES = ["เกี๊ยวกุ้ง", "เกี๊ยวหมู", "ไก่ทอด", "ขนมจีบกุ้ง", "ข้าวผัดกะเพรา", "ไส้กรอกไก่"]
+
+
+class LexicalIndexCandidatesTest(unittest.TestCase):
+    def setUp(self):
+        products = [{"id": i, "name": name, "description": ""} for i, name in enumerate(NAMES)]
+        self.index = LexicalIndex(products)
+
+    def test_matches_best_first(self):
+        candidates = self.index.candidates("เกี๊ยวกุ้ง")
+        self.assertEqual(candidates[0], 0)
+        self.assertEqual(set(candidates), {0, 1, 3})
+
+    def test_allowed_restricts_candidates(self):
+        self.assertEqual(set(self.index.candidates("เกี๊ยวกุ้ง", allowed=[1, 3, 4])), {1, 3})
+        self.assertEqual(self.index.candidates("เกี๊ยวกุ้ง", allowed={4, 5}), [])
+        self.assertEqual(self.index.candidates("เกี๊ยวกุ้ง", allowed=[]), [])
+
+    def test_limit(self):
+        self.assertEqual(self.index.candidates("เกี๊ยวกุ้ง", limit=1), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
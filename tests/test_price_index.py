@@ -0,0 +1,40 @@
+"""PriceIndex.range: ขอบเขตราคารวมปลายทั้งสองข้าง และเรียงได้ทั้งจากน้อยไปมากและมากไปน้อย
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_index import PriceIndex  # noqa: E402
+
+PRICES = [120.0, 50.0, 80.0, 50.0, 200.0, 80.0]
+
+
+class PriceIndexRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.index = PriceIndex([{"id": i, "price_value": price} for i, price in enumerate(PRICES)])
+
+    def test_ascending_bounds_are_inclusive(self):
+        # ราคาเท่ากันเรียงตามลำดับในแคตตาล็อก
+        self.assertEqual(self.index.range(50, 120), [1, 3, 2, 5, 0])
+        self.assertEqual(self.index.range(80, 80), [2, 5])
+        self.assertEqual(self.index.range(None, 50), [1, 3])
+        self.assertEqual(self.index.range(200, None), [4])
+        self.assertEqual(self.index.range(81, 119), [])
+
+    def test_descending_bounds_are_inclusive(self):
+        self.assertEqual(self.index.range(50, 120, descending=True), [0, 2, 5, 1, 3])
+        self.assertEqual(self.index.range(80, 80, descending=True), [2, 5])
+        self.assertEqual(self.index.range(None, 80, descending=True), [2, 5, 1, 3])
+        self.assertEqual(self.index.range(120, None, descending=True), [4, 0])
+
+    def test_limit(self):
+        self.assertEqual(self.index.range(descending=True, limit=2), [4, 0])
+        self.assertEqual(self.index.range(60, None, limit=10), [2, 5, 0, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+"""QueryCache: ล้างแคชเมื่อแคตตาล็อกเวอร์ชันใหม่กว่าเข้ามา แต่ไม่ล้างเมื่อ request ที่ถือเวอร์ชันเก่ายังใช้อยู่
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_cache import QueryCache  # noqa: E402
+
+
+class QueryCacheVersionTest(unittest.TestCase):
+    def test_newer_version_clears_cache(self):
+        cache = QueryCache()
+        cache.put("a", 1, version=1)
+        self.assertIsNone(cache.get("a", version=2))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_stale_version_is_ignored(self):
+        cache = QueryCache()
+        cache.put("a", 1, version=2)
+
+        # request ที่ยังถือแคตตาล็อกเวอร์ชันเก่า: ไม่ได้ค่าจากแคช และ put ไม่ถูกเก็บ
+        self.assertIsNone(cache.get("a", version=1))
+        cache.put("b", 2, version=1)
+        self.assertFalse(cache.contains("b", version=1))
+
+        # ค่าของเวอร์ชันปัจจุบันยังอยู่ ไม่ถูกล้าง
+        self.assertEqual(cache.get("a", version=2), 1)
+        self.assertIsNone(cache.get("b", version=2))
+        self.assertEqual(cache.stats()["invalidations"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
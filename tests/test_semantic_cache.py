@@ -0,0 +1,44 @@
+"""SemanticCache: ล้างคำตอบเมื่อแคตตาล็อกเวอร์ชันใหม่กว่าเข้ามา แต่ไม่ล้างเมื่อ request ที่ถือเวอร์ชันเก่ายังใช้อยู่
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+
+    from semantic_cache import SemanticCache
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class SemanticCacheVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.query = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+        self.other = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+
+    def test_newer_version_clears_cache(self):
+        cache = SemanticCache(max_size=4)
+        cache.put(self.query, "", "คำตอบ", version=1)
+        self.assertIsNone(cache.get(self.query, "", version=2))
+        self.assertEqual(cache.invalidations, 1)
+
+    def test_stale_version_is_ignored(self):
+        cache = SemanticCache(max_size=4)
+        cache.put(self.query, "", "คำตอบ", version=2)
+
+        self.assertIsNone(cache.get(self.query, "", version=1))
+        cache.put(self.other, "", "คำตอบเก่า", version=1)
+
+        self.assertEqual(cache.get(self.query, "", version=2), "คำตอบ")
+        self.assertIsNone(cache.get(self.other, "", version=2))
+        self.assertEqual(cache.invalidations, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
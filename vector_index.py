@@ -0,0 +1,224 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+class ExactVectorIndex:
+    """ค้นหาแบบตรง (brute force) ด้วยการคูณเมทริกซ์ครั้งเดียว ผลลัพธ์ถูกต้องเสมอ เหมาะกับแคตตาล็อกขนาดเล็กถึงกลาง"""
+
+    def __init__(self, dim, labels=None, vectors=None):
+        self.dim = dim
+        if vectors is None:
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+            self.label_array = np.zeros(0, dtype=np.int64)
+        else:
+            # ใช้เมทริกซ์ที่ส่งมาตรงๆ ไม่ copy (เช่น memmap จาก EmbeddingStore)
+            self.vectors = vectors
+            self.label_array = np.asarray(labels, dtype=np.int64)
+        self._positions = {int(label): pos for pos, label in enumerate(self.label_array)}
+
+    @property
+    def labels(self):
+        return set(self._positions)
+
+    def __len__(self):
+        return len(self.label_array)
+
+    def add(self, labels, vectors):
+        """เพิ่มเวกเตอร์ (normalize แล้ว) พร้อม label ที่ไม่ซ้ำกัน"""
+        labels = np.asarray(labels, dtype=np.int64)
+        if labels.size == 0:
+            return
+        self.vectors = np.concatenate([self.vectors, np.asarray(vectors, dtype=np.float32)])
+        self.label_array = np.concatenate([self.label_array, labels])
+        self._positions = {int(label): pos for pos, label in enumerate(self.label_array)}
+
+    def remove(self, labels):
+        labels = set(labels)
+        if not labels:
+            return
+        keep = np.array([int(label) not in labels for label in self.label_array], dtype=bool)
+        self.vectors = self.vectors[keep]
+        self.label_array = self.label_array[keep]
+        self._positions = {int(label): pos for pos, label in enumerate(self.label_array)}
+
+    def search(self, query, k, allowed_labels=None):
+        """คืน (labels, scores) ของ k เวกเตอร์ที่ใกล้ที่สุด เรียงคะแนนจากมากไปน้อย (คะแนนเท่ากันเรียงตามลำดับที่เพิ่ม)"""
+        if allowed_labels is None:
+            positions = np.arange(len(self.label_array))
+            scores = self.vectors @ query if positions.size else None
+        else:
+            positions = np.array(
+                sorted(self._positions[label] for label in allowed_labels if label in self._positions),
+                dtype=np.int64,
+            )
+            scores = self.vectors[positions] @ query if positions.size else None
+        if positions.size == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # argpartition หา top-k โดยไม่ต้องเรียงทั้งหมด
+        k = min(k, positions.size)
+        if k < positions.size:
+            part = np.argpartition(-scores, k - 1)[:k]
+            part.sort()
+            positions = positions[part]
+            scores = scores[part]
+
+        order = np.argsort(-scores, kind="stable")
+        return self.label_array[positions[order]], scores[order]
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=self.vectors, labels=self.label_array)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, dim=None):
+        with np.load(path) as data:
+            return cls(data["vectors"].shape[1], labels=data["labels"], vectors=data["vectors"])
+
+
+class HNSWVectorIndex:
+    """ค้นหาแบบประมาณ (ANN) ด้วยกราฟ HNSW บน CPU สำหรับแคตตาล็อกหลักแสนถึงล้านรายการ (ต้องติดตั้ง hnswlib)
+
+    รองรับเพิ่ม/ลบทีละรายการตอนโหลดแคตตาล็อกใหม่ และบันทึก/โหลดจากดิสก์
+    """
+
+    def __init__(self, dim, max_elements=1024, m=16, ef_construction=200, ef_search=64, _index=None, _labels=None):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("HNSW vector index requires hnswlib (pip install hnswlib)")
+
+        self.dim = dim
+        self.ef_search = ef_search
+        if _index is None:
+            # inner product บนเวกเตอร์ที่ normalize แล้ว = cosine similarity
+            _index = hnswlib.Index(space="ip", dim=dim)
+            _index.init_index(max_elements=max_elements, ef_construction=ef_construction, M=m,
+                              allow_replace_deleted=True)
+        _index.set_ef(ef_search)
+        self._index = _index
+        self._labels = set(_labels or ())
+
+    @property
+    def labels(self):
+        return set(self._labels)
+
+    def __len__(self):
+        return len(self._labels)
+
+    def set_ef_search(self, ef_search):
+        """ปรับขนาดรายการผู้สมัครตอนค้นหา ยิ่งมาก recall ยิ่งสูงแต่ช้าลง"""
+        self.ef_search = ef_search
+        self._index.set_ef(ef_search)
+
+    def add(self, labels, vectors):
+        labels = np.asarray(labels, dtype=np.int64)
+        if labels.size == 0:
+            return
+
+        needed = len(self._labels) + labels.size
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, self._index.get_max_elements() * 2))
+
+        # ช่องของรายการที่ถูกลบไปแล้วจะถูกนำกลับมาใช้ใหม่ (replace_deleted)
+        self._index.add_items(np.asarray(vectors, dtype=np.float32), labels, replace_deleted=True)
+        self._labels.update(int(label) for label in labels)
+
+    def remove(self, labels):
+        for label in labels:
+            label = int(label)
+            if label in self._labels:
+                self._index.mark_deleted(label)
+                self._labels.discard(label)
+
+    def search(self, query, k, allowed_labels=None):
+        k = min(k, len(self._labels))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if allowed_labels is not None:
+            allowed_labels = set(allowed_labels)
+            k = min(k, len(allowed_labels))
+            if k <= 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            found_labels, distances = self._index.knn_query(
+                query.reshape(1, -1), k=k, filter=lambda label: label in allowed_labels,
+            )
+        else:
+            found_labels, distances = self._index.knn_query(query.reshape(1, -1), k=k)
+
+        # hnswlib คืน distance = 1 - inner product เรียงจากใกล้ไปไกลอยู่แล้ว
+        return found_labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def copy(self):
+        """สำเนาที่แก้ไขได้อิสระ (hnswlib ห้ามเพิ่ม/resize ระหว่างที่ thread อื่นค้นหา index เดียวกัน)"""
+        import hnswlib
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = os.path.join(tmp, "index.bin")
+            self._index.save_index(tmp_path)
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            index.load_index(tmp_path, allow_replace_deleted=True)
+        return HNSWVectorIndex(self.dim, ef_search=self.ef_search, _index=index, _labels=self._labels)
+
+    def save(self, path):
+        """บันทึก index และ labels เป็นไฟล์ชื่อใหม่ทั้งคู่ แล้วสลับ manifest (path) แบบ atomic ไฟล์ทั้งสองจึงตรงกันเสมอ"""
+        base = f"{path}.{os.getpid()}-{time.time_ns()}"
+        index_path, labels_path = f"{base}.bin", f"{base}.labels"
+        self._index.save_index(index_path)
+        with open(labels_path, "wb") as f:
+            np.save(f, np.fromiter(self._labels, dtype=np.int64, count=len(self._labels)))
+
+        manifest = {"dim": self.dim, "index": os.path.basename(index_path), "labels": os.path.basename(labels_path)}
+        tmp_manifest = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest, path)
+        self._remove_stale(path, {manifest["index"], manifest["labels"]})
+
+    @staticmethod
+    def _remove_stale(path, current_names):
+        """ลบไฟล์ของการบันทึกครั้งก่อน (process ที่โหลดไปแล้วไม่ได้อ่านไฟล์ซ้ำ)"""
+        folder = os.path.dirname(path) or "."
+        base = os.path.basename(path) + "."
+        for name in os.listdir(folder):
+            if name.startswith(base) and name.endswith((".bin", ".labels")) and name not in current_names:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(cls, path, dim, ef_search=64):
+        import hnswlib
+
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["dim"] != dim:
+            raise ValueError(f"index dimension {manifest['dim']} != {dim}")
+        folder = os.path.dirname(path)
+        labels = np.load(os.path.join(folder, manifest["labels"]))
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(os.path.join(folder, manifest["index"]), allow_replace_deleted=True)
+        return cls(dim, ef_search=ef_search, _index=index, _labels=(int(label) for label in labels))
+
+
+VECTOR_BACKENDS = {
+    "exact": ExactVectorIndex,
+    "hnsw": HNSWVectorIndex,
+}
+
+
+def create_vector_index(backend, dim, **options):
+    """สร้าง vector index ตามชื่อ backend ("exact" หรือ "hnsw")"""
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector index backend '{backend}', choose from {sorted(VECTOR_BACKENDS)}")
+    if backend == "exact":
+        return ExactVectorIndex(dim)
+    return VECTOR_BACKENDS[backend](dim, **options)